@@ -1,10 +1,107 @@
-import os
-import random
-import shutil
-from collections import defaultdict
 from pathlib import Path
 
-def balance_yolo_dataset(original_dir, output_dir, ratios=(0.7, 0.2, 0.1), seed=42):
+import numpy as np
+import yaml
+
+from dataset_index import DatasetIndex
+from transfer import transfer_files
+
+# 输出数据集的生成方式, 'manifest' 只写图片列表
+MATERIALIZE_MODES = ('copy', 'hardlink', 'symlink', 'reflink', 'manifest')
+
+def _allocate(count, weights, ratios):
+    """按权重把count个样本分配到各子集(最大余数法), 权重全部非正时按比例分配"""
+    weights = np.clip(weights, 0.0, None)
+    if weights.sum() <= 0:
+        weights = ratios
+    exact = count * weights / weights.sum()
+    quotas = np.floor(exact).astype(np.int64)
+    leftover = count - quotas.sum()
+    if leftover > 0:
+        quotas[np.argsort(-(exact - quotas), kind='stable')[:leftover]] += 1
+    return quotas
+
+def iterative_stratification(class_matrix, ratios, seed=42):
+    """
+    多标签迭代分层抽样 (Sechidis et al., 2011)
+
+    每轮选出剩余样本最少的类别, 将包含该类别的所有未分配图片按各子集对该类别的
+    剩余需求一次性分配, 然后更新所有类别的需求。每轮都是NumPy批量操作,
+    轮数不超过类别数, 因此可以在数秒内处理数百万张图片
+
+    参数:
+        class_matrix: (N, C) 每张图片是否包含各类别
+        ratios: 各子集比例
+        seed: 随机种子
+
+    返回:
+        assignment: (N,) 每张图片所属子集的下标, 每张图片只属于一个子集
+    """
+    Y = np.asarray(class_matrix, dtype=bool)
+    ratios = np.asarray(ratios, dtype=np.float64)
+    ratios = ratios / ratios.sum()
+    rng = np.random.default_rng(seed)
+
+    num_images = Y.shape[0]
+    assignment = np.full(num_images, -1, dtype=np.int64)
+    unassigned = np.ones(num_images, dtype=bool)
+
+    # 各子集对每个类别及总数的剩余需求
+    desired = ratios[:, None] * Y.sum(axis=0)[None, :]
+    desired_total = ratios * num_images
+    label_counts = Y.sum(axis=0).astype(np.int64)
+
+    while label_counts.any():
+        # 剩余样本最少的类别优先, 避免稀有类别被分配不均
+        class_id = np.argmin(np.where(label_counts > 0, label_counts, np.iinfo(np.int64).max))
+        members = np.flatnonzero(unassigned & Y[:, class_id])
+        rng.shuffle(members)
+
+        quotas = _allocate(len(members), desired[:, class_id], ratios)
+        splits = np.repeat(np.arange(len(ratios)), quotas)
+        assignment[members] = splits
+        unassigned[members] = False
+
+        member_labels = Y[members].astype(np.int64)
+        taken = np.zeros_like(desired)
+        np.add.at(taken, splits, member_labels)
+        desired -= taken
+        desired_total -= quotas
+        label_counts -= member_labels.sum(axis=0)
+
+    # 没有任何类别的图片按总数需求分配
+    rest = np.flatnonzero(unassigned)
+    rng.shuffle(rest)
+    assignment[rest] = np.repeat(np.arange(len(ratios)), _allocate(len(rest), desired_total, ratios))
+    return assignment
+
+def print_stratification(class_matrix, assignment, ratios, subsets):
+    """打印每个类别实际达到的划分比例与目标比例"""
+    Y = np.asarray(class_matrix, dtype=bool)
+    ratios = np.asarray(ratios, dtype=np.float64) / np.sum(ratios)
+    per_split = np.stack([Y[assignment == i].sum(axis=0) for i in range(len(subsets))])
+    totals = Y.sum(axis=0)
+
+    print("\n| 类别 | 图片数 | " + " | ".join(f"{subset}(实际/目标)" for subset in subsets) + " |")
+    print("|------|--------|" + "|".join("-" * 19 for _ in subsets) + "|")
+    for class_id in np.flatnonzero(totals):
+        cells = " | ".join(
+            f"{per_split[i, class_id] / totals[class_id]:.3f} / {ratios[i]:.3f}   " for i in range(len(subsets))
+        )
+        print(f"| {class_id:4} | {totals[class_id]:6} | {cells} |")
+
+def _class_names(original_dir, class_matrix):
+    """原始数据集 data.yaml 中的类别名称, 没有时用类别ID作为名称"""
+    data_yaml = Path(original_dir) / 'data.yaml'
+    if data_yaml.exists():
+        with open(data_yaml, 'r') as f:
+            names = (yaml.safe_load(f) or {}).get('names')
+        if names:
+            return dict(enumerate(names)) if isinstance(names, list) else names
+    return {class_id: str(class_id) for class_id in range(class_matrix.shape[1])}
+
+def balance_yolo_dataset(original_dir, output_dir, ratios=(0.7, 0.2, 0.1), seed=42, mode='copy',
+                         workers=16, dry_run=False, journal=None):
     """
     平衡YOLO数据集，使每个类别的分布均匀
     
@@ -13,10 +110,15 @@ def balance_yolo_dataset(original_dir, output_dir, ratios=(0.7, 0.2, 0.1), seed=
         output_dir: 平衡后的输出目录
         ratios: 训练/验证/测试集比例(总和应为1.0)
         seed: 随机种子
+        mode: 输出方式, 见 MATERIALIZE_MODES; 'manifest' 只写入 train.txt/val.txt/test.txt
+              图片列表和指向它们的 data.yaml(可直接传给训练), 不复制任何图片
+        workers: 并发传输的线程数
+        dry_run: 只打印传输计划, 不写入任何文件
+        journal: 可选的传输日志路径, 中断后重新运行时跳过已完成的文件
     """
-    # 设置随机种子
-    random.seed(seed)
-    
+    if mode not in MATERIALIZE_MODES:
+        raise ValueError(f"未知的生成方式: {mode}, 可选 {MATERIALIZE_MODES}")
+
     # 验证比例
     print(sum(ratios))
     assert sum(ratios) - 1.0 <= 0.01, "比例总和必须为1.0"
@@ -25,71 +127,69 @@ def balance_yolo_dataset(original_dir, output_dir, ratios=(0.7, 0.2, 0.1), seed=
     # 创建输出目录结构
     output_dir = Path(output_dir)
     subsets = ['train', 'val', 'test']
-    for subset in subsets:
-        (output_dir / subset / 'images').mkdir(parents=True, exist_ok=True)
-        (output_dir / subset / 'labels').mkdir(parents=True, exist_ok=True)
+    if not dry_run:
+        for subset in subsets:
+            (output_dir / subset / 'images').mkdir(parents=True, exist_ok=True)
+            (output_dir / subset / 'labels').mkdir(parents=True, exist_ok=True)
     
-    # 第一步：收集所有标签文件并分类
-    class_files = defaultdict(list)
+    # 第一步：通过数据集索引收集每张图片的类别向量
+    # 索引只在标签变化时重新解析, 并已记录每个标签对应的图片
+    index = DatasetIndex.open(original_dir, splits=subsets)
+    rows = index.select()
+    class_matrix = np.asarray(index.columns['class_hist'][rows]) > 0
+    # 与之前一致, 不包含任何类别的图片不参与划分
+    keep = class_matrix.any(axis=1)
+    rows = rows[keep]
+    class_matrix = class_matrix[keep]
     
-    # 遍历原始数据集中的所有标签文件
-    for subset in subsets:
-        labels_path = Path(original_dir) / subset / 'labels'
-        if not labels_path.exists():
-            continue
-            
-        for label_file in labels_path.glob('*.txt'):
-            with open(label_file, 'r') as f:
-                # 获取文件中出现的所有类别
-                classes_in_file = set()
-                for line in f:
-                    if line.strip():
-                        class_id = int(line.split()[0])
-                        classes_in_file.add(class_id)
-                
-                # 记录文件及其包含的类别
-                img_stem = label_file.stem
-                img_path = None
-                for ext in ['.jpg', '.jpeg', '.png', '.bmp']:
-                    potential_img = Path(original_dir) / subset / 'images' / f"{img_stem}{ext}"
-                    if potential_img.exists():
-                        img_path = potential_img
-                        break
-                
-                if img_path:
-                    for class_id in classes_in_file:
-                        class_files[class_id].append((img_path, label_file))
+    # 第二步：多标签迭代分层抽样, 每张图片只进入一个子集
+    assignment = iterative_stratification(class_matrix, (train_ratio, val_ratio, test_ratio), seed)
+    print_stratification(class_matrix, assignment, (train_ratio, val_ratio, test_ratio), subsets)
     
-    # 第二步：对每个类别进行分层抽样
-    balanced_files = {subset: set() for subset in subsets}
+    balanced_files = {
+        subset: [(index.image_path(row), index.label_path(row)) for row in rows[assignment == i]]
+        for i, subset in enumerate(subsets)
+    }
     
-    for class_id, files in class_files.items():
-        # 打乱文件顺序
-        random.shuffle(files)
-        
-        # 计算分割点
-        total = len(files)
-        train_end = int(total * train_ratio)
-        val_end = train_end + int(total * val_ratio)
-        
-        # 分配文件到不同子集
-        balanced_files['train'].update(files[:train_end])
-        balanced_files['val'].update(files[train_end:val_end])
-        balanced_files['test'].update(files[val_end:])
+    # 第三步：生成输出数据集
+    if mode == 'manifest':
+        if dry_run:
+            for subset in subsets:
+                print(f"[dry-run] 将写入 {output_dir / f'{subset}.txt'}: {len(balanced_files[subset])} 张图片")
+            return
+        # 只写入图片列表, 标签由ultralytics按 images -> labels 的路径规则在原目录中查找
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for subset in subsets:
+            image_paths = sorted(str(img_path.resolve()) for img_path, _ in balanced_files[subset])
+            with open(output_dir / f"{subset}.txt", 'w') as f:
+                f.write('\n'.join(image_paths) + ('\n' if image_paths else ''))
+            print(f"已写入 {output_dir / f'{subset}.txt'}: {len(image_paths)} 张图片")
+        data = {'path': str(output_dir.resolve()), 'names': _class_names(original_dir, class_matrix)}
+        data.update({subset: f"{subset}.txt" for subset in subsets})
+        with open(output_dir / 'data.yaml', 'w') as f:
+            yaml.safe_dump(data, f, allow_unicode=True, sort_keys=False)
+        print(f"已写入 {output_dir / 'data.yaml'}")
+
+        # 分布直接由索引中的类别直方图求和, 不重新解析标签
+        print("\n平衡后的数据集统计:")
+        hist = np.asarray(index.columns['class_hist'][rows])
+        class_counts = {}
+        for i, subset in enumerate(subsets):
+            totals = hist[assignment == i].sum(axis=0)
+            class_counts[subset] = {int(class_id): int(totals[class_id]) for class_id in np.flatnonzero(totals)}
+        print_distribution(class_counts)
+        return
     
-    # 第三步：复制文件到新目录(避免重复)
+    # 图片和标签一起交给传输引擎, 目标已存在时跳过
+    pairs = []
     for subset in subsets:
-        print(f"处理 {subset} 集...")
         for img_path, label_path in balanced_files[subset]:
-            # 复制图片
-            img_dest = output_dir / subset / 'images' / img_path.name
-            if not img_dest.exists():
-                shutil.copy2(img_path, img_dest)
-            
-            # 复制标签
-            label_dest = output_dir / subset / 'labels' / label_path.name
-            if not label_dest.exists():
-                shutil.copy2(label_path, label_dest)
+            pairs.append((img_path, output_dir / subset / 'images' / img_path.name))
+            pairs.append((label_path, output_dir / subset / 'labels' / label_path.name))
+    print(f"生成 {len(pairs)} 个文件 ({mode})...")
+    transfer_files(pairs, mode=mode, workers=workers, dry_run=dry_run, journal=journal)
+    if dry_run:
+        return
     
     # 第四步：验证结果
     print("\n平衡后的数据集统计:")
@@ -98,17 +198,13 @@ def balance_yolo_dataset(original_dir, output_dir, ratios=(0.7, 0.2, 0.1), seed=
 def analyze_dataset_distribution(dataset_dir):
     """分析数据集中各类别的分布"""
     subsets = ['train', 'val', 'test']
-    class_counts = {subset: defaultdict(int) for subset in subsets}
-    
-    for subset in subsets:
-        labels_dir = Path(dataset_dir) / subset / 'labels'
-        if labels_dir.exists():
-            for label_file in labels_dir.glob('*.txt'):
-                with open(label_file, 'r') as f:
-                    for line in f:
-                        if line.strip():
-                            class_id = int(line.split()[0])
-                            class_counts[subset][class_id] += 1
+    index = DatasetIndex.open(dataset_dir, splits=subsets)
+    class_counts = {subset: index.class_counts(subset) for subset in subsets}
+    print_distribution(class_counts)
+
+def print_distribution(class_counts):
+    """打印 {subset: {class_id: count}} 形式的类别分布表"""
+    subsets = ['train', 'val', 'test']
     
     # 打印统计信息
     all_classes = set()
@@ -140,10 +236,14 @@ if __name__ == "__main__":
     VAL_RATIO = 0.2
     TEST_RATIO = 0.1
     
+    # 输出方式: copy / hardlink / symlink / reflink / manifest
+    MODE = "copy"
+    
     # 执行数据集平衡
     balance_yolo_dataset(
         original_dir=ORIGINAL_DIR,
         output_dir=BALANCED_DIR,
         ratios=(TRAIN_RATIO, VAL_RATIO, TEST_RATIO),
-        seed=42
+        seed=42,
+        mode=MODE
     )
\ No newline at end of file
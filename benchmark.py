@@ -0,0 +1,305 @@
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+from evaluate import evaluate_folder, list_images
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+def _percentiles(values_ms):
+    if not values_ms:
+        return {}
+    values = np.asarray(values_ms)
+    return {
+        'mean': float(values.mean()),
+        'p50': float(np.percentile(values, 50)),
+        'p90': float(np.percentile(values, 90)),
+        'p99': float(np.percentile(values, 99)),
+        'max': float(values.max()),
+    }
+
+def load_frames(source, limit=None):
+    """
+    读取视频文件或图片目录中的帧
+
+    参数:
+        source: 视频文件或图片目录
+        limit: 可选, 最多读取的帧数
+
+    返回:
+        frames: BGR图像列表
+    """
+    source = Path(source)
+    frames = []
+    if source.is_dir():
+        for path in list_images(source)[:limit]:
+            frame = cv2.imread(str(path))
+            if frame is not None:
+                frames.append(frame)
+        return frames
+
+    cap = cv2.VideoCapture(str(source))
+    while limit is None or len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def _set_threads(threads):
+    """限制推理线程数; 必须在加载 torch / onnxruntime / openvino 之前调用"""
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    cv2.setNumThreads(threads)
+    import torch
+    torch.set_num_threads(threads)
+
+def _peak_rss_mb():
+    """本进程的峰值常驻内存(MB), Linux上 ru_maxrss 单位为KB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform != 'darwin' else peak / (1024 * 1024)
+
+def run_config(model_path, config, sources, eval_dir=None, warmup=10, limit=300):
+    """
+    在当前进程中运行一个配置的基准测试
+
+    参数:
+        model_path: .pt 模型路径
+        config: 字典 {'backend', 'imgsz', 'batch', 'threads'}
+        sources: 视频文件或图片目录列表
+        eval_dir: 可选, 带labels的图片目录, 用于计算mAP
+        warmup: 每个视频源计时前的预热批次数
+        limit: 每个视频源最多使用的帧数
+
+    返回:
+        result: 字典, 包含冷启动耗时、各视频源的热延迟分位数和吞吐量、峰值内存和mAP;
+            peak_rss_mb 为进程总峰值, model_rss_mb 为扣除预加载帧后模型和推理增加的峰值内存
+    """
+    if config.get('threads'):
+        _set_threads(config['threads'])
+    from infer import UltralyticsYOLODetector
+
+    batch = config.get('batch', 1)
+    imgsz = config.get('imgsz', 640)
+    backend = config.get('backend', 'pytorch')
+    result = {'config': config, 'sources': {}}
+
+    # 导出的模型默认为固定批次1; 批量推理时导出动态批次(最后一批可能不满)
+    export_args = None
+    if batch > 1 and backend != 'pytorch':
+        if backend == 'torchscript':
+            raise ValueError("torchscript exports have a static batch size, use batch=1")
+        export_args = {'dynamic': True, 'batch': batch}
+
+    # 先加载所有视频源的帧, 以此时的峰值内存为基线, 之后的增量才是模型和推理占用的内存
+    source_frames = {}
+    for source in sources:
+        frames = load_frames(source, limit)
+        if not frames:
+            print(f"No frames in {source}, skipped")
+            continue
+        source_frames[source] = frames
+    baseline_rss = _peak_rss_mb()
+
+    # 冷启动: 加载模型(含导出缓存)和第一次推理
+    start = perf_counter()
+    detector = UltralyticsYOLODetector(model_path, backend=backend, imgsz=imgsz, render=False,
+                                      export_args=export_args)
+    result['load_ms'] = (perf_counter() - start) * 1000
+    first_frames = None
+
+    for source, frames in source_frames.items():
+        batches = [frames[i:i + batch] for i in range(0, len(frames), batch)]
+
+        if first_frames is None:
+            first_frames = batches[0]
+            start = perf_counter()
+            detector.predict(first_frames, raw=True)
+            result['first_inference_ms'] = (perf_counter() - start) * 1000
+
+        for frames_batch in batches[:warmup]:
+            detector.predict(frames_batch, raw=True)
+
+        latencies = []
+        start = perf_counter()
+        for frames_batch in batches:
+            batch_start = perf_counter()
+            detector.predict(frames_batch, raw=True)
+            latencies.append((perf_counter() - batch_start) * 1000)
+        elapsed = perf_counter() - start
+
+        result['sources'][str(source)] = {
+            'frames': len(frames),
+            'batch_latency_ms': _percentiles(latencies),
+            'throughput_fps': len(frames) / elapsed,
+        }
+
+    # mAP是可选的: 评估目录不存在或评估失败时只记录原因, 不影响延迟结果
+    if eval_dir is not None and not Path(eval_dir).is_dir():
+        print(f"Eval dir {eval_dir} not found, mAP skipped")
+        result['map_error'] = f"eval dir not found: {eval_dir}"
+    elif eval_dir is not None:
+        try:
+            metrics = evaluate_folder(lambda frame: detector.predict(frame, raw=True, conf=0.001), eval_dir,
+                                      num_classes=len(detector.class_names))
+        except Exception as e:
+            print(f"Evaluation on {eval_dir} failed, mAP skipped: {e}")
+            result['map_error'] = f"{type(e).__name__}: {e}"
+        else:
+            result['map50'] = metrics['map50']
+            result['map'] = metrics['map']
+            result['ap50'] = {
+                detector.class_names[i]: float(ap) for i, ap in enumerate(metrics['ap50']) if not np.isnan(ap)
+            }
+
+    result['stages'] = detector.metrics.summary()
+    result['peak_rss_mb'] = _peak_rss_mb()
+    result['frames_rss_mb'] = baseline_rss
+    result['model_rss_mb'] = result['peak_rss_mb'] - baseline_rss
+    return result
+
+def _run_config_worker(args, conn):
+    try:
+        conn.send(run_config(*args))
+    except Exception as e:
+        conn.send({'config': args[1], 'error': f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+def run_benchmark(model_path, configs, sources, eval_dir='./test_datasets/test/images', output=None,
+                  warmup=10, limit=300):
+    """
+    按固定配置依次运行基准测试, 每个配置在独立的子进程中运行
+
+    独立进程保证冷启动时间、线程数设置和峰值内存互不影响。
+
+    参数:
+        model_path: .pt 模型路径
+        configs: 配置列表, 每个为 {'backend', 'imgsz', 'batch', 'threads'}
+        sources: 录制的视频文件或图片目录列表
+        eval_dir: 带labels的测试图片目录, None或目录不存在时不计算mAP
+        output: 可选, 结果JSON的保存路径
+        warmup: 计时前的预热批次数
+        limit: 每个视频源最多使用的帧数
+
+    返回:
+        report: 字典, 包含模型哈希、运行环境和每个配置的结果
+    """
+    from infer import file_hash
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for config in configs:
+        print(f"Benchmarking {config}...")
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run_config_worker,
+                                  args=((model_path, config, sources, eval_dir, warmup, limit), sender))
+        process.start()
+        sender.close()
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = {'config': config, 'error': f"worker exited with code {process.exitcode}"}
+        process.join()
+        if 'error' in result:
+            print(f"  failed: {result['error']}")
+        results.append(result)
+
+    report = {
+        'model': str(model_path),
+        'model_hash': file_hash(model_path),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'platform': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+    print_report(report)
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {output}")
+    return report
+
+def _config_key(config):
+    return f"{config.get('backend', 'pytorch')}/imgsz={config.get('imgsz', 640)}" \
+           f"/batch={config.get('batch', 1)}/threads={config.get('threads') or 'auto'}"
+
+def print_report(report):
+    print(f"\n| config | load ms | first ms | p50 ms | p99 ms | FPS | model RSS MB | mAP50 |")
+    print("|--------|---------|----------|--------|--------|-----|--------------|-------|")
+    for result in report['results']:
+        if 'error' in result:
+            print(f"| {_config_key(result['config'])} | error: {result['error']} |")
+            continue
+        for source, stats in result['sources'].items():
+            latency = stats['batch_latency_ms']
+            print(f"| {_config_key(result['config'])} {Path(source).name} | {result['load_ms']:.0f} "
+                  f"| {result.get('first_inference_ms', float('nan')):.0f} | {latency['p50']:.1f} "
+                  f"| {latency['p99']:.1f} | {stats['throughput_fps']:.1f} | {result['model_rss_mb']:.0f} "
+                  f"| {result.get('map50', float('nan')):.4f} |")
+
+def compare_reports(baseline_path, candidate_path):
+    """
+    比较两次基准测试的结果(如两个模型版本), 打印相同配置和视频源下的变化
+
+    返回:
+        rows: [(配置, 视频源, 指标, 基线值, 新值, 相对变化)]
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    def flatten(report):
+        values = {}
+        for result in report['results']:
+            if 'error' in result:
+                continue
+            key = _config_key(result['config'])
+            for source, stats in result['sources'].items():
+                values[(key, source, 'p50_ms')] = stats['batch_latency_ms']['p50']
+                values[(key, source, 'p99_ms')] = stats['batch_latency_ms']['p99']
+                values[(key, source, 'fps')] = stats['throughput_fps']
+            values[(key, '', 'model_rss_mb')] = result.get('model_rss_mb', result['peak_rss_mb'])
+            if 'map50' in result:
+                values[(key, '', 'map50')] = result['map50']
+        return values
+
+    before = flatten(baseline)
+    after = flatten(candidate)
+    rows = []
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        change = (new - old) / old if old else float('nan')
+        rows.append((*key, old, new, change))
+        print(f"{key[0]} {Path(key[1]).name if key[1] else ''} {key[2]}: {old:.4g} -> {new:.4g} ({change:+.1%})")
+    return rows
+
+if __name__ == "__main__":
+    # 替换为你的模型路径; 视频源为录制的视频片段或图片目录
+    MODEL_PATH = "best.pt"
+    SOURCES = ["./test_datasets/test/images"]
+    EVAL_DIR = "./test_datasets/test/images"
+
+    CONFIGS = [
+        {'backend': 'pytorch', 'imgsz': 640, 'batch': 1, 'threads': 4},
+        {'backend': 'pytorch', 'imgsz': 320, 'batch': 1, 'threads': 4},
+        {'backend': 'onnx', 'imgsz': 640, 'batch': 1, 'threads': 4},
+        {'backend': 'openvino', 'imgsz': 640, 'batch': 1, 'threads': 4},
+    ]
+
+    run_benchmark(MODEL_PATH, CONFIGS, SOURCES, EVAL_DIR, output="benchmark_results.json")
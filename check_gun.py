@@ -1,55 +1,230 @@
-import os
-import shutil
 from pathlib import Path
 
-def extract_class_images(dataset_dir, target_class, output_dir):
+import numpy as np
+
+from convert_yolo import format_yolo_lines
+from dataset_index import DatasetIndex
+from label_parser import parse_labels, valid_class_mask
+from transfer import transfer_files, write_text_files
+
+class SubsetQuery:
+    """
+    描述一个要提取的子集
+
+    文件需满足类别条件和框数量条件:
+        match='any': 至少包含classes中的一个类别
+        match='all': 包含classes中的所有类别
+        match='none': 不包含classes中的任何类别
+    计数的框为属于classes(match='none'或classes为None时为全部框)且面积 w*h
+    在 [min_area, max_area] 内的框, 数量需在 [min_boxes, max_boxes] 内
+    """
+
+    def __init__(self, output_dir, classes=None, match='any', min_boxes=None, max_boxes=None,
+                 min_area=None, max_area=None, filter_labels=False):
+        """
+        参数:
+            output_dir: 子集输出目录
+            classes: 类别ID集合, None表示不限类别
+            match: 'any' / 'all' / 'none'
+            min_boxes: 最少框数量, 默认指定了面积范围时为1, 否则为0
+            max_boxes: 最多框数量, None表示不限
+            min_area, max_area: 归一化框面积范围, None表示不限
+            filter_labels: 为True时输出的标签只保留计数的框, 否则原样复制标签文件
+        """
+        if match not in ('any', 'all', 'none'):
+            raise ValueError(f"未知的匹配方式: {match}")
+        self.output_dir = Path(output_dir)
+        self.classes = sorted(set(classes)) if classes is not None else None
+        self.match = match
+        if min_boxes is None:
+            min_boxes = 1 if min_area is not None or max_area is not None else 0
+        self.min_boxes = min_boxes
+        self.max_boxes = max_boxes
+        self.min_area = min_area
+        self.max_area = max_area
+        self.filter_labels = filter_labels
+
+    @property
+    def needs_geometry(self):
+        """是否需要解析框坐标; 否则只用索引中的类别直方图即可求值"""
+        return self.min_area is not None or self.max_area is not None or self.filter_labels
+
+    def _filter_counts(self, file_mask, box_counts):
+        file_mask &= box_counts >= self.min_boxes
+        if self.max_boxes is not None:
+            file_mask &= box_counts <= self.max_boxes
+        return file_mask
+
+    def evaluate_hist(self, class_hist):
+        """
+        只用每个文件的类别直方图求值, 适用于没有面积条件的查询
+
+        参数:
+            class_hist: (num_files, num_classes) 索引中的类别直方图
+
+        返回:
+            file_mask: (num_files,) 满足条件的文件
+        """
+        class_hist = np.asarray(class_hist)
+        file_mask = np.ones(len(class_hist), dtype=bool)
+        box_counts = class_hist.sum(axis=1)
+        if self.classes is not None:
+            # 直方图中没有的列说明数据集中没有该类别
+            columns = [class_id for class_id in self.classes if 0 <= class_id < class_hist.shape[1]]
+            present = class_hist[:, columns] > 0
+            if self.match == 'any':
+                file_mask &= present.any(axis=1)
+            elif self.match == 'all':
+                file_mask &= present.all(axis=1) & (len(columns) == len(self.classes))
+            else:
+                file_mask &= ~present.any(axis=1)
+            if self.match != 'none':
+                box_counts = class_hist[:, columns].sum(axis=1)
+        return self._filter_counts(file_mask, box_counts)
+
+    def evaluate(self, boxes, file_idx, num_files):
+        """
+        对所有框一次性求值
+
+        参数:
+            boxes: (N,5) parse_labels 返回的框
+            file_idx: (N,) 每个框所属的文件
+            num_files: 文件数量
+
+        返回:
+            file_mask: (num_files,) 满足条件的文件
+            box_mask: (N,) 被计数的框
+        """
+        # 与索引一致, 类别ID不是非负整数的框不属于任何类别, 也不计数
+        valid = valid_class_mask(boxes[:, 0])
+        class_ids = np.where(valid, boxes[:, 0], -1).astype(np.int64)
+        area = boxes[:, 3] * boxes[:, 4]
+
+        file_mask = np.ones(num_files, dtype=bool)
+        box_mask = valid.copy()
+        if self.classes is not None:
+            in_classes = np.isin(class_ids, self.classes)
+            if self.match == 'any':
+                file_mask &= np.bincount(file_idx[in_classes], minlength=num_files) > 0
+            elif self.match == 'all':
+                for class_id in self.classes:
+                    file_mask &= np.bincount(file_idx[class_ids == class_id], minlength=num_files) > 0
+            else:
+                file_mask &= np.bincount(file_idx[in_classes], minlength=num_files) == 0
+            if self.match != 'none':
+                box_mask &= in_classes
+
+        if self.min_area is not None:
+            box_mask &= area >= self.min_area
+        if self.max_area is not None:
+            box_mask &= area <= self.max_area
+
+        box_counts = np.bincount(file_idx[box_mask], minlength=num_files)
+        return self._filter_counts(file_mask, box_counts), box_mask
+
+def extract_subsets(dataset_dir, queries, mode='copy', workers=16, dry_run=False, journal=None):
+    """
+    扫描一次标签, 按多个查询同时提取子集
+
+    只按类别和框数量筛选的查询直接使用索引中的类别直方图; 只有存在面积条件或需要过滤标签的查询时才解析标签
+
+    参数:
+        dataset_dir: 数据集目录(包含images和labels子目录)
+        queries: SubsetQuery 列表
+        mode: 图片的传输方式, 见 transfer.TRANSFER_MODES
+        workers: 并发传输的线程数
+        dry_run: 只打印传输计划, 不复制文件
+        journal: 可选的传输日志路径, 中断后重新运行时跳过已完成的文件
+
+    返回:
+        counts: 每个查询提取的图片数量
+    """
+    # 通过数据集索引获取有对应图片的标签
+    index = DatasetIndex.open(dataset_dir, splits=('',))
+    rows = index.select()
+    label_paths = [index.label_path(row) for row in rows]
+    if any(query.needs_geometry for query in queries):
+        # 所有标签只解析一次
+        boxes, file_idx = parse_labels(label_paths, strict=False)
+        # 列数不足、无法解析或类别ID无效的行不参与筛选, 也不会写入过滤后的标签
+        malformed = np.isnan(boxes).any(axis=1) | ~valid_class_mask(boxes[:, 0])
+        if malformed.any():
+            print(f"警告: 跳过 {int(malformed.sum())} 个格式错误或类别ID无效的框, "
+                  f"涉及 {len(np.unique(file_idx[malformed]))} 个文件, 可用 validate_labels.py 检查")
+            boxes, file_idx = boxes[~malformed], file_idx[~malformed]
+    class_hist = np.asarray(index.columns['class_hist'][rows])
+
+    pairs = []
+    label_texts = []
+    counts = []
+    for query in queries:
+        if query.needs_geometry:
+            file_mask, box_mask = query.evaluate(boxes, file_idx, len(rows))
+        else:
+            file_mask = query.evaluate_hist(class_hist)
+        selected = np.flatnonzero(file_mask)
+        counts.append(len(selected))
+
+        if query.filter_labels:
+            # 只保留被计数的框, 按文件分组生成新的标签内容
+            kept = np.flatnonzero(box_mask & file_mask[file_idx])
+            lines = format_yolo_lines(boxes[kept, 0], boxes[kept, 1:])
+            grouped = {i: [] for i in selected}
+            for i, line in zip(file_idx[kept], lines):
+                grouped[i].append(line)
+
+        for i in selected:
+            img_path = index.image_path(rows[i])
+            pairs.append((img_path, query.output_dir / 'images' / img_path.name))
+            label_dest = query.output_dir / 'labels' / label_paths[i].name
+            if query.filter_labels:
+                label_texts.append((label_dest, '\n'.join(grouped[i])))
+            else:
+                pairs.append((label_paths[i], label_dest))
+
+    # 移动时同一个源文件可能被多个查询选中: 先复制到其余目标, 最后一个目标再移动
+    copy_pairs = []
+    if mode == 'move':
+        last_dest = {src: dst for src, dst in pairs}
+        copy_pairs = [(src, dst) for src, dst in pairs if last_dest[src] != dst]
+        pairs = list(last_dest.items())
+        if copy_pairs:
+            print(f"{len(copy_pairs)} 个文件被多个查询选中, 先复制到其余子集再移动")
+            transfer_files(copy_pairs, mode='copy', workers=workers, dry_run=dry_run, journal=journal)
+    transfer_files(pairs, mode=mode, workers=workers, dry_run=dry_run, journal=journal)
+    if label_texts and not dry_run:
+        write_text_files(label_texts, workers)
+
+    for query, count in zip(queries, counts):
+        print(f"{query.output_dir}: 提取了 {count} 张图片")
+    return counts
+
+def extract_class_images(dataset_dir, target_class, output_dir, mode='copy', workers=16, dry_run=False, journal=None):
     """
     提取包含特定类别的图片到单独文件夹
-    
+
     参数:
         dataset_dir: 数据集目录(包含images和labels子目录)
         target_class: 要提取的类别ID
         output_dir: 输出目录
+        mode: 传输方式, 见 transfer.TRANSFER_MODES
+        workers: 并发传输的线程数
+        dry_run: 只打印传输计划, 不复制文件
+        journal: 可选的传输日志路径, 中断后重新运行时跳过已完成的文件
     """
-    # 创建输出目录
-    output_dir = Path(output_dir)
-    (output_dir / 'images').mkdir(parents=True, exist_ok=True)
-    (output_dir / 'labels').mkdir(parents=True, exist_ok=True)
-    
-    # 获取标签文件列表
-    labels_dir = Path(dataset_dir) / 'labels'
-    images_dir = Path(dataset_dir) / 'images'
-    
-    count = 0
-    for label_file in labels_dir.glob('*.txt'):
-        with open(label_file, 'r') as f:
-            # 检查是否包含目标类别
-            contains_class = any(
-                line.strip() and int(line.split()[0]) == target_class
-                for line in f
-            )
-            
-            if contains_class:
-                # 查找对应的图片文件
-                img_stem = label_file.stem
-                img_path = None
-                for ext in ['.jpg', '.jpeg', '.png', '.bmp']:
-                    potential_img = images_dir / f"{img_stem}{ext}"
-                    if potential_img.exists():
-                        img_path = potential_img
-                        break
-                
-                if img_path:
-                    # 复制图片和标签
-                    shutil.copy2(img_path, output_dir / 'images' / img_path.name)
-                    shutil.copy2(label_file, output_dir / 'labels' / label_file.name)
-                    count += 1
-    
+    count, = extract_subsets(dataset_dir, [SubsetQuery(output_dir, classes={target_class})],
+                             mode=mode, workers=workers, dry_run=dry_run, journal=journal)
+
     print(f"找到并提取了 {count} 张包含类别 {target_class} 的图片")
 
 # 使用示例
-extract_class_images(
-    dataset_dir="./totol_datasets/train",
-    target_class=0,  # 要提取的类别ID
-    output_dir="./output/class_2_images"
-)
\ No newline at end of file
+if __name__ == "__main__":
+    DATASET_DIR = "./totol_datasets/train"
+    CLASS_NAMES = ['heart', 'thumb_up', 'ok', 'gun', 'rock', 'scissors', 'paper']
+
+    # 一次扫描提取每个手势的子集
+    queries = [
+        SubsetQuery(f"./output/{name}_images", classes={class_id})
+        for class_id, name in enumerate(CLASS_NAMES)
+    ]
+    extract_subsets(DATASET_DIR, queries)
@@ -1,7 +1,7 @@
-import os
-from pathlib import Path
+from reconcile import reconcile_dataset
 
-def delete_images_without_labels(images_dir, labels_dir, image_extensions=('.jpg', '.jpeg', '.png', '.bmp')):
+def delete_images_without_labels(images_dir, labels_dir, image_extensions=('.jpg', '.jpeg', '.png', '.bmp'),
+                                 dry_run=False):
     """
     删除没有对应标签的图片文件
     
@@ -9,37 +9,11 @@ def delete_images_without_labels(images_dir, labels_dir, image_extensions=('.jpg
         images_dir: 图片文件夹路径
         labels_dir: 标签文件夹路径
         image_extensions: 支持的图片扩展名元组
+        dry_run: 只打印将要删除的文件而不实际删除
     """
-    # 获取所有标签文件名（不带扩展名）
-    label_files = set(
-        Path(file).stem for file in os.listdir(labels_dir) 
-        if file.lower().endswith('.txt')
-    )
-    
-    # 遍历图片文件
-    deleted_count = 0
-    total_images = 0
-    
-    for ext in image_extensions:
-        for image_file in os.listdir(images_dir):
-            if image_file.lower().endswith(ext):
-                total_images += 1
-                image_stem = Path(image_file).stem
-                
-                # 如果没有对应的标签文件
-                if image_stem not in label_files:
-                    image_path = Path(images_dir) / image_file
-                    try:
-                        os.remove(image_path)
-                        print(f"已删除: {image_path}")
-                        deleted_count += 1
-                    except Exception as e:
-                        print(f"删除 {image_path} 失败: {e}")
-    
-    print(f"\n完成! 共检查 {total_images} 张图片")
-    print(f"删除 {deleted_count} 张无标签的图片")
-    print(f"剩余图片: {total_images - deleted_count}")
-    print(f"标签文件数: {len(label_files)}")
+    # 单次扫描两个目录并分批删除, 见 reconcile.reconcile_dataset
+    reconcile_dataset(images_dir, labels_dir, remove_labels=False, dry_run=dry_run,
+                      image_extensions=image_extensions)
 
 if __name__ == "__main__":
     # 配置路径 - 修改为你的实际路径
@@ -47,7 +21,7 @@ if __name__ == "__main__":
     LABELS_DIR = "./train/labels"
     
     # 执行清理（先打印将要删除的文件而不实际删除）
-    # check_images_without_labels(IMAGES_DIR, LABELS_DIR)
+    # delete_images_without_labels(IMAGES_DIR, LABELS_DIR, dry_run=True)
     
     # 实际执行删除
     delete_images_without_labels(IMAGES_DIR, LABELS_DIR)
\ No newline at end of file
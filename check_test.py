@@ -2,26 +2,20 @@ import os
 from collections import defaultdict
 from pathlib import Path
 
+from dataset_index import DatasetIndex
+
 def count_class_distribution(labels_dir):
     """
     统计YOLO标签文件中各类别的数量
     
     参数:
-        labels_dir: 包含YOLO格式标签文件的目录
+        labels_dir: 包含YOLO格式标签文件的目录(<split>/labels, 与images同级)
         
     返回:
         class_counts: 字典 {class_id: count}
     """
-    class_counts = defaultdict(int)
-    
-    for label_file in Path(labels_dir).glob('*.txt'):
-        with open(label_file, 'r') as f:
-            for line in f:
-                if line.strip():  # 跳过空行
-                    class_id = int(line.split()[0])  # 第一个数字是类别ID
-                    class_counts[class_id] += 1
-    
-    return dict(sorted(class_counts.items()))
+    index = DatasetIndex.open(Path(labels_dir).parent, splits=('',))
+    return index.class_counts()
 
 def analyze_dataset_distribution(dataset_dir, class_names=None):
     """
@@ -40,14 +34,13 @@ def analyze_dataset_distribution(dataset_dir, class_names=None):
     }
     total_counts = defaultdict(int)
     
-    # 统计每个子集
+    # 统计每个子集, 整个数据集只使用一个索引
+    index = DatasetIndex.open(dataset_dir, splits=subsets)
     for subset in subsets:
-        labels_dir = Path(dataset_dir) / subset / 'labels'
-        if labels_dir.exists():
-            subset_counts = count_class_distribution(labels_dir)
-            for class_id, count in subset_counts.items():
-                stats[subset][class_id] = count
-                total_counts[class_id] += count
+        subset_counts = index.class_counts(subset)
+        for class_id, count in subset_counts.items():
+            stats[subset][class_id] = count
+            total_counts[class_id] += count
     
     # 打印结果
     print("\nYOLO数据集类别分布统计:")
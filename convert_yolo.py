@@ -1,73 +1,444 @@
+import hashlib
+import io
 import json
+import os
+import sqlite3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
+
+# 转换逻辑的版本号, 参与增量清单的源哈希; 修改转换结果(如框的裁剪方式、类别映射规则)时必须增加,
+# 否则增量转换会保留旧逻辑生成的标签
+CONVERTER_VERSION = 2
+
 def convert_bbox_to_yolo(x_tl, y_tl, width, height):
     """
     将 [x_top_left, y_top_left, width, height] 转换为YOLO格式 [x_center, y_center, width, height]
     假设输入坐标已经是归一化的(0-1)
     """
-    x_center = x_tl + width / 2.0
-    y_center = y_tl + height / 2.0
-    
-    # 确保值在0-1范围内
-    x_center = max(0.0, min(1.0, x_center))
-    y_center = max(0.0, min(1.0, y_center))
-    width = max(0.0, min(1.0, width))
-    height = max(0.0, min(1.0, height))
-    
-    return x_center, y_center, width, height
+    # 按角点裁剪到0-1范围内, 超出图片的框只缩小而不平移
+    x1, x2 = max(0.0, min(1.0, x_tl)), max(0.0, min(1.0, x_tl + width))
+    y1, y2 = max(0.0, min(1.0, y_tl)), max(0.0, min(1.0, y_tl + height))
+
+    return (x1 + x2) / 2.0, (y1 + y2) / 2.0, x2 - x1, y2 - y1
+
+def iter_annotations(json_path, chunk_size=1 << 20):
+    """
+    流式解析HaGRID标注文件, 逐条产出 (image_id, annotations)
+
+    文件结构为 {image_id: {...}, ...}, 按块读取并增量解码,
+    不会把整个JSON文档加载到内存中
+
+    参数:
+        json_path: 标注JSON文件路径
+        chunk_size: 每次读取的字符数
+    """
+    decoder = json.JSONDecoder()
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        buf = ''
+        pos = 0
+        eof = False
+
+        def fill():
+            # 丢弃已解析部分并追加新数据
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return False
+            buf = buf[pos:] + chunk
+            pos = 0
+            return True
+
+        def skip_ws():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos].isspace():
+                    pos += 1
+                if pos < len(buf) or not fill():
+                    return
+
+        def decode():
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    # 数据不完整时继续读取, 文件结束仍失败则是格式错误
+                    if eof or not fill():
+                        raise
+                    continue
+                pos = end
+                return value
+
+        skip_ws()
+        if pos >= len(buf) or buf[pos] != '{':
+            raise ValueError(f"{json_path} 不是JSON对象")
+        pos += 1
+
+        while True:
+            skip_ws()
+            if pos >= len(buf):
+                raise ValueError(f"{json_path} 意外结束")
+            if buf[pos] == '}':
+                return
+            if buf[pos] == ',':
+                pos += 1
+                skip_ws()
+
+            image_id = decode()
+            skip_ws()
+            if pos >= len(buf) or buf[pos] != ':':
+                raise ValueError(f"{json_path} 在 {image_id} 处格式错误")
+            pos += 1
+            skip_ws()
+            annotations = decode()
+
+            yield image_id, annotations
+
+def convert_bboxes_to_yolo(boxes):
+    """
+    批量将 (N,4) 的 [x_top_left, y_top_left, width, height] 转换为YOLO格式
+    假设输入坐标已经是归一化的(0-1), 框按角点裁剪到0-1范围内
+
+    参数:
+        boxes: (N,4) 数组或嵌套列表
+
+    返回:
+        yolo_boxes: (N,4) float64数组 [x_center, y_center, width, height]
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    top_left = np.clip(boxes[:, :2], 0.0, 1.0)
+    bottom_right = np.clip(boxes[:, :2] + boxes[:, 2:], 0.0, 1.0)
+    yolo_boxes = np.empty_like(boxes)
+    yolo_boxes[:, :2] = (top_left + bottom_right) / 2.0
+    yolo_boxes[:, 2:] = bottom_right - top_left
+    return yolo_boxes
+
+def format_yolo_lines(class_ids, yolo_boxes):
+    """
+    将类别ID和YOLO格式的框格式化为标签行
+
+    参数:
+        class_ids: (N,) 类别ID
+        yolo_boxes: (N,4) YOLO格式的框
+
+    返回:
+        lines: 长度为N的字符串列表, 每行 "class x y w h"
+    """
+    if len(yolo_boxes) == 0:
+        return []
+    rows = np.column_stack((np.asarray(class_ids, dtype=np.float64), yolo_boxes))
+    buf = io.StringIO()
+    np.savetxt(buf, rows, fmt=('%d', '%.6f', '%.6f', '%.6f', '%.6f'))
+    return buf.getvalue().splitlines()
+
+def _yolo_label_texts(batch, class_mapping):
+    """
+    将一批标注一次性转换为YOLO格式的标签文本
+
+    每个框使用与之对应的标签 (labels[i]), 而不是总取第一个标签。
+    标签不在 class_mapping 中的框(如HaGRID每只手的 no_gesture 框)被跳过, 不会归入任何类别;
+    需要保留时在 class_mapping 中显式加入该标签
 
-def json_to_yolo(json_data, output_dir, class_mapping=None):
+    返回:
+        texts: 与batch一一对应的标签文本列表, 标签数量少于边界框数量的条目为 None(跳过并打印警告)
+    """
+    boxes = []
+    class_ids = []
+    counts = []
+    for image_id, annotations in batch:
+        bboxes = annotations.get("bboxes", [])
+        labels = annotations.get("labels", [])
+        if len(labels) < len(bboxes):
+            print(f"警告: {image_id} 的标签数量少于边界框数量, 已跳过")
+            counts.append(None)
+            continue
+        mapped = [(bbox, class_mapping[label]) for bbox, label in zip(bboxes, labels) if label in class_mapping]
+        boxes.extend(bbox for bbox, _ in mapped)
+        class_ids.extend(class_id for _, class_id in mapped)
+        counts.append(len(mapped))
+
+    lines = format_yolo_lines(class_ids, convert_bboxes_to_yolo(boxes))
+
+    texts = []
+    start = 0
+    for count in counts:
+        if count is None:
+            texts.append(None)
+            continue
+        texts.append('\n'.join(lines[start:start + count]))
+        start += count
+    return texts
+
+def _write_label_batch(batch, output_dir, class_mapping, prev_hashes=None):
+    """
+    将一批标注写入标签文件, 每个文件整体一次写入
+
+    参数:
+        prev_hashes: 可选的 {image_id: 上次输出的哈希}, 内容未变化时跳过写入
+
+    返回:
+        rows: [(image_id, 输出标签哈希, 是否写入)], 不包含被跳过的条目
+    """
+    rows = []
+    for (image_id, _), text in zip(batch, _yolo_label_texts(batch, class_mapping)):
+        if text is None:
+            continue
+        out_hash = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        if prev_hashes is not None and prev_hashes.get(image_id) == out_hash:
+            rows.append((image_id, out_hash, False))
+            continue
+        with open(output_dir / f"{image_id}.txt", 'w', buffering=1 << 16) as f:
+            f.write(text)
+        rows.append((image_id, out_hash, True))
+    return rows
+
+def _source_hash(annotations, class_mapping):
+    """标注条目、映射后类别ID和转换器版本的哈希, 类别映射或转换逻辑变化也会使条目失效"""
+    class_ids = [class_mapping.get(label) for label in annotations.get("labels", [])]
+    payload = json.dumps([CONVERTER_VERSION, annotations, class_ids], sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(payload.encode(), digest_size=16).digest()
+
+class ConversionManifest:
+    """
+    增量转换清单, 以SQLite文件保存在输出目录中
+
+    记录每条源标注的哈希和输出标签的哈希, 重新转换时跳过未变化的条目,
+    只重写变化的条目, 并删除源条目已消失的标签文件
+    """
+
+    FILENAME = '.convert_manifest.sqlite'
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.output_dir / self.FILENAME))
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS labels (
+                image_id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                src_hash BLOB NOT NULL,
+                out_hash BLOB NOT NULL,
+                generation INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS labels_source ON labels (source, generation);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        # 每次运行使用新的代数, 运行结束时代数较旧的条目即为已消失的条目
+        self.generation = int(row[0]) + 1 if row else 1
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)", (str(self.generation),))
+
+        # 列出一次已有的标签文件, 被手动删除的标签会重新生成
+        self.existing = {
+            entry.name[:-4] for entry in os.scandir(self.output_dir)
+            if entry.name.endswith('.txt')
+        }
+
+    def split_batch(self, batch, source, class_mapping):
+        """
+        将一批条目分为需要转换的条目和未变化的条目
+
+        返回:
+            changed: 需要转换的 [(image_id, annotations)]
+            src_hashes: {image_id: 源哈希}, 仅包含需要转换的条目
+            prev_hashes: {image_id: 上次输出的哈希}
+        """
+        known = {}
+        image_ids = [image_id for image_id, _ in batch]
+        for i in range(0, len(image_ids), 500):
+            chunk = image_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            known.update(
+                (image_id, (src_hash, out_hash)) for image_id, src_hash, out_hash in self.conn.execute(
+                    f"SELECT image_id, src_hash, out_hash FROM labels WHERE image_id IN ({placeholders})", chunk)
+            )
+
+        changed = []
+        src_hashes = {}
+        prev_hashes = {}
+        unchanged = []
+        for image_id, annotations in batch:
+            src_hash = _source_hash(annotations, class_mapping)
+            prev = known.get(image_id)
+            if image_id in self.existing and prev is not None:
+                if prev[0] == src_hash:
+                    unchanged.append((self.generation, source, image_id))
+                    continue
+                prev_hashes[image_id] = prev[1]
+            changed.append((image_id, annotations))
+            src_hashes[image_id] = src_hash
+
+        self.conn.executemany("UPDATE labels SET generation = ?, source = ? WHERE image_id = ?", unchanged)
+        return changed, src_hashes, prev_hashes
+
+    def record(self, rows, source, src_hashes):
+        """记录已转换条目的源哈希和输出哈希"""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO labels VALUES (?, ?, ?, ?, ?)",
+            [(image_id, source, src_hashes[image_id], out_hash, self.generation) for image_id, out_hash, _ in rows]
+        )
+
+    def remove_stale(self, sources):
+        """
+        删除本次运行中未出现的条目对应的标签文件
+
+        参数:
+            sources: 本次运行覆盖的源(JSON文件名), 只清理这些源下的条目
+
+        返回:
+            removed: 删除的标签数量
+        """
+        removed = 0
+        for source in sources:
+            stale = [row[0] for row in self.conn.execute(
+                "SELECT image_id FROM labels WHERE source = ? AND generation < ?", (source, self.generation))]
+            for image_id in stale:
+                try:
+                    os.remove(self.output_dir / f"{image_id}.txt")
+                except FileNotFoundError:
+                    pass
+            self.conn.execute("DELETE FROM labels WHERE source = ? AND generation < ?", (source, self.generation))
+            removed += len(stale)
+        return removed
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+def _convert_entries(entries, output_dir, class_mapping, workers=8, batch_size=2000, report_every=50000,
+                     manifest=None, source=None):
+    """
+    通过线程池分批写入标签文件
+
+    正在处理的批次数量不超过 workers*2, 因此内存占用与输入大小无关
+
+    参数:
+        manifest: 可选的 ConversionManifest, 提供时跳过未变化的条目
+        source: 条目所属的源名称, 与manifest一起使用
+
+    返回:
+        converted: 已写入的标签数量
+        skipped: 未变化而跳过的标签数量
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    converted = 0
+    skipped = 0
+    next_report = report_every
+    pending = deque()
+
+    def drain(limit):
+        nonlocal converted, skipped, next_report
+        while len(pending) > limit:
+            future, src_hashes = pending.popleft()
+            rows = future.result()
+            written = sum(1 for row in rows if row[2])
+            converted += written
+            skipped += len(rows) - written
+            if manifest is not None:
+                manifest.record(rows, source, src_hashes)
+                manifest.conn.commit()
+            if converted + skipped >= next_report:
+                print(f"已处理 {converted + skipped} 张图片的标注数据 (写入 {converted}, 跳过 {skipped})")
+                next_report += report_every
+
+    def submit(batch):
+        nonlocal skipped
+        src_hashes = prev_hashes = None
+        if manifest is not None:
+            total = len(batch)
+            batch, src_hashes, prev_hashes = manifest.split_batch(batch, source, class_mapping)
+            skipped += total - len(batch)
+        pending.append((pool.submit(_write_label_batch, batch, output_dir, class_mapping, prev_hashes), src_hashes))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        batch = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                submit(batch)
+                batch = []
+                drain(workers * 2)
+        if batch:
+            submit(batch)
+        drain(0)
+
+    return converted, skipped
+
+def json_to_yolo(json_data, output_dir, class_mapping=None, workers=8, batch_size=2000):
     """
     将JSON数据转换为YOLO格式
-    
+
     参数:
         json_data: 包含标注数据的JSON字典
         output_dir: 输出目录路径
         class_mapping: 类别名称到ID的映射字典
+        workers: 写入标签文件的线程数
+        batch_size: 每批写入的图片数量
     """
-    # 创建输出目录
-    Path(output_dir).mkdir(parents=True, exist_ok=True)
-    
     # 默认类别映射
     if class_mapping is None:
         class_mapping = {"ok": 0}  # 根据实际类别设置
-    
-    # 处理每个条目
-    for image_id, annotations in json_data.items():
-        # 准备YOLO格式内容
-        yolo_lines = []
-        
-        # 处理每个边界框
-        for bbox in annotations.get("bboxes", []):
-            x_tl, y_tl, width, height = bbox
-            
-            # 转换为YOLO格式
-            x_center, y_center, width, height = convert_bbox_to_yolo(x_tl, y_tl, width, height)
-            
-            # 获取类别ID
-            label = annotations["labels"][0]  # 取第一个标签
-            class_id = class_mapping.get(label, 0)  # 默认为0
-            
-            # 构建YOLO格式行
-            yolo_line = f"{class_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}"
-            yolo_lines.append(yolo_line)
-        
-        # 写入文件 (假设image_id也是文件名)
-        output_path = Path(output_dir) / f"{image_id}.txt"
-        with open(output_path, 'w') as f:
-            f.write('\n'.join(yolo_lines))
-        
-        print(f"已转换 {image_id} 的标注数据")
+
+    converted, _ = _convert_entries(json_data.items(), output_dir, class_mapping, workers, batch_size)
+    print(f"完成! 共转换 {converted} 张图片的标注数据")
+
+def convert_annotations_dir(annotations_dir, output_dir, class_mapping, workers=8, batch_size=2000,
+                            report_every=50000, incremental=True):
+    """
+    流式转换整个标注目录下的所有JSON文件为YOLO格式
+
+    参数:
+        annotations_dir: 标注目录(如 ./annotations/train), 包含每个手势的JSON文件
+        output_dir: 输出目录路径
+        class_mapping: 类别名称到ID的映射字典, 只转换文件名在映射中的JSON文件,
+            标签不在映射中的框被跳过
+        workers: 写入标签文件的线程数
+        batch_size: 每批写入的图片数量
+        report_every: 每转换多少张图片打印一次进度
+        incremental: 是否使用输出目录中的清单进行增量转换
+    """
+    json_files = sorted(
+        path for path in Path(annotations_dir).glob('*.json')
+        if path.stem in class_mapping
+    )
+    if not json_files:
+        # 目录不存在或路径写错时不能把之前转换的标签当作已消失的条目删除
+        print(f"在 {annotations_dir} 中未找到与类别映射匹配的标注文件, 未做任何修改")
+        return
+
+    manifest = ConversionManifest(output_dir) if incremental else None
+    converted = skipped = 0
+    try:
+        for json_path in json_files:
+            print(f"正在处理 {json_path.name} ...")
+            counts = _convert_entries(iter_annotations(json_path), output_dir, class_mapping, workers, batch_size,
+                                      report_every, manifest, json_path.stem)
+            converted += counts[0]
+            skipped += counts[1]
+
+        removed = 0
+        if manifest is not None:
+            # 只清理本次处理过的JSON文件中已消失的条目; 映射中某个类别的JSON文件缺失时保留其旧标签
+            removed = manifest.remove_stale([json_path.stem for json_path in json_files])
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+    print(f"完成! 共处理 {len(json_files)} 个文件: 写入 {converted}, 跳过 {skipped}, 删除 {removed} 个标签文件")
 
 # 示例使用
 if __name__ == "__main__":
-    with open("./annotations/train/three_gun.json") as f:
-        json_data = json.load(f)
     # 类别映射
     class_mapping = {
         "three_gun": 3,
         }  # 根据实际情况添加更多类别
-    
+
     # 转换为YOLO格式
-    json_to_yolo(json_data, "train/labels", class_mapping)
\ No newline at end of file
+    convert_annotations_dir("./annotations/train", "train/labels", class_mapping)
@@ -0,0 +1,318 @@
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from label_parser import class_histograms
+
+SUBSETS = ('train', 'val', 'test')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+INDEX_DIRNAME = '.yolo_index'
+INDEX_VERSION = 2
+
+# 列式存储的各列, 每列保存为一个可mmap的 .npy 文件
+COLUMNS = ('split', 'stem', 'image_name', 'label_mtime', 'label_size', 'image_mtime', 'class_hist', 'invalid')
+
+def detect_splits(root):
+    """根目录下直接有labels时视为单个划分(''), 否则返回存在的 train/val/test 划分"""
+    root = Path(root)
+    if (root / 'labels').is_dir():
+        return ('',)
+    return tuple(subset for subset in SUBSETS if (root / subset / 'labels').is_dir())
+
+class DatasetIndex:
+    """
+    YOLO数据集的持久化索引
+
+    用 os.scandir 扫描一次 <root>/<split>/images 和 <root>/<split>/labels,
+    每个文件名(不含扩展名)一行, 记录所在划分、图片文件名、标签的mtime和大小、
+    图片mtime、每个类别的框数量以及类别ID无效的框数量。索引以列式 .npy 文件保存在 <root>/.yolo_index 中,
+    加载时使用mmap; 刷新时只重新解析mtime或大小变化的标签文件
+
+    没有标签的图片和没有图片的标签也会被记录, 分别以 label_size == -1 和
+    image_name == '' 表示
+    """
+
+    def __init__(self, root, splits=None, workers=None):
+        """
+        参数:
+            root: 数据集根目录
+            splits: 划分名称列表, None时自动检测, ('',) 表示根目录直接包含images和labels
+            workers: 解析标签时的进程数, 默认为CPU核数
+        """
+        self.root = Path(root)
+        self.workers = workers
+        self.splits = tuple(splits) if splits is not None else detect_splits(self.root)
+        self.index_dir = self.root / INDEX_DIRNAME
+        self.columns = self._empty_columns(0)
+
+    @classmethod
+    def open(cls, root, splits=None, refresh=True, workers=None):
+        """加载已有索引, 默认按mtime增量刷新并在有变化时保存"""
+        index = cls(root, splits, workers)
+        index.load()
+        if refresh and index.refresh():
+            index.save()
+        return index
+
+    @staticmethod
+    def _empty_columns(num_classes):
+        return {
+            'split': np.zeros(0, dtype=np.uint8),
+            'stem': np.zeros(0, dtype='<U1'),
+            'image_name': np.zeros(0, dtype='<U1'),
+            'label_mtime': np.zeros(0, dtype=np.int64),
+            'label_size': np.zeros(0, dtype=np.int64),
+            'image_mtime': np.zeros(0, dtype=np.int64),
+            'class_hist': np.zeros((0, num_classes), dtype=np.int32),
+            'invalid': np.zeros(0, dtype=np.int32),
+        }
+
+    def __len__(self):
+        return len(self.columns['stem'])
+
+    def load(self):
+        """从磁盘加载索引, 不存在或划分不一致时保持为空"""
+        meta_path = self.index_dir / 'meta.json'
+        if not meta_path.exists():
+            return False
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get('version') != INDEX_VERSION or tuple(meta.get('splits', ())) != self.splits:
+            return False
+        self.columns = {
+            name: np.load(self.index_dir / f"{name}.npy", mmap_mode='r')
+            for name in COLUMNS
+        }
+        return True
+
+    def save(self):
+        """保存索引, 每列先写临时文件再替换, meta.json最后写入"""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        for name in COLUMNS:
+            tmp_path = self.index_dir / f"{name}.tmp.npy"
+            np.save(tmp_path, np.ascontiguousarray(self.columns[name]))
+            os.replace(tmp_path, self.index_dir / f"{name}.npy")
+        meta = {'version': INDEX_VERSION, 'splits': list(self.splits), 'count': len(self)}
+        with open(self.index_dir / 'meta.json.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(self.index_dir / 'meta.json.tmp', self.index_dir / 'meta.json')
+
+    def _scan_images(self, images_dir):
+        """扫描图片目录, 返回 {stem: 文件名}, 同名多扩展名时按 IMAGE_EXTENSIONS 的顺序优先"""
+        images = {}
+        priority = {}
+        try:
+            entries = os.scandir(images_dir)
+        except FileNotFoundError:
+            return images
+        with entries:
+            for entry in entries:
+                stem, ext = os.path.splitext(entry.name)
+                ext = ext.lower()
+                if ext not in IMAGE_EXTENSIONS or not entry.is_file():
+                    continue
+                rank = IMAGE_EXTENSIONS.index(ext)
+                if stem not in priority or rank < priority[stem]:
+                    images[stem] = entry.name
+                    priority[stem] = rank
+        return images
+
+    def _scan_labels(self, labels_dir):
+        """扫描标签目录, 返回 {stem: (mtime_ns, size)}"""
+        labels = {}
+        try:
+            entries = os.scandir(labels_dir)
+        except FileNotFoundError:
+            return labels
+        with entries:
+            for entry in entries:
+                if not entry.name.endswith('.txt') or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                labels[entry.name[:-4]] = (stat.st_mtime_ns, stat.st_size)
+        return labels
+
+    def refresh(self):
+        """
+        重新扫描目录并增量更新索引
+
+        返回:
+            changed: 索引是否发生变化
+        """
+        old = self.columns
+        old_rows = {
+            (int(split), stem): i
+            for i, (split, stem) in enumerate(zip(old['split'], old['stem']))
+        }
+
+        rows = []
+        parse_rows = []
+        parse_paths = []
+        changed = False
+
+        for split_idx, split in enumerate(self.splits):
+            split_dir = self.root / split
+            images = self._scan_images(split_dir / 'images')
+            labels = self._scan_labels(split_dir / 'labels')
+
+            for stem in sorted(images.keys() | labels.keys()):
+                image_name = images.get(stem, '')
+                label_mtime, label_size = labels.get(stem, (0, -1))
+                old_i = old_rows.get((split_idx, stem))
+
+                # 图片未变化时沿用旧的mtime, 只对新出现的图片调用stat
+                if not image_name:
+                    image_mtime = 0
+                elif old_i is not None and old['image_name'][old_i] == image_name:
+                    image_mtime = int(old['image_mtime'][old_i])
+                else:
+                    image_mtime = os.stat(split_dir / 'images' / image_name).st_mtime_ns
+
+                hist = None
+                if label_size < 0:
+                    hist = -1
+                elif (old_i is not None and old['label_mtime'][old_i] == label_mtime
+                      and old['label_size'][old_i] == label_size):
+                    hist = old_i
+                else:
+                    parse_rows.append(len(rows))
+                    parse_paths.append(split_dir / 'labels' / f"{stem}.txt")
+
+                if old_i is None or hist is None or image_mtime != old['image_mtime'][old_i] \
+                        or image_name != old['image_name'][old_i] or label_size != old['label_size'][old_i]:
+                    changed = True
+                rows.append((split_idx, stem, image_name, label_mtime, label_size, image_mtime, hist))
+
+        if len(rows) != len(old_rows):
+            changed = True
+        if not changed:
+            return False
+
+        # 变化的标签文件批量并行解析
+        parsed, parsed_invalid = class_histograms(parse_paths, self.workers)
+        if parsed_invalid.any():
+            print(f"警告: {int(parsed_invalid.sum())} 个框的类别ID无效, 未计入类别统计, "
+                  f"可用 validate_labels.py 检查")
+        num_classes = max(old['class_hist'].shape[1], parsed.shape[1])
+
+        columns = self._empty_columns(num_classes)
+        n = len(rows)
+        columns['split'] = np.fromiter((row[0] for row in rows), dtype=np.uint8, count=n)
+        columns['stem'] = np.array([row[1] for row in rows], dtype=str) if n else columns['stem']
+        columns['image_name'] = np.array([row[2] for row in rows], dtype=str) if n else columns['image_name']
+        columns['label_mtime'] = np.fromiter((row[3] for row in rows), dtype=np.int64, count=n)
+        columns['label_size'] = np.fromiter((row[4] for row in rows), dtype=np.int64, count=n)
+        columns['image_mtime'] = np.fromiter((row[5] for row in rows), dtype=np.int64, count=n)
+
+        class_hist = np.zeros((n, num_classes), dtype=np.int32)
+        invalid = np.zeros(n, dtype=np.int32)
+        old_hist = old['class_hist']
+        reused = [(i, row[6]) for i, row in enumerate(rows) if row[6] is not None and row[6] >= 0]
+        if reused:
+            new_rows, old_rows_idx = map(list, zip(*reused))
+            class_hist[new_rows, :old_hist.shape[1]] = old_hist[old_rows_idx]
+            invalid[new_rows] = old['invalid'][old_rows_idx]
+        if parse_rows:
+            class_hist[parse_rows, :parsed.shape[1]] = parsed
+            invalid[parse_rows] = parsed_invalid
+        columns['class_hist'] = class_hist
+        columns['invalid'] = invalid
+
+        self.columns = columns
+        return True
+
+    # ---- 查询接口 ----
+
+    @property
+    def box_counts(self):
+        """每个文件的框数量(不含类别ID无效的框)"""
+        return self.columns['class_hist'].sum(axis=1)
+
+    def invalid_count(self, split=None):
+        """类别ID无效(负数、非整数、无法解析或过大)而未计入类别统计的框数量"""
+        rows = self.select(split, require_image=False)
+        return int(np.asarray(self.columns['invalid'][rows]).sum())
+
+    def select(self, split=None, require_image=True, require_label=True):
+        """
+        按条件筛选行
+
+        参数:
+            split: 划分名称, None表示全部
+            require_image: 只返回有图片的行
+            require_label: 只返回有标签的行
+
+        返回:
+            rows: 行号数组
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if split is not None:
+            if split not in self.splits:
+                return np.zeros(0, dtype=np.int64)
+            mask &= self.columns['split'] == self.splits.index(split)
+        if require_image:
+            mask &= self.columns['image_name'] != ''
+        if require_label:
+            mask &= self.columns['label_size'] >= 0
+        return np.flatnonzero(mask)
+
+    def rows_with_class(self, class_id, split=None):
+        """返回包含指定类别且图片和标签都存在的行号"""
+        rows = self.select(split)
+        hist = self.columns['class_hist']
+        if class_id < 0 or class_id >= hist.shape[1]:
+            return rows[:0]
+        return rows[np.asarray(hist[rows, class_id]) > 0]
+
+    def image_path(self, row):
+        image_name = str(self.columns['image_name'][row])
+        if not image_name:
+            return None
+        return self.root / self.splits[self.columns['split'][row]] / 'images' / image_name
+
+    def label_path(self, row):
+        if self.columns['label_size'][row] < 0:
+            return None
+        split = self.splits[self.columns['split'][row]]
+        return self.root / split / 'labels' / f"{self.columns['stem'][row]}.txt"
+
+    def class_set(self, row):
+        """某个文件中出现的类别集合"""
+        return set(np.flatnonzero(self.columns['class_hist'][row]).tolist())
+
+    def class_counts(self, split=None):
+        """
+        统计各类别的框数量
+
+        返回:
+            class_counts: 字典 {class_id: count}, 按class_id排序
+        """
+        rows = self.select(split, require_image=False)
+        totals = np.asarray(self.columns['class_hist'][rows]).sum(axis=0)
+        return {int(class_id): int(totals[class_id]) for class_id in np.flatnonzero(totals)}
+
+    def files_by_class(self, split=None):
+        """
+        返回 {class_id: [(图片路径, 标签路径)]}, 只包含图片和标签都存在的文件
+        """
+        class_files = defaultdict(list)
+        rows = self.select(split)
+        hist = np.asarray(self.columns['class_hist'][rows])
+        for row, row_hist in zip(rows, hist):
+            paths = (self.image_path(row), self.label_path(row))
+            for class_id in np.flatnonzero(row_hist):
+                class_files[int(class_id)].append(paths)
+        return class_files
+
+if __name__ == "__main__":
+    # 配置参数
+    DATASET_DIR = "./totol_datasets"  # 替换为你的数据集目录
+
+    index = DatasetIndex.open(DATASET_DIR)
+    print(f"索引 {DATASET_DIR}: {len(index)} 个文件, 划分 {index.splits}")
+    for split in index.splits:
+        print(f"{split or '.'}: {len(index.select(split))} 张带标签的图片, 类别分布 {index.class_counts(split)}, "
+              f"无效框 {index.invalid_count(split)}")
@@ -0,0 +1,184 @@
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+def results_to_array(result):
+    """将 ultralytics 的单帧 Results 转为 (N,6) 数组 [x1, y1, x2, y2, conf, cls]"""
+    if isinstance(result, np.ndarray):
+        return result
+    return result.boxes.data.cpu().numpy()[:, :6]
+
+def load_ground_truth(label_path, width, height):
+    """
+    读取YOLO标签并转换为像素坐标
+
+    返回:
+        gt: (M,5) 数组 [cls, x1, y1, x2, y2], 标签不存在时为空
+    """
+    if not os.path.exists(label_path):
+        return np.zeros((0, 5))
+    rows = np.loadtxt(label_path, ndmin=2, usecols=range(5)) if os.path.getsize(label_path) else np.zeros((0, 5))
+    gt = np.empty((len(rows), 5))
+    gt[:, 0] = rows[:, 0]
+    gt[:, 1] = (rows[:, 1] - rows[:, 3] / 2) * width
+    gt[:, 2] = (rows[:, 2] - rows[:, 4] / 2) * height
+    gt[:, 3] = (rows[:, 1] + rows[:, 3] / 2) * width
+    gt[:, 4] = (rows[:, 2] + rows[:, 4] / 2) * height
+    return gt
+
+def box_iou(boxes1, boxes2):
+    """两组 xyxy 框的 IoU 矩阵, 形状 (len(boxes1), len(boxes2))"""
+    top_left = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    bottom_right = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area1 = (boxes1[:, 2:] - boxes1[:, :2]).prod(axis=1)
+    area2 = (boxes2[:, 2:] - boxes2[:, :2]).prod(axis=1)
+    return inter / np.maximum(area1[:, None] + area2[None, :] - inter, 1e-9)
+
+def match_detections(dets, gt, iou_thresholds=IOU_THRESHOLDS):
+    """
+    按置信度从高到低把检测框与同类别的真实框贪心匹配
+
+    返回:
+        tp: (len(dets), len(iou_thresholds)) bool, 每个阈值下是否为真正例
+    """
+    tp = np.zeros((len(dets), len(iou_thresholds)), dtype=bool)
+    if len(dets) == 0 or len(gt) == 0:
+        return tp
+    iou = box_iou(dets[:, :4], gt[:, 1:])
+    iou[dets[:, 5][:, None] != gt[:, 0][None, :]] = 0
+    order = np.argsort(-dets[:, 4], kind='stable')
+    for t, threshold in enumerate(iou_thresholds):
+        matched = np.zeros(len(gt), dtype=bool)
+        for i in order:
+            candidates = np.where(~matched & (iou[i] >= threshold), iou[i], -1)
+            j = int(np.argmax(candidates))
+            if candidates[j] >= 0:
+                matched[j] = True
+                tp[i, t] = True
+    return tp
+
+def average_precision(tp, conf, pred_cls, gt_cls, num_classes):
+    """
+    计算每个类别在各IoU阈值下的AP (COCO 101点插值)
+
+    返回:
+        ap: (num_classes, T) 数组, 没有真实框的类别为 nan
+    """
+    ap = np.full((num_classes, tp.shape[1]), np.nan)
+    recall_points = np.linspace(0, 1, 101)
+    for class_id in range(num_classes):
+        num_gt = int((gt_cls == class_id).sum())
+        if num_gt == 0:
+            continue
+        mask = pred_cls == class_id
+        if not mask.any():
+            ap[class_id] = 0.0
+            continue
+        order = np.argsort(-conf[mask], kind='stable')
+        tp_cum = np.cumsum(tp[mask][order], axis=0)
+        fp_cum = np.cumsum(~tp[mask][order], axis=0)
+        recall = tp_cum / num_gt
+        precision = tp_cum / (tp_cum + fp_cum)
+        for t in range(tp.shape[1]):
+            # 精度包络: 从右向左取累计最大值
+            envelope = np.maximum.accumulate(precision[::-1, t])[::-1]
+            idx = np.searchsorted(recall[:, t], recall_points, side='left')
+            ap[class_id, t] = np.where(idx < len(envelope), envelope[np.minimum(idx, len(envelope) - 1)], 0).mean()
+    return ap
+
+def list_images(images_dir):
+    with os.scandir(images_dir) as entries:
+        return sorted(
+            Path(images_dir) / entry.name for entry in entries
+            if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS
+        )
+
+class DetectionEvaluator:
+    """累积多张图片的检测结果和真实框, 计算mAP"""
+
+    def __init__(self, num_classes):
+        self.num_classes = num_classes
+        self.tp = []
+        self.conf = []
+        self.pred_cls = []
+        self.gt_cls = []
+
+    def add(self, dets, gt):
+        dets = np.asarray(dets, dtype=np.float64).reshape(-1, 6)
+        self.tp.append(match_detections(dets, gt))
+        self.conf.append(dets[:, 4])
+        self.pred_cls.append(dets[:, 5].astype(np.int64))
+        self.gt_cls.append(gt[:, 0].astype(np.int64))
+
+    def compute(self):
+        """
+        返回:
+            metrics: 字典, 包含 map50、map(0.5:0.95) 以及每个类别的 ap50 和 ap 数组
+        """
+        if not self.tp:
+            return {'map50': float('nan'), 'map': float('nan'), 'ap50': np.zeros(0), 'ap': np.zeros(0)}
+        ap = average_precision(
+            np.concatenate(self.tp), np.concatenate(self.conf), np.concatenate(self.pred_cls),
+            np.concatenate(self.gt_cls), self.num_classes
+        )
+        # 没有真实框的类别在所有阈值下均为nan
+        per_class = ap.mean(axis=1)
+        valid = ~np.isnan(ap[:, 0])
+        return {
+            'map50': float(ap[valid, 0].mean()) if valid.any() else float('nan'),
+            'map': float(per_class[valid].mean()) if valid.any() else float('nan'),
+            'ap50': ap[:, 0],
+            'ap': per_class,
+        }
+
+def list_image_file(list_path):
+    """读取 .txt 图片列表, 与 ultralytics 一致, 以 ./ 开头的路径相对于列表文件所在目录"""
+    list_path = Path(list_path)
+    with open(list_path, 'r') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    return [list_path.parent / line[2:] if line.startswith('./') else Path(line) for line in lines]
+
+def evaluate_folder(predict_fn, images_dir, labels_dir=None, num_classes=None, limit=None):
+    """
+    在带YOLO标签的图片目录上评估检测函数
+
+    参数:
+        predict_fn: predict_fn(frame) -> (N,6) 数组或 ultralytics Results 列表
+        images_dir: 图片目录, 或 .txt 图片列表(如 balance.py 'manifest' 模式的输出)
+        labels_dir: 标签目录, 默认为与每张图片的images目录同级的labels目录
+        num_classes: 类别数, 默认为标签和预测中的最大类别ID+1
+        limit: 可选, 只评估前limit张图片
+
+    返回:
+        metrics: DetectionEvaluator.compute() 的结果
+    """
+    images_dir = Path(images_dir)
+    image_paths = list_image_file(images_dir) if images_dir.is_file() else list_images(images_dir)
+    samples = []
+    for image_path in image_paths[:limit]:
+        frame = cv2.imread(str(image_path))
+        if frame is None:
+            continue
+        dets = predict_fn(frame)
+        if isinstance(dets, list):
+            dets = results_to_array(dets[0])
+        height, width = frame.shape[:2]
+        label_dir = Path(labels_dir) if labels_dir is not None else image_path.parent.parent / 'labels'
+        gt = load_ground_truth(label_dir / f"{image_path.stem}.txt", width, height)
+        samples.append((dets, gt))
+
+    if num_classes is None:
+        num_classes = 1 + int(max(
+            [d[:, 5].max() for d, _ in samples if len(d)] + [g[:, 0].max() for _, g in samples if len(g)],
+            default=-1
+        ))
+    evaluator = DetectionEvaluator(num_classes)
+    for dets, gt in samples:
+        evaluator.add(dets, gt)
+    return evaluator.compute()
@@ -0,0 +1,196 @@
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from convert_yolo import format_yolo_lines
+from dataset_index import DatasetIndex
+from label_parser import parse_labels, valid_class_mask
+
+def crop_region(boxes, width, height, padding=1.0, min_size=256, max_fraction=0.8):
+    """
+    计算包含所有框的裁剪区域
+
+    参数:
+        boxes: (N,4) 归一化的YOLO框 [x_center, y_center, w, h]
+        width, height: 图片尺寸
+        padding: 在所有框的外接矩形四周保留的上下文, 为外接矩形宽高的比例
+        min_size: 裁剪区域的最小边长(像素)
+        max_fraction: 裁剪面积超过原图该比例时不裁剪
+
+    返回:
+        (x1, y1, x2, y2) 像素坐标, 不需要裁剪时为 None
+    """
+    x1 = ((boxes[:, 0] - boxes[:, 2] / 2) * width).min()
+    y1 = ((boxes[:, 1] - boxes[:, 3] / 2) * height).min()
+    x2 = ((boxes[:, 0] + boxes[:, 2] / 2) * width).max()
+    y2 = ((boxes[:, 1] + boxes[:, 3] / 2) * height).max()
+
+    def expand(low, high, limit):
+        size = max((high - low) * (1 + 2 * padding), min(min_size, limit))
+        center = (low + high) / 2
+        start = int(np.clip(np.floor(center - size / 2), 0, max(limit - size, 0)))
+        end = int(min(np.ceil(start + size), limit))
+        # 保证框本身不会被裁掉
+        return min(start, int(max(np.floor(low), 0))), max(end, int(min(np.ceil(high), limit)))
+
+    x1, x2 = expand(x1, x2, width)
+    y1, y2 = expand(y1, y2, height)
+    if (x2 - x1) * (y2 - y1) > max_fraction * width * height:
+        return None
+    return x1, y1, x2, y2
+
+def rewrite_boxes(boxes, region, width, height):
+    """
+    把归一化的框转换到裁剪区域的坐标系, 超出区域的部分截断
+
+    返回:
+        new_boxes: (N,4) 相对裁剪区域的归一化框
+        retained: (N,) 每个框截断后保留的面积比例
+    """
+    x1, y1, x2, y2 = region
+    crop_w, crop_h = x2 - x1, y2 - y1
+    left = (boxes[:, 0] - boxes[:, 2] / 2) * width
+    top = (boxes[:, 1] - boxes[:, 3] / 2) * height
+    right = (boxes[:, 0] + boxes[:, 2] / 2) * width
+    bottom = (boxes[:, 1] + boxes[:, 3] / 2) * height
+    new_left, new_right = np.clip(left, x1, x2) - x1, np.clip(right, x1, x2) - x1
+    new_top, new_bottom = np.clip(top, y1, y2) - y1, np.clip(bottom, y1, y2) - y1
+
+    area = np.maximum((right - left) * (bottom - top), 1e-9)
+    retained = (new_right - new_left) * (new_bottom - new_top) / area
+    new_boxes = np.stack([
+        (new_left + new_right) / 2 / crop_w,
+        (new_top + new_bottom) / 2 / crop_h,
+        (new_right - new_left) / crop_w,
+        (new_bottom - new_top) / crop_h,
+    ], axis=1)
+    return new_boxes, retained
+
+def _crop_file(task):
+    """
+    工作进程: 裁剪一张图片并写出新的图片和标签
+
+    不需要裁剪的图片按原文件名原样复制, 不重新编码; 裁剪后的图片保存为JPEG
+
+    返回:
+        (原图字节数, 输出图片字节数, 每个框保留的面积比例), 图片无法读取时为 None
+    """
+    image_path, boxes, images_out, label_out, padding, min_size, max_fraction, quality = task
+    image = cv2.imread(str(image_path))
+    if image is None:
+        return None
+    height, width = image.shape[:2]
+    region = crop_region(boxes[:, 1:], width, height, padding, min_size, max_fraction) if len(boxes) else None
+
+    if region is None:
+        new_boxes, retained = boxes[:, 1:], np.ones(len(boxes))
+        image_out = images_out / image_path.name
+        shutil.copyfile(image_path, image_out)
+    else:
+        new_boxes, retained = rewrite_boxes(boxes[:, 1:], region, width, height)
+        x1, y1, x2, y2 = region
+        image_out = images_out / f"{image_path.stem}.jpg"
+        cv2.imwrite(str(image_out), image[y1:y2, x1:x2], [cv2.IMWRITE_JPEG_QUALITY, quality])
+    with open(label_out, 'w') as f:
+        f.write('\n'.join(format_yolo_lines(boxes[:, 0], new_boxes)))
+    return os.path.getsize(image_path), os.path.getsize(image_out), retained
+
+def crop_dataset(dataset_dir, output_dir, padding=1.0, min_size=256, max_fraction=0.8, quality=95,
+                 workers=None, chunk_size=64):
+    """
+    按YOLO标签把每张图片裁剪为包含所有手的区域(保留上下文), 写出缩小后的数据集
+
+    参数:
+        dataset_dir: 数据集目录(train/val/test划分或直接包含images和labels)
+        output_dir: 输出目录, 保持与输入相同的划分结构
+        padding: 在手的外接矩形四周保留的上下文比例
+        min_size: 裁剪区域的最小边长(像素)
+        max_fraction: 裁剪面积超过原图该比例时保留整张图片
+        quality: 输出JPEG质量
+        workers: 进程数, 默认为CPU核数
+        chunk_size: 每个进程任务包含的图片数
+
+    返回:
+        stats: 字典, 包含图片数、输入/输出字节数、每个类别的框数量、被截断的框数量,
+            以及因格式错误或类别ID无效而未写入的框数量
+    """
+    index = DatasetIndex.open(dataset_dir)
+    rows = index.select()
+    label_paths = [index.label_path(row) for row in rows]
+    boxes, file_idx = parse_labels(label_paths, workers, strict=False)
+    # 列数不足、无法解析或类别ID无效的行不会写入输出标签, 单独计数
+    valid = ~np.isnan(boxes).any(axis=1) & valid_class_mask(boxes[:, 0])
+    dropped = int((~valid).sum())
+    dropped_files = len(np.unique(file_idx[~valid]))
+    boxes, file_idx = boxes[valid], file_idx[valid]
+    starts = np.searchsorted(file_idx, np.arange(len(rows) + 1))
+
+    output_dir = Path(output_dir)
+    tasks = []
+    for i, row in enumerate(rows):
+        split_dir = output_dir / index.splits[index.columns['split'][row]]
+        image_path = index.image_path(row)
+        tasks.append((
+            image_path, boxes[starts[i]:starts[i + 1]],
+            split_dir / 'images', split_dir / 'labels' / label_paths[i].name,
+            padding, min_size, max_fraction, quality,
+        ))
+    for split in index.splits:
+        (output_dir / split / 'images').mkdir(parents=True, exist_ok=True)
+        (output_dir / split / 'labels').mkdir(parents=True, exist_ok=True)
+
+    bytes_in = bytes_out = 0
+    failed = 0
+    retained = np.ones(len(boxes))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for i, result in enumerate(pool.map(_crop_file, tasks, chunksize=chunk_size)):
+            if result is None:
+                failed += 1
+                retained[starts[i]:starts[i + 1]] = 0
+                continue
+            size_in, size_out, file_retained = result
+            bytes_in += size_in
+            bytes_out += size_out
+            retained[starts[i]:starts[i + 1]] = file_retained
+
+    class_ids = boxes[:, 0].astype(np.int64)
+    num_classes = int(class_ids.max()) + 1 if len(class_ids) else 0
+    stats = {
+        'images': len(rows) - failed,
+        'failed': failed,
+        'bytes_in': bytes_in,
+        'bytes_out': bytes_out,
+        'boxes_in': np.bincount(class_ids, minlength=num_classes),
+        'boxes_out': np.bincount(class_ids[retained > 0], minlength=num_classes),
+        'clipped': int(((retained > 0) & (retained < 0.999)).sum()),
+        'dropped': dropped,
+        'dropped_files': dropped_files,
+        'min_retained': float(retained.min()) if len(retained) else 1.0,
+    }
+    print_crop_stats(stats)
+    return stats
+
+def print_crop_stats(stats):
+    ratio = stats['bytes_in'] / stats['bytes_out'] if stats['bytes_out'] else float('nan')
+    print(f"\n裁剪了 {stats['images']} 张图片(失败 {stats['failed']} 张), "
+          f"{stats['bytes_in'] / 1e9:.2f} GB -> {stats['bytes_out'] / 1e9:.2f} GB (缩小 {ratio:.1f} 倍)")
+    print("\n| 类别 | 原始框数 | 保留框数 |")
+    print("|------|----------|----------|")
+    for class_id, (before, after) in enumerate(zip(stats['boxes_in'], stats['boxes_out'])):
+        if before:
+            print(f"| {class_id:4} | {before:8} | {after:8} |")
+    print(f"\n被截断的框: {stats['clipped']}, 最小面积保留比例: {stats['min_retained']:.3f}")
+    if stats['dropped']:
+        print(f"警告: {stats['dropped_files']} 个文件中的 {stats['dropped']} 个框格式错误或类别ID无效, "
+              f"未写入输出标签, 可用 validate_labels.py 检查")
+
+if __name__ == "__main__":
+    # 配置参数
+    DATASET_DIR = "./test_datasets"  # balance.py 输出的平衡数据集
+    OUTPUT_DIR = "./test_datasets_crop"
+
+    crop_dataset(DATASET_DIR, OUTPUT_DIR, padding=1.0, min_size=256)
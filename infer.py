@@ -1,61 +1,435 @@
+import hashlib
+import os
+import queue
+import shutil
+import threading
+from collections import deque
+from pathlib import Path
+from time import perf_counter, perf_counter_ns, sleep
+
 import cv2
+import numpy as np
 from ultralytics import YOLO
-from time import time
+
+from evaluate import evaluate_folder, list_images, results_to_array
+from metrics import Metrics
+from overlay import OverlayRenderer
+
+# 支持的推理后端, 'pytorch' 直接加载 .pt, 其余为 ultralytics 的导出格式
+BACKENDS = ('pytorch', 'onnx', 'openvino', 'torchscript')
+
+# 导出模型的缓存目录, 可通过环境变量 YOLO_GESTURE_CACHE 修改
+EXPORT_CACHE_DIR = Path(os.environ.get('YOLO_GESTURE_CACHE', Path.home() / '.cache' / 'yolo_gesture')) / 'exports'
+
+def file_hash(path, chunk_size=1 << 20):
+    """模型文件内容的sha256(前16位)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+# 导出结果的文件名, 与 ultralytics 导出时的命名一致
+EXPORT_NAMES = {
+    'onnx': '{stem}.onnx',
+    'openvino': '{stem}_openvino_model',
+    'torchscript': '{stem}.torchscript',
+}
+
+# 导出后的量化方式, 只影响缓存键和导出后的处理, 不传给 YOLO.export
+QUANT_MODES = {'dynamic_int8': 'onnx'}
+
+def export_model(model_path, backend, imgsz=640, cache_dir=EXPORT_CACHE_DIR, quant=None, **export_args):
+    """
+    把 .pt 模型导出为指定后端并缓存, 以模型哈希和输入尺寸为键, 再次调用时直接返回缓存
+
+    参数:
+        model_path: .pt 模型路径
+        backend: 'onnx' / 'openvino' / 'torchscript'
+        imgsz: 导出时的输入尺寸
+        cache_dir: 缓存目录
+        quant: 可选, 导出后的量化方式, 'dynamic_int8' 为 onnxruntime 动态量化(仅onnx);
+            量化模型使用独立的缓存键, 不会覆盖FP32导出
+        export_args: 传给 YOLO.export 的其它参数(如 int8=True), 也参与缓存键
+
+    返回:
+        exported_path: 导出的模型文件或目录
+    """
+    if backend not in BACKENDS or backend == 'pytorch':
+        raise ValueError(f"Unsupported export backend: {backend}")
+    if quant is not None and QUANT_MODES.get(quant) != backend:
+        raise ValueError(f"Unsupported quantization for {backend}: {quant}")
+    key = f"{file_hash(model_path)}_{backend}_{imgsz}"
+    if export_args:
+        key += '_' + hashlib.sha256(repr(sorted(export_args.items())).encode()).hexdigest()[:8]
+    if quant is not None:
+        key += f"_{quant}"
+    target_dir = Path(cache_dir) / key
+    target = target_dir / EXPORT_NAMES[backend].format(stem=Path(model_path).stem)
+    if target.exists():
+        return target
+
+    tmp_dir = Path(cache_dir) / f".{key}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    if quant == 'dynamic_int8':
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        source = export_model(model_path, backend, imgsz, cache_dir, **export_args)
+        print(f"Quantizing {source} ({quant})...")
+        quantize_dynamic(str(source), str(tmp_dir / target.name), weight_type=QuantType.QInt8)
+    else:
+        print(f"Exporting {model_path} to {backend} (imgsz={imgsz})...")
+        exported = Path(YOLO(model_path).export(format=backend, imgsz=imgsz, **export_args))
+        shutil.move(str(exported), str(tmp_dir / target.name))
+
+    # 先写入临时目录再重命名, 避免中断后留下不完整的缓存
+    shutil.rmtree(target_dir, ignore_errors=True)
+    os.replace(tmp_dir, target_dir)
+    return target
+
+class DropOldestQueue:
+    """
+    线程安全的有界队列
+
+    默认满时丢弃最旧的元素, 使消费者总是拿到最新的帧; block=True 时生产者等待空位,
+    用于需要处理每一帧的离线场景。close() 之后队列取空时 get() 返回 None
+    """
+
+    def __init__(self, maxsize=1, block=False):
+        self.maxsize = maxsize
+        self.block = block
+        self.total = 0
+        self.dropped = 0
+        self.closed = False
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def put(self, item):
+        with self._cond:
+            if self.block:
+                self._cond.wait_for(lambda: len(self._items) < self.maxsize or self.closed)
+                if self.closed:
+                    return
+            elif len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self.total += 1
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """取出最旧的元素, 超时抛出 queue.Empty, 已关闭且为空时返回 None"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self.closed, timeout):
+                raise queue.Empty
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+def open_source(source):
+    """
+    打开摄像头或视频文件
+
+    参数:
+        source: 摄像头ID(int或数字字符串)或视频文件路径
+
+    返回:
+        cap: cv2.VideoCapture
+        is_file: 是否为视频文件
+    """
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    return cv2.VideoCapture(source), not isinstance(source, int)
+
+def capture_loop(cap, frames, stop_event, pace_fps=None, metrics=None):
+    """
+    采集线程: 持续读取帧放入队列, 读完或收到停止信号后关闭队列
+
+    参数:
+        cap: cv2.VideoCapture
+        frames: DropOldestQueue, 元素为 (帧序号, 采集时间, 帧)
+        stop_event: threading.Event
+        pace_fps: 可选, 按该帧率读取视频文件以模拟实时摄像头
+        metrics: 可选的 Metrics, 记录 capture 阶段耗时
+    """
+    frame_id = 0
+    interval = 1.0 / pace_fps if pace_fps else 0.0
+    next_time = perf_counter()
+    try:
+        while not stop_event.is_set():
+            start = perf_counter_ns()
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if metrics is not None:
+                metrics.record('capture', perf_counter_ns() - start, start)
+            frames.put((frame_id, perf_counter(), frame))
+            frame_id += 1
+            if interval:
+                next_time += interval
+                delay = next_time - perf_counter()
+                if delay > 0:
+                    sleep(delay)
+    finally:
+        frames.close()
+
+class AdaptiveInference:
+    """
+    自适应分辨率和ROI推理
+
+    没有上一帧检测结果时, 以较小的扫描尺寸扫描整帧寻找手; 之后只把包含上一帧所有检测框
+    (按 padding 外扩)的区域裁剪出来, 以ROI尺寸推理, 再把框映射回原图坐标。
+    整帧扫描和ROI推理各自在 sizes 中选择输入尺寸, 并根据各自耗时的滑动平均升降,
+    使每帧耗时保持在 latency_budget_ms 以内。ROI从较小的尺寸开始: 手的裁剪区域本身就小,
+    放大到最大尺寸的耗时与整帧推理相当, 没有收益。
+    ROI中没有检测到目标, 或每隔 rescan_every 帧, 重新扫描整帧以发现新出现的手
+    """
+
+    def __init__(self, detector, scan_imgsz=320, roi_imgsz=320, sizes=(256, 320, 416, 512, 640),
+                 latency_budget_ms=30.0, padding=0.5, min_roi=0.25, rescan_every=15, smoothing=0.2):
+        """
+        参数:
+            detector: UltralyticsYOLODetector 实例(需使用支持动态输入尺寸的 pytorch 后端)
+            scan_imgsz: 整帧扫描的初始输入尺寸
+            roi_imgsz: ROI推理的初始输入尺寸
+            sizes: 可选的输入尺寸(需为32的倍数), 从小到大
+            latency_budget_ms: 每帧推理的目标耗时(毫秒)
+            padding: ROI在检测框外扩的比例(相对框的宽高)
+            min_roi: ROI边长占整帧边长的最小比例
+            rescan_every: 每隔多少帧强制扫描整帧
+            smoothing: 耗时滑动平均的系数
+        """
+        if detector.backend != 'pytorch':
+            raise ValueError("Adaptive inference needs dynamic input sizes, use the pytorch backend")
+        self.detector = detector
+        self.sizes = sorted(sizes)
+        # 每种推理各自的尺寸下标和耗时滑动平均
+        self.size_index = {'scan': self._nearest(scan_imgsz), 'roi': self._nearest(roi_imgsz)}
+        self.avg_latency = {'scan': None, 'roi': None}
+        self.latency_budget = latency_budget_ms / 1000.0
+        self.padding = padding
+        self.min_roi = min_roi
+        self.rescan_every = rescan_every
+        self.smoothing = smoothing
+        self.previous = np.zeros((0, 6), dtype=np.float32)
+        self.frames_since_scan = 0
+        self.scans = 0
+        self.roi_passes = 0
+
+    def _nearest(self, imgsz):
+        """sizes 中不大于 imgsz 的最大尺寸的下标"""
+        return max(int(np.searchsorted(self.sizes, imgsz, side='right')) - 1, 0)
+
+    @property
+    def scan_imgsz(self):
+        return self.sizes[self.size_index['scan']]
+
+    @property
+    def roi_imgsz(self):
+        return self.sizes[self.size_index['roi']]
+
+    def _roi(self, frame_shape):
+        """包含上一帧所有检测框的外扩区域 (x1, y1, x2, y2)"""
+        height, width = frame_shape[:2]
+        x1, y1 = self.previous[:, :2].min(axis=0)
+        x2, y2 = self.previous[:, 2:4].max(axis=0)
+        pad_x = max((x2 - x1) * self.padding, (width * self.min_roi - (x2 - x1)) / 2, 0)
+        pad_y = max((y2 - y1) * self.padding, (height * self.min_roi - (y2 - y1)) / 2, 0)
+        return (int(max(x1 - pad_x, 0)), int(max(y1 - pad_y, 0)),
+                int(min(x2 + pad_x, width)), int(min(y2 + pad_y, height)))
+
+    def _adjust_size(self, kind, elapsed):
+        """kind 为 'scan' 或 'roi'; 超出预算时降低该推理的尺寸, 明显低于预算时提高"""
+        avg = self.avg_latency[kind]
+        avg = elapsed if avg is None else avg + self.smoothing * (elapsed - avg)
+        self.avg_latency[kind] = avg
+        if avg > self.latency_budget and self.size_index[kind] > 0:
+            self.size_index[kind] -= 1
+            self.avg_latency[kind] = None
+        elif avg < 0.6 * self.latency_budget and self.size_index[kind] < len(self.sizes) - 1:
+            self.size_index[kind] += 1
+            self.avg_latency[kind] = None
+
+    def predict(self, frame):
+        """
+        返回:
+            detections: (N,6) 原图坐标的检测数组
+        """
+        detections = None
+        if len(self.previous) and self.frames_since_scan < self.rescan_every:
+            start = perf_counter()
+            x1, y1, x2, y2 = self._roi(frame.shape)
+            detections = self.detector.predict(frame[y1:y2, x1:x2], raw=True, imgsz=self.roi_imgsz)[0]
+            self.roi_passes += 1
+            self.frames_since_scan += 1
+            self._adjust_size('roi', perf_counter() - start)
+            if len(detections):
+                detections[:, [0, 2]] += x1
+                detections[:, [1, 3]] += y1
+            else:
+                detections = None
+
+        if detections is None:
+            # 整帧低分辨率扫描
+            start = perf_counter()
+            detections = self.detector.predict(frame, raw=True, imgsz=self.scan_imgsz)[0]
+            self.scans += 1
+            self.frames_since_scan = 0
+            self._adjust_size('scan', perf_counter() - start)
+
+        self.previous = detections
+        return detections
 
 class UltralyticsYOLODetector:
-    def __init__(self, model_path, conf_thresh=0.5, iou_thresh=0.45):
+    def __init__(self, model_path, conf_thresh=0.5, iou_thresh=0.45, backend='pytorch', imgsz=640,
+                 classes=None, max_det=100, render=True, metrics=None, export_args=None):
         """
         初始化 Ultralytics YOLO 检测器
         
         参数:
-            model_path: 模型路径(.pt文件)
+            model_path: 模型路径(.pt文件, 或已导出的 .onnx / .torchscript / *_openvino_model 目录)
             conf_thresh: 置信度阈值(默认0.5)
             iou_thresh: NMS的IOU阈值(默认0.45)
+            backend: 推理后端, 见 BACKENDS; 非pytorch后端会把 .pt 导出并缓存, 之后启动直接加载缓存
+            imgsz: 导出和推理的输入尺寸
+            classes: 可选, 只检测这些类别(类别ID或名称, 如 ['gun', 'ok'])
+            max_det: 每帧最多保留的检测框数量
+            render: 是否绘制检测框, 无界面部署时设为False以省去绘制开销
+            metrics: 可选的 metrics.Metrics, 默认新建; 记录各阶段耗时
+            export_args: 可选, 导出 .pt 时传给 export_model 的参数(如 {'dynamic': True, 'batch': 4})
         """
-        # 加载模型
-        self.model = YOLO(model_path)
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}, choose from {BACKENDS}")
+        self.backend = backend
+        self.imgsz = imgsz
         
-        # 设置模型参数
-        self.model.conf = conf_thresh  # 置信度阈值
-        self.model.iou = iou_thresh    # NMS IOU阈值
+        # 加载模型
+        if backend != 'pytorch' and str(model_path).endswith('.pt'):
+            model_path = export_model(model_path, backend, imgsz, **(export_args or {}))
+        self.model_path = str(model_path)
+        self.model = YOLO(self.model_path, task='detect')
         
         # 获取类别名称
         self.class_names = self.model.names
         
+        # 推理参数, 每次调用 predict 时传给模型(YOLO 对象上的 conf / iou 属性不会生效)
+        self.conf_thresh = conf_thresh
+        self.iou_thresh = iou_thresh
+        self.max_det = max_det
+        self.classes = self.resolve_classes(classes)
+        self.renderer = OverlayRenderer(self.class_names, enabled=render)
+        self.adaptive = None
+        self.metrics = metrics if metrics is not None else Metrics()
+        
         print(f"Model classes: {self.class_names}")
     
-    def draw_detections(self, frame, results):
+    def resolve_classes(self, classes):
+        """把类别名称或ID列表转换为排序后的类别ID列表, None表示全部类别"""
+        if classes is None:
+            return None
+        name_to_id = {name: class_id for class_id, name in self.class_names.items()}
+        class_ids = set()
+        for item in classes:
+            if isinstance(item, str) and not item.isdigit():
+                if item not in name_to_id:
+                    raise ValueError(f"Unknown class {item}, choose from {list(name_to_id)}")
+                class_ids.add(name_to_id[item])
+            else:
+                class_ids.add(int(item))
+        return sorted(class_ids)
+    
+    def predict(self, source, raw=False, **overrides):
+        """
+        使用检测器的阈值、类别过滤、max_det 和输入尺寸执行推理
+        
+        参数:
+            source: 单帧图像或帧列表
+            raw: 为True时每帧返回 (N,6) float32 数组 [x1, y1, x2, y2, conf, cls],
+                 否则返回 ultralytics 的 Results
+            overrides: 覆盖本次调用的参数, 如 conf=0.001
+        
+        返回:
+            results: 每帧一个结果的列表
+        """
+        args = {
+            'conf': self.conf_thresh,
+            'iou': self.iou_thresh,
+            'classes': self.classes,
+            'max_det': self.max_det,
+            'imgsz': self.imgsz,
+            'verbose': False,
+        }
+        args.update(overrides)
+        start = perf_counter_ns()
+        results = self.model.predict(source, **args)
+        convert_start = perf_counter_ns()
+        speed = getattr(results[0], 'speed', None) if results else None
+        if raw:
+            results = [results_to_array(result).astype(np.float32, copy=False) for result in results]
+        self._record_predict(speed, len(results), start, convert_start)
+        return results
+    
+    def _record_predict(self, speed, batch_size, start, convert_start):
+        """
+        记录一次推理的 preprocess / model / postprocess 耗时
+        
+        ultralytics 的 Results.speed 给出每张图各阶段的平均毫秒数, 乘以批大小得到本次调用的耗时;
+        转换为 (N,6) 数组的时间计入 postprocess。没有 speed 时整次调用计为 model
+        """
+        convert_ns = perf_counter_ns() - convert_start
+        if not speed:
+            self.metrics.record('model', convert_start - start + convert_ns, start)
+            return
+        stage_start = start
+        for stage, key in (('preprocess', 'preprocess'), ('model', 'inference'), ('postprocess', 'postprocess')):
+            duration = int((speed.get(key) or 0.0) * 1e6 * batch_size)
+            if stage == 'postprocess':
+                duration += convert_ns
+            self.metrics.record(stage, duration, stage_start)
+            stage_start += duration
+    
+    def enable_adaptive(self, **kwargs):
+        """
+        开启自适应分辨率和ROI推理, run_camera 和 run_pipeline 随后使用该模式, 参数见 AdaptiveInference
+        
+        返回:
+            adaptive: AdaptiveInference 实例
+        """
+        self.adaptive = AdaptiveInference(self, **kwargs)
+        return self.adaptive
+    
+    def detect(self, frame):
+        """对单帧推理, 开启自适应模式时使用 AdaptiveInference, 返回 (N,6) 检测数组"""
+        if self.adaptive is not None:
+            return self.adaptive.predict(frame)
+        return self.predict(frame, raw=True)[0]
+    
+    def draw_detections(self, frame, detections):
         """
-        在图像上绘制检测结果
+        在图像上绘制检测结果, 每个类别使用固定颜色, 见 overlay.OverlayRenderer
         
         参数:
             frame: 原始图像帧
-            results: 检测结果
+            detections: (N,6) 检测数组(predict(raw=True) 的单帧结果), 或 ultralytics 的 Results 列表
         
         返回:
             frame: 绘制了检测结果的图像
         """
-        # 遍历所有检测结果
-        for result in results:
-            for box in result.boxes:
-                # 获取边界框坐标
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                
-                # 获取类别和置信度
-                conf = float(box.conf[0])
-                cls_id = int(box.cls[0])
-                cls_name = self.class_names[cls_id]
-                
-                # 绘制边界框
-                color = (0, 255, 0)  # 绿色
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                
-                # 绘制标签和置信度
-                label = f"{cls_name} {conf:.2f}"
-                cv2.putText(frame, label, (x1, y1-10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-        
-        return frame
+        if not isinstance(detections, np.ndarray):
+            detections = np.concatenate([results_to_array(result) for result in detections] or [np.zeros((0, 6))])
+        return self.renderer.render(frame, detections)
     
     def run_camera(self, camera_id=0, window_name="YOLO Detection"):
         """
@@ -71,48 +445,245 @@ class UltralyticsYOLODetector:
             print("Error: Could not open camera.")
             return
         
-        # 用于计算FPS
-        prev_time = 0
+        # 用于计算FPS, 第一帧没有上一帧时间, 不显示FPS
+        prev_time = None
         
         try:
             while True:
                 # 读取帧
-                ret, frame = cap.read()
+                with self.metrics.time('capture'):
+                    ret, frame = cap.read()
                 if not ret:
                     print("Error: Could not read frame.")
                     break
                 
                 # 执行检测
-                results = self.model(frame, verbose=False)  # verbose=False关闭控制台输出
+                detections = self.detect(frame)
                 
                 # 绘制检测结果
-                frame = self.draw_detections(frame, results)
+                with self.metrics.time('draw'):
+                    frame = self.draw_detections(frame, detections)
                 
                 # 计算并显示FPS
-                curr_time = time()
-                fps = 1 / (curr_time - prev_time)
+                curr_time = perf_counter()
+                if prev_time is not None and curr_time > prev_time:
+                    fps = 1 / (curr_time - prev_time)
+                    cv2.putText(frame, f"FPS: {int(fps)}", (10, 30), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
                 prev_time = curr_time
-                cv2.putText(frame, f"FPS: {int(fps)}", (10, 30), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
                 
-                # 显示结果
-                cv2.imshow(window_name, frame)
-                
-                # 按'q'退出
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                # 显示结果, 按'q'退出
+                with self.metrics.time('display'):
+                    cv2.imshow(window_name, frame)
+                    key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
                     break
         finally:
             # 释放资源
             cap.release()
             cv2.destroyAllWindows()
 
+    def _inference_loop(self, frames, results_queue, stop_event):
+        """推理线程: 从帧队列取最新帧推理, 结果放入渲染队列"""
+        try:
+            while not stop_event.is_set():
+                item = frames.get()
+                if item is None:
+                    break
+                frame_id, captured_at, frame = item
+                start = perf_counter()
+                detections = self.detect(frame)
+                results_queue.put((frame_id, captured_at, frame, detections, perf_counter() - start))
+        finally:
+            results_queue.close()
+
+    def run_pipeline(self, source=0, window_name="YOLO Detection", show=True, drop_frames=True,
+                     queue_size=1, max_frames=None, pace_fps=None):
+        """
+        以流水线方式运行检测: 采集线程、推理线程和渲染(主线程)通过有界队列连接
+
+        各阶段并行执行, 端到端延迟接近推理时间而不是各阶段之和
+
+        参数:
+            source: 摄像头ID或视频文件路径
+            window_name: 显示窗口名称
+            show: 是否显示窗口, False时可无界面运行(用于测试)
+            drop_frames: 队列满时丢弃最旧的帧; 为False时处理视频的每一帧
+            queue_size: 各队列的容量
+            max_frames: 可选, 渲染该数量的帧后停止
+            pace_fps: 可选, 按该帧率读取视频文件以模拟摄像头; 默认文件使用其自身帧率, 
+                      不丢帧时不限速
+
+        返回:
+            stats: 字典, 包含各阶段帧数、丢帧数、端到端延迟和推理时间统计(毫秒)
+        """
+        cap, is_file = open_source(source)
+        if not cap.isOpened():
+            print(f"Error: Could not open source {source}.")
+            return None
+        if is_file and pace_fps is None and drop_frames:
+            pace_fps = cap.get(cv2.CAP_PROP_FPS) or None
+
+        stop_event = threading.Event()
+        frames = DropOldestQueue(queue_size, block=not drop_frames)
+        results_queue = DropOldestQueue(queue_size, block=not drop_frames)
+        threads = [
+            threading.Thread(target=capture_loop, args=(cap, frames, stop_event, pace_fps, self.metrics), daemon=True),
+            threading.Thread(target=self._inference_loop, args=(frames, results_queue, stop_event), daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        latencies = []
+        infer_times = []
+        rendered = 0
+        prev_time = None
+        try:
+            while True:
+                item = results_queue.get()
+                if item is None:
+                    break
+                frame_id, captured_at, frame, detections, infer_time = item
+
+                if show:
+                    with self.metrics.time('draw'):
+                        frame = self.draw_detections(frame, detections)
+                    curr_time = perf_counter()
+                    if prev_time is not None and curr_time > prev_time:
+                        fps = 1 / (curr_time - prev_time)
+                        cv2.putText(frame, f"FPS: {int(fps)}", (10, 30),
+                                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                    prev_time = curr_time
+                    with self.metrics.time('display'):
+                        cv2.imshow(window_name, frame)
+                        key = cv2.waitKey(1) & 0xFF
+                    if key == ord('q'):
+                        break
+
+                latency = perf_counter() - captured_at
+                self.metrics.record('end_to_end', int(latency * 1e9))
+                latencies.append(latency)
+                infer_times.append(infer_time)
+                rendered += 1
+                if max_frames is not None and rendered >= max_frames:
+                    break
+        finally:
+            stop_event.set()
+            frames.close()
+            results_queue.close()
+            for thread in threads:
+                thread.join(timeout=5)
+            cap.release()
+            if show:
+                cv2.destroyAllWindows()
+
+        def summary(values):
+            if not values:
+                return {}
+            ms = np.asarray(values) * 1000
+            return {'mean': float(ms.mean()), 'p50': float(np.percentile(ms, 50)),
+                    'p95': float(np.percentile(ms, 95)), 'max': float(ms.max())}
+
+        stats = {
+            'captured': frames.total,
+            'rendered': rendered,
+            'dropped_capture': frames.dropped,
+            'dropped_render': results_queue.dropped,
+            'latency_ms': summary(latencies),
+            'inference_ms': summary(infer_times),
+        }
+        print(f"Pipeline stats: {stats}")
+        return stats
+
+def benchmark_backends(model_path, images_dir, labels_dir=None, backends=BACKENDS, imgsz=640, warmup=5, limit=200):
+    """
+    在held-out图片目录上比较各后端的延迟和精度
+
+    参数:
+        model_path: .pt 模型路径
+        images_dir: 图片目录(与images同级的labels目录中有YOLO标签时计算mAP)
+        labels_dir: 可选的标签目录
+        backends: 要比较的后端
+        imgsz: 输入尺寸
+        warmup: 计时前的预热次数
+        limit: 最多使用的图片数量
+
+    返回:
+        rows: 每个后端一行, 包含延迟(毫秒)和 map50 / map
+    """
+    images = [cv2.imread(str(path)) for path in list_images(images_dir)[:limit]]
+    images = [image for image in images if image is not None]
+    if not images:
+        print(f"No images found in {images_dir}")
+        return []
+
+    rows = []
+    for backend in backends:
+        try:
+            detector = UltralyticsYOLODetector(model_path, backend=backend, imgsz=imgsz)
+        except Exception as e:  # 缺少对应运行时(如 onnxruntime / openvino)时跳过
+            print(f"Skipping {backend}: {e}")
+            continue
+        for image in images[:warmup]:
+            detector.predict(image, raw=True)
+        latencies = []
+        for image in images:
+            start = perf_counter()
+            detector.predict(image, raw=True)
+            latencies.append((perf_counter() - start) * 1000)
+
+        # 计算mAP时使用较低的置信度阈值, 使AP覆盖完整的PR曲线
+        predict = lambda frame: detector.predict(frame, raw=True, conf=0.001)
+        metrics = evaluate_folder(predict, images_dir, labels_dir, num_classes=len(detector.class_names), limit=limit)
+        rows.append({
+            'backend': backend,
+            'mean_ms': float(np.mean(latencies)),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'map50': metrics['map50'],
+            'map': metrics['map'],
+        })
+
+    print("\n| backend     | mean ms | p50 ms | p95 ms | mAP50  | mAP50-95 |")
+    print("|-------------|---------|--------|--------|--------|----------|")
+    for row in rows:
+        print(f"| {row['backend']:<11} | {row['mean_ms']:7.1f} | {row['p50_ms']:6.1f} | {row['p95_ms']:6.1f} "
+              f"| {row['map50']:.4f} | {row['map']:.4f}   |")
+    return rows
+
 if __name__ == "__main__":
     # 替换为你的模型路径
     MODEL_PATH = "best.pt"  # 可以是官方模型或你的自定义模型
     
+    # 推理后端: pytorch / onnx / openvino / torchscript, CPU设备上推荐 openvino 或 onnx
+    BACKEND = "pytorch"
+    
+    # 设置为held-out图片目录时先比较各后端的延迟和精度
+    BENCHMARK_DIR = None  # 例如 "./test_datasets/test/images"
+    if BENCHMARK_DIR:
+        benchmark_backends(MODEL_PATH, BENCHMARK_DIR)
+    
+    # 只检测部分手势时填写类别名称, 例如 ['gun', 'ok']
+    CLASSES = None
+    
     # 创建检测器实例
-    detector = UltralyticsYOLODetector(MODEL_PATH)
+    detector = UltralyticsYOLODetector(MODEL_PATH, backend=BACKEND, classes=CLASSES)
     
-    # 运行摄像头检测
+    # 设置端口后以Prometheus格式提供各阶段耗时: http://127.0.0.1:9100/metrics
+    METRICS_PORT = None
+    if METRICS_PORT:
+        detector.metrics.serve(METRICS_PORT)
+    
+    # 自适应模式: 低分辨率扫描整帧, 之后只在手附近的区域推理, ROI尺寸随延迟预算调整(仅pytorch后端)
+    ADAPTIVE = False
+    if ADAPTIVE:
+        detector.enable_adaptive(latency_budget_ms=30)
+    
+    # 运行摄像头检测(流水线模式); 也可传入视频文件路径, 或使用串行的 detector.run_camera()
     print("Starting camera detection...")
-    detector.run_camera()
+    detector.run_pipeline(0)
+    
+    # 打印各阶段耗时分布, 并保存可在 chrome://tracing 中查看的trace
+    for stage, stats in detector.metrics.summary().items():
+        print(f"{stage}: {stats}")
+    detector.metrics.dump_trace("detector_trace.json")
@@ -0,0 +1,245 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+# 默认的框尺寸(sqrt(w*h), 归一化)和宽高比(w/h, 对数间隔)分箱
+SIZE_BINS = np.linspace(0.0, 1.0, 21)
+ASPECT_BINS = np.geomspace(0.125, 8.0, 25)
+
+# 类别ID的上限, 超出的ID视为无效, 避免按ID分配巨大的直方图
+MAX_CLASSES = 1000
+
+def valid_class_mask(class_values, num_classes=MAX_CLASSES):
+    """
+    类别ID是否为 [0, num_classes) 内的整数
+
+    负数、非整数、nan 和过大的ID直接作为数组下标会回绕到其它类别或分配巨大的数组,
+    统计前需要先用该掩码过滤
+    """
+    with np.errstate(invalid='ignore'):
+        return (class_values >= 0) & (class_values < num_classes) & (class_values == np.floor(class_values))
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+def _parse_lines(data, strict=True):
+    """
+    逐行解析标签内容, 只保留前5列(不足时补nan), 用于格式不规则(如空行、多边形)的文件
+
+    strict为False时无法解析的数值记为nan, 而不是抛出异常
+    """
+    convert = float if strict else _to_float
+    rows = []
+    for line in data.splitlines():
+        parts = line.split()
+        if parts:
+            values = [convert(value) for value in parts[:5]]
+            rows.append(values + [np.nan] * (5 - len(values)))
+    return rows
+
+def _parse_chunk(label_paths, strict=True):
+    """
+    解析一批标签文件
+
+    规则文件(每一行都是5列)的内容拼接后用一次 np.fromstring 解析, 其余文件逐行解析
+
+    返回:
+        boxes: (N,5) float64数组 [class, x_center, y_center, width, height]
+        counts: (len(label_paths),) 每个文件的框数量
+    """
+    counts = np.zeros(len(label_paths), dtype=np.int64)
+    fast_texts = []
+    fast_rows = 0
+    slow_rows = []
+    order = []
+
+    for i, label_path in enumerate(label_paths):
+        with open(label_path, 'r') as f:
+            data = f.read()
+        stripped = data.strip()
+        if not stripped:
+            continue
+        lines = stripped.splitlines()
+        rows = len(lines)
+        # 必须逐行检查列数: 只比较总数时, 4列行和6列行相邻会拼成错位的框
+        if all(len(line.split()) == 5 for line in lines):
+            fast_texts.append(stripped)
+            fast_rows += rows
+            order.append((i, rows, True))
+        else:
+            parsed = _parse_lines(data, strict)
+            slow_rows.extend(parsed)
+            order.append((i, len(parsed), False))
+            rows = len(parsed)
+        counts[i] = rows
+
+    try:
+        fast = np.fromstring('\n'.join(fast_texts), sep=' ') if fast_texts else np.zeros(0)
+    except ValueError:
+        # 新版numpy遇到无法解析的数值直接抛出异常
+        fast = None
+    if fast is None or fast.size != fast_rows * 5:
+        # 存在无法解析的数值, 整批退回逐行解析以得到准确的错误位置
+        return _parse_chunk_slow(label_paths, strict)
+    fast = fast.reshape(-1, 5)
+    slow = np.asarray(slow_rows, dtype=np.float64).reshape(-1, 5)
+
+    # 按文件顺序合并两条路径的结果
+    boxes = np.empty((fast_rows + len(slow_rows), 5), dtype=np.float64)
+    pos = fast_pos = slow_pos = 0
+    for _, rows, is_fast in order:
+        if is_fast:
+            boxes[pos:pos + rows] = fast[fast_pos:fast_pos + rows]
+            fast_pos += rows
+        else:
+            boxes[pos:pos + rows] = slow[slow_pos:slow_pos + rows]
+            slow_pos += rows
+        pos += rows
+    return boxes, counts
+
+def _parse_chunk_slow(label_paths, strict=True):
+    counts = np.zeros(len(label_paths), dtype=np.int64)
+    rows = []
+    for i, label_path in enumerate(label_paths):
+        with open(label_path, 'r') as f:
+            try:
+                parsed = _parse_lines(f.read(), strict)
+            except ValueError as e:
+                raise ValueError(f"无法解析标签文件 {label_path}: {e}") from None
+        rows.extend(parsed)
+        counts[i] = len(parsed)
+    return np.asarray(rows, dtype=np.float64).reshape(-1, 5), counts
+
+def parse_labels(label_paths, workers=None, chunk_size=2000, strict=True):
+    """
+    批量解析YOLO标签文件, 文件较多时分块交给进程池
+
+    参数:
+        label_paths: 标签文件路径列表
+        workers: 进程数, 默认为CPU核数
+        chunk_size: 每个任务解析的文件数
+        strict: 为True时遇到无法解析的数值抛出 ValueError, 否则记为nan
+
+    返回:
+        boxes: (N,5) float64数组 [class, x_center, y_center, width, height]
+        file_idx: (N,) 每个框所属文件在label_paths中的下标
+    """
+    label_paths = [str(path) for path in label_paths]
+    chunks = [label_paths[i:i + chunk_size] for i in range(0, len(label_paths), chunk_size)]
+
+    parse = partial(_parse_chunk, strict=strict)
+    if len(chunks) <= 1 or workers == 1:
+        results = [parse(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            results = list(pool.map(parse, chunks))
+
+    if not results:
+        return np.zeros((0, 5), dtype=np.float64), np.zeros(0, dtype=np.int64)
+    boxes = np.concatenate([result[0] for result in results])
+    counts = np.concatenate([result[1] for result in results])
+    file_idx = np.repeat(np.arange(len(label_paths)), counts)
+    return boxes, file_idx
+
+def class_histograms(label_paths, workers=None, chunk_size=2000, max_classes=MAX_CLASSES):
+    """
+    统计每个标签文件中各类别的框数量
+
+    类别ID无效(无法解析、负数、非整数或 >= max_classes)的框不计入直方图, 单独计数
+
+    返回:
+        hist: (len(label_paths), num_classes) int32数组
+        invalid: (len(label_paths),) 每个文件中类别ID无效的框数量
+    """
+    boxes, file_idx = parse_labels(label_paths, workers, chunk_size, strict=False)
+    valid = valid_class_mask(boxes[:, 0], max_classes)
+    invalid = np.bincount(file_idx[~valid], minlength=len(label_paths)).astype(np.int32)
+    class_ids = boxes[valid, 0].astype(np.int64)
+    num_classes = int(class_ids.max()) + 1 if len(class_ids) else 0
+    hist = np.zeros((len(label_paths), num_classes), dtype=np.int32)
+    np.add.at(hist, (file_idx[valid], class_ids), 1)
+    return hist, invalid
+
+def box_statistics(boxes, num_classes=None, size_bins=SIZE_BINS, aspect_bins=ASPECT_BINS):
+    """
+    计算类别、框尺寸和宽高比的直方图
+
+    参数:
+        boxes: parse_labels 返回的 (N,5) 数组
+        num_classes: 类别数, 默认为最大类别ID+1; 类别ID无效的框不参与统计
+
+    返回:
+        stats: 字典, 包含
+            class_hist: (C,) 每个类别的框数量
+            invalid: 类别ID无效的框数量
+            size_hist: (C, len(size_bins)-1) 每个类别的框尺寸 sqrt(w*h) 分布
+            aspect_hist: (C, len(aspect_bins)-1) 每个类别的宽高比 w/h 分布
+            size_bins, aspect_bins: 分箱边界
+    """
+    valid = valid_class_mask(boxes[:, 0], MAX_CLASSES if num_classes is None else num_classes)
+    invalid = int((~valid).sum())
+    boxes = boxes[valid]
+    class_ids = boxes[:, 0].astype(np.int64)
+    if num_classes is None:
+        num_classes = int(class_ids.max()) + 1 if len(class_ids) else 0
+    width = boxes[:, 3]
+    height = boxes[:, 4]
+    sizes = np.sqrt(np.clip(width * height, 0.0, None))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aspects = np.where(height > 0, width / height, np.inf)
+
+    def per_class(values, bins):
+        # 超出范围的值计入两端的分箱
+        bin_idx = np.clip(np.searchsorted(bins, values, side='right') - 1, 0, len(bins) - 2)
+        hist = np.zeros((num_classes, len(bins) - 1), dtype=np.int64)
+        np.add.at(hist, (class_ids, bin_idx), 1)
+        return hist
+
+    return {
+        'class_hist': np.bincount(class_ids, minlength=num_classes),
+        'invalid': invalid,
+        'size_hist': per_class(sizes, size_bins),
+        'aspect_hist': per_class(aspects, aspect_bins),
+        'size_bins': size_bins,
+        'aspect_bins': aspect_bins,
+    }
+
+def dataset_statistics(dataset_dir, splits=None, workers=None):
+    """
+    并行解析数据集中所有标签, 返回每个划分的统计直方图
+
+    文件列表来自 DatasetIndex, 不会重新遍历目录
+
+    返回:
+        stats: {split: box_statistics 的结果}, 所有划分使用相同的类别数
+    """
+    # 索引刷新本身依赖本模块, 因此在函数内导入
+    from dataset_index import DatasetIndex
+
+    index = DatasetIndex.open(dataset_dir, splits)
+    parsed = {}
+    for split in index.splits:
+        rows = index.select(split, require_image=False)
+        parsed[split] = parse_labels([index.label_path(row) for row in rows], workers)[0]
+
+    class_ids = [boxes[valid_class_mask(boxes[:, 0]), 0] for boxes in parsed.values()]
+    num_classes = max((int(ids.max()) + 1 for ids in class_ids if len(ids)), default=0)
+    return {split: box_statistics(boxes, num_classes) for split, boxes in parsed.items()}
+
+if __name__ == "__main__":
+    # 配置参数
+    DATASET_DIR = "./totol_datasets"  # 替换为你的数据集目录
+
+    stats = dataset_statistics(DATASET_DIR)
+    for split, split_stats in stats.items():
+        sizes = split_stats['size_hist'].sum(axis=0)
+        print(f"\n{split or '.'}: 每类框数量 {split_stats['class_hist'].tolist()}")
+        print("框尺寸分布 sqrt(w*h):")
+        for low, high, count in zip(SIZE_BINS[:-1], SIZE_BINS[1:], sizes):
+            if count:
+                print(f"  {low:.2f}-{high:.2f}: {count}")
@@ -0,0 +1,96 @@
+import asyncio
+import json
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+async def _send(reader, writer, host, body, content_type, extra_headers=''):
+    """在已有连接上发送一个 POST /detect 请求, 返回 (状态码, 响应内容)"""
+    writer.write(
+        f"POST /detect HTTP/1.1\r\nHost: {host}\r\nContent-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n{extra_headers}\r\n".encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length)) if length else {}
+
+async def _client(host, port, body, content_type, extra_headers, count, latencies, statuses):
+    """一个保持连接的客户端, 顺序发送 count 个请求"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(count):
+            start = perf_counter()
+            status, _ = await _send(reader, writer, host, body, content_type, extra_headers)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append((perf_counter() - start) * 1000)
+    finally:
+        writer.close()
+
+def run_load_test(image_path, host='127.0.0.1', port=8000, concurrency=16, requests=1000, raw=False):
+    """
+    对推理服务施加并发负载, 统计延迟和吞吐量
+
+    参数:
+        image_path: 请求使用的图片
+        host, port: 服务地址
+        concurrency: 并发连接数
+        requests: 总请求数
+        raw: 为True时发送原始BGR帧, 否则发送JPEG
+
+    返回:
+        report: 字典, 包含吞吐量(请求/秒)、p50/p99延迟(毫秒)和各状态码的数量
+    """
+    frame = cv2.imread(str(image_path))
+    if frame is None:
+        raise FileNotFoundError(f"Could not read image {image_path}")
+    if raw:
+        body = frame.tobytes()
+        content_type = 'application/octet-stream'
+        extra_headers = f"X-Width: {frame.shape[1]}\r\nX-Height: {frame.shape[0]}\r\n"
+    else:
+        body = cv2.imencode('.jpg', frame)[1].tobytes()
+        content_type = 'image/jpeg'
+        extra_headers = ''
+
+    latencies = []
+    statuses = {}
+    per_client = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+
+    async def main():
+        await asyncio.gather(*[
+            _client(host, port, body, content_type, extra_headers, count, latencies, statuses)
+            for count in per_client if count
+        ])
+
+    start = perf_counter()
+    asyncio.run(main())
+    elapsed = perf_counter() - start
+
+    report = {
+        'requests': requests,
+        'concurrency': concurrency,
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)) if latencies else float('nan'),
+        'p99_ms': float(np.percentile(latencies, 99)) if latencies else float('nan'),
+        'statuses': statuses,
+    }
+    print(f"{report['throughput']:.1f} req/s, p50 {report['p50_ms']:.1f} ms, p99 {report['p99_ms']:.1f} ms, "
+          f"statuses {statuses}")
+    return report
+
+if __name__ == "__main__":
+    # 先运行 server.py, 再用一张测试图片施加负载
+    IMAGE_PATH = "./test_datasets/test/images/example.jpg"
+
+    for concurrency in (1, 4, 16, 64):
+        run_load_test(IMAGE_PATH, concurrency=concurrency, requests=500)
@@ -0,0 +1,184 @@
+import json
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, perf_counter_ns
+
+import numpy as np
+
+class LatencyHistogram:
+    """
+    HDR风格的对数线性直方图, 以微秒为单位记录耗时
+
+    小于 2^sub_bucket_bits 微秒的值精确记录, 更大的值按2的幂分段, 每段再均分为
+    2^(sub_bucket_bits-1) 个桶, 相对误差约为 1/2^(sub_bucket_bits-1)。
+    最近 windows 个长度为 window_seconds 的时间窗口轮转, 统计只包含这些窗口内的记录
+    """
+
+    def __init__(self, sub_bucket_bits=7, max_us=60_000_000, window_seconds=10.0, windows=6):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_count >> 1
+        self.num_buckets = self._index(max_us) + 1
+        self.max_us = max_us
+        self.window_seconds = window_seconds
+        self.counts = np.zeros((windows, self.num_buckets), dtype=np.int64)
+        self.sums = np.zeros(windows)
+        self.maxima = np.zeros(windows)
+        self.total = 0
+        self._window = 0
+        self._window_start = monotonic()
+
+    def _index(self, value):
+        magnitude = max(0, value.bit_length() - self.sub_bucket_bits)
+        if magnitude == 0:
+            return value
+        return self.sub_count + (magnitude - 1) * self.half_count + (value >> magnitude) - self.half_count
+
+    def _lower_bounds(self):
+        """每个桶的下界(微秒)"""
+        index = np.arange(self.num_buckets)
+        magnitude = np.maximum(0, (index - self.sub_count) // self.half_count + 1)
+        offset = np.where(magnitude == 0, index, (index - self.sub_count) % self.half_count + self.half_count)
+        return offset << magnitude
+
+    def _rotate(self):
+        now = monotonic()
+        while now - self._window_start >= self.window_seconds:
+            self._window = (self._window + 1) % len(self.counts)
+            self.counts[self._window] = 0
+            self.sums[self._window] = 0
+            self.maxima[self._window] = 0
+            self._window_start += self.window_seconds
+            if now - self._window_start >= self.window_seconds * len(self.counts):
+                self._window_start = now
+
+    def record(self, duration_ns):
+        value = min(max(int(duration_ns) // 1000, 0), self.max_us)
+        self._rotate()
+        self.counts[self._window, self._index(value)] += 1
+        self.sums[self._window] += value
+        self.maxima[self._window] = max(self.maxima[self._window], value)
+        self.total += 1
+
+    def snapshot(self, quantiles=(0.5, 0.9, 0.99)):
+        """
+        返回:
+            stats: 字典, 包含时间窗口内的 count、mean_ms、max_ms 以及各分位数(毫秒)
+        """
+        self._rotate()
+        counts = self.counts.sum(axis=0)
+        count = int(counts.sum())
+        stats = {'count': count, 'total': self.total}
+        if count == 0:
+            return stats
+        cumulative = np.cumsum(counts)
+        bounds = self._lower_bounds()
+        stats['mean_ms'] = float(self.sums.sum() / count / 1000)
+        stats['max_ms'] = float(self.maxima.max() / 1000)
+        for q in quantiles:
+            index = int(np.searchsorted(cumulative, q * count))
+            stats[f"p{q * 100:g}_ms"] = float(bounds[min(index, len(bounds) - 1)] / 1000)
+        return stats
+
+class Metrics:
+    """
+    检测器热路径的分阶段计时
+
+    每个阶段(capture / preprocess / model / postprocess / draw / display 等)一个滚动直方图,
+    可通过 summary() 读取, 以Prometheus文本格式导出, 或把最近的计时事件保存为
+    Chrome trace JSON(chrome://tracing 或 Perfetto 可直接打开)
+    """
+
+    def __init__(self, trace_size=10000, **histogram_args):
+        """
+        参数:
+            trace_size: 保留的最近计时事件数, 0表示不记录trace
+            histogram_args: 传给 LatencyHistogram 的参数
+        """
+        self.histogram_args = histogram_args
+        self.histograms = {}
+        self.trace = deque(maxlen=trace_size) if trace_size else None
+        self._lock = threading.Lock()
+        self._server = None
+
+    def record(self, stage, duration_ns, start_ns=None):
+        """记录一个阶段的耗时(纳秒); start_ns 为该阶段开始的 perf_counter_ns, 用于trace"""
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram(**self.histogram_args)
+            histogram.record(duration_ns)
+            if self.trace is not None:
+                start_ns = perf_counter_ns() - duration_ns if start_ns is None else start_ns
+                self.trace.append((stage, start_ns, duration_ns, threading.get_ident()))
+
+    @contextmanager
+    def time(self, stage):
+        """计时上下文: with metrics.time('draw'): ..."""
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(stage, perf_counter_ns() - start, start)
+
+    def summary(self):
+        """
+        返回:
+            summary: {阶段: LatencyHistogram.snapshot()}
+        """
+        with self._lock:
+            return {stage: histogram.snapshot() for stage, histogram in self.histograms.items()}
+
+    def prometheus(self, prefix='yolo_gesture'):
+        """以Prometheus文本格式导出各阶段的分位数(秒)和计数"""
+        lines = [f"# TYPE {prefix}_stage_seconds summary"]
+        for stage, stats in self.summary().items():
+            for key, value in stats.items():
+                if key.startswith('p') and key.endswith('_ms'):
+                    quantile = float(key[1:-3]) / 100
+                    lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="{quantile:g}"}} {value / 1000:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {stats["total"]}')
+        return '\n'.join(lines) + '\n'
+
+    def dump_trace(self, path):
+        """把最近的计时事件保存为 Chrome trace JSON"""
+        with self._lock:
+            events = list(self.trace or ())
+        trace_events = [
+            {'name': stage, 'ph': 'X', 'ts': start_ns / 1000, 'dur': duration_ns / 1000, 'pid': 0, 'tid': tid}
+            for stage, start_ns, duration_ns, tid in events
+        ]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+        return len(trace_events)
+
+    def serve(self, port=9100, host='127.0.0.1'):
+        """在后台线程中启动 /metrics 端点, 供Prometheus抓取"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Serving metrics on http://{host}:{port}/metrics")
+        return self._server
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
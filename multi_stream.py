@@ -0,0 +1,208 @@
+import threading
+from collections import deque
+from time import perf_counter, sleep
+
+import cv2
+
+from infer import DropOldestQueue, UltralyticsYOLODetector, open_source
+
+class _Stream:
+    """一路视频源: 只保留最新一帧的槽位和输出队列"""
+
+    def __init__(self, index, source, output_size):
+        self.index = index
+        self.source = source
+        self.cap, self.is_file = open_source(source)
+        self.frame = None
+        self.captured_at = None
+        self.frame_id = -1
+        self.closed = False
+        self.captured = 0
+        self.dropped = 0
+        self.processed = 0
+        self.done_times = deque(maxlen=120)
+        self.outputs = DropOldestQueue(output_size)
+
+    def fps(self):
+        """最近处理帧的滚动FPS"""
+        if len(self.done_times) < 2 or self.done_times[-1] == self.done_times[0]:
+            return 0.0
+        return (len(self.done_times) - 1) / (self.done_times[-1] - self.done_times[0])
+
+class MultiStreamDetector:
+    """
+    多路视频源的批量检测器
+
+    每路视频源一个采集线程, 只保留最新帧; 批处理线程把各路就绪的帧收集成微批,
+    在达到 max_batch 或等待超过 max_wait_ms 时调用一次模型, 再把结果分发回各路
+    """
+
+    def __init__(self, detector, sources, max_batch=None, max_wait_ms=10, output_size=2, pace_fps=None):
+        """
+        参数:
+            detector: UltralyticsYOLODetector 实例
+            sources: 摄像头ID或视频文件路径列表
+            max_batch: 每批最多的帧数, 默认为视频源数量
+            max_wait_ms: 收集一批时等待的最长时间(毫秒)
+            output_size: 每路输出队列的容量, 满时丢弃最旧的结果
+            pace_fps: 可选, 按该帧率读取视频文件; 默认使用文件自身帧率
+        """
+        self.detector = detector
+        self.streams = [_Stream(i, source, output_size) for i, source in enumerate(sources)]
+        self.max_batch = max_batch or len(self.streams)
+        self.max_wait = max_wait_ms / 1000.0
+        self.pace_fps = pace_fps
+        self.batches = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._next_stream = 0
+
+    def _capture(self, stream):
+        """采集线程: 新帧覆盖槽位中尚未处理的旧帧"""
+        pace_fps = self.pace_fps
+        if stream.is_file and pace_fps is None:
+            pace_fps = stream.cap.get(cv2.CAP_PROP_FPS) or None
+        interval = 1.0 / pace_fps if pace_fps else 0.0
+        next_time = perf_counter()
+        try:
+            while not self._stop.is_set():
+                ret, frame = stream.cap.read()
+                if not ret:
+                    break
+                with self._cond:
+                    if stream.frame is not None:
+                        stream.dropped += 1
+                    stream.frame = frame
+                    stream.captured_at = perf_counter()
+                    stream.frame_id += 1
+                    stream.captured += 1
+                    self._cond.notify_all()
+                if interval:
+                    next_time += interval
+                    delay = next_time - perf_counter()
+                    if delay > 0:
+                        sleep(delay)
+        finally:
+            with self._cond:
+                stream.closed = True
+                self._cond.notify_all()
+
+    def _ready(self):
+        return [stream for stream in self.streams if stream.frame is not None]
+
+    def _collect_batch(self):
+        """
+        收集一个微批, 所有视频源结束且没有待处理的帧时返回 None
+
+        返回:
+            batch: [(stream, frame_id, 采集时间, 帧)]
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._ready() or all(s.closed for s in self.streams) or self._stop.is_set())
+            if not self._ready():
+                return None
+
+            # 第一帧就绪后最多再等待 max_wait, 尽量凑满一批
+            deadline = perf_counter() + self.max_wait
+            while len(self._ready()) < self.max_batch:
+                remaining = deadline - perf_counter()
+                open_streams = [s for s in self.streams if not s.closed and s.frame is None]
+                if remaining <= 0 or not open_streams or self._stop.is_set():
+                    break
+                self._cond.wait(remaining)
+
+            # 轮询起点依次后移, 视频源多于 max_batch 时保证公平
+            count = len(self.streams)
+            order = [self.streams[(self._next_stream + i) % count] for i in range(count)]
+            batch = []
+            for stream in order:
+                if stream.frame is not None and len(batch) < self.max_batch:
+                    batch.append((stream, stream.frame_id, stream.captured_at, stream.frame))
+                    stream.frame = None
+            self._next_stream = (self._next_stream + 1) % count
+            return batch
+
+    def stats(self):
+        """每路视频源的FPS、队列深度和帧计数"""
+        with self._cond:
+            return [{
+                'source': stream.source,
+                'fps': round(stream.fps(), 1),
+                'pending': int(stream.frame is not None),
+                'output_depth': len(stream.outputs),
+                'captured': stream.captured,
+                'processed': stream.processed,
+                'dropped': stream.dropped,
+            } for stream in self.streams]
+
+    def run(self, on_result=None, max_batches=None, report_every=5.0):
+        """
+        运行批量检测直到所有视频源结束或调用 stop()
+
+        参数:
+            on_result: 可选回调 on_result(流序号, 帧序号, 帧, 检测数组, 延迟秒数), 检测数组为 (N,6);
+                       未提供时结果放入各路的 outputs 队列 (帧序号, 帧, 检测数组)
+            max_batches: 可选, 处理该数量的批次后停止
+            report_every: 每隔多少秒打印一次各路统计, None表示不打印
+
+        返回:
+            stats: 各路视频源的统计
+        """
+        for stream in self.streams:
+            if not stream.cap.isOpened():
+                raise RuntimeError(f"Could not open source {stream.source}")
+        threads = [threading.Thread(target=self._capture, args=(stream,), daemon=True) for stream in self.streams]
+        for thread in threads:
+            thread.start()
+
+        last_report = perf_counter()
+        try:
+            while not self._stop.is_set():
+                batch = self._collect_batch()
+                if batch is None:
+                    break
+
+                # 一次模型调用处理整批帧
+                results = self.detector.predict([frame for _, _, _, frame in batch], raw=True)
+                now = perf_counter()
+                self.batches += 1
+
+                for (stream, frame_id, captured_at, frame), result in zip(batch, results):
+                    stream.processed += 1
+                    stream.done_times.append(now)
+                    if on_result is not None:
+                        on_result(stream.index, frame_id, frame, result, now - captured_at)
+                    else:
+                        stream.outputs.put((frame_id, frame, result))
+
+                if report_every is not None and now - last_report >= report_every:
+                    last_report = now
+                    for stream_stats in self.stats():
+                        print(f"Stream {stream_stats}")
+                if max_batches is not None and self.batches >= max_batches:
+                    break
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join(timeout=5)
+            for stream in self.streams:
+                stream.cap.release()
+                stream.outputs.close()
+
+        return self.stats()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+if __name__ == "__main__":
+    # 替换为你的模型路径和视频源(摄像头ID或视频文件)
+    MODEL_PATH = "best.pt"
+    SOURCES = [0, 1]
+
+    detector = UltralyticsYOLODetector(MODEL_PATH)
+    multi = MultiStreamDetector(detector, SOURCES, max_wait_ms=10)
+    print(f"Starting batched detection on {len(SOURCES)} streams...")
+    for stream_stats in multi.run():
+        print(stream_stats)
@@ -0,0 +1,101 @@
+import colorsys
+
+import cv2
+import numpy as np
+
+def class_palette(num_classes, saturation=0.85, value=0.95):
+    """
+    为每个类别生成固定的BGR颜色, 色相在色环上均匀分布
+
+    返回:
+        palette: (num_classes, 3) uint8 数组
+    """
+    colors = [colorsys.hsv_to_rgb(i / max(num_classes, 1), saturation, value) for i in range(num_classes)]
+    return np.array([[b * 255, g * 255, r * 255] for r, g, b in colors], dtype=np.uint8)
+
+class OverlayRenderer:
+    """
+    在帧上绘制 (N,6) 检测数组 [x1, y1, x2, y2, conf, cls]
+
+    同类别的框用一次 cv2.polylines 绘制; "类别 置信度" 标签按 (类别, 置信度百分位) 缓存为
+    小图, 之后每帧只做数组切片拷贝, 不再重复栅格化文字。enabled=False 时不做任何绘制,
+    用于无界面部署
+    """
+
+    def __init__(self, class_names, enabled=True, thickness=2, font_scale=0.6, palette=None):
+        """
+        参数:
+            class_names: 类别名称, 字典 {类别ID: 名称} 或列表
+            enabled: 为False时 render() 直接返回原帧
+            thickness: 框线宽度
+            font_scale: 标签字体大小
+            palette: 可选的 (num_classes, 3) BGR 颜色数组, 默认按类别数生成
+        """
+        if not isinstance(class_names, dict):
+            class_names = dict(enumerate(class_names))
+        self.class_names = class_names
+        self.enabled = enabled
+        self.thickness = thickness
+        self.font_scale = font_scale
+        num_classes = max(class_names, default=-1) + 1
+        self.palette = np.asarray(palette, dtype=np.uint8) if palette is not None else class_palette(num_classes)
+        self._glyphs = {}
+
+    def color(self, class_id):
+        return tuple(int(c) for c in self.palette[class_id % len(self.palette)])
+
+    def glyph(self, class_id, conf_pct):
+        """
+        取出(或生成并缓存)一个标签小图: 类别颜色的底色上写白色文字
+
+        参数:
+            class_id: 类别ID
+            conf_pct: 置信度百分位(0-100的整数)
+        """
+        key = (class_id, conf_pct)
+        glyph = self._glyphs.get(key)
+        if glyph is None:
+            text = f"{self.class_names.get(class_id, class_id)} {conf_pct / 100:.2f}"
+            (width, height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, 1)
+            glyph = np.empty((height + baseline + 4, width + 4, 3), dtype=np.uint8)
+            glyph[:] = self.color(class_id)
+            cv2.putText(glyph, text, (2, height + 2), cv2.FONT_HERSHEY_SIMPLEX, self.font_scale,
+                        (255, 255, 255), 1, cv2.LINE_AA)
+            self._glyphs[key] = glyph
+        return glyph
+
+    def render(self, frame, detections):
+        """
+        在帧上原地绘制检测结果
+
+        参数:
+            frame: BGR图像
+            detections: (N,6) 检测数组
+
+        返回:
+            frame: 绘制后的图像(与输入为同一数组)
+        """
+        if not self.enabled or len(detections) == 0:
+            return frame
+        height, width = frame.shape[:2]
+        boxes = np.round(detections[:, :4]).astype(np.int32)
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width - 1)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height - 1)
+        class_ids = detections[:, 5].astype(np.int32)
+        conf_pct = np.round(detections[:, 4] * 100).astype(np.int32).clip(0, 100)
+
+        # 四个角点 (N,4,2), 同类别一次绘制
+        corners = boxes[:, [0, 1, 2, 1, 2, 3, 0, 3]].reshape(-1, 4, 2)
+        for class_id in np.unique(class_ids).tolist():
+            polygons = list(corners[class_ids == class_id])
+            cv2.polylines(frame, polygons, True, self.color(class_id), self.thickness)
+
+        # 标签贴在框的左上角上方, 超出画面时放到框内
+        for (x1, y1, _, _), class_id, pct in zip(boxes.tolist(), class_ids.tolist(), conf_pct.tolist()):
+            glyph = self.glyph(class_id, pct)
+            glyph_h, glyph_w = glyph.shape[:2]
+            top = y1 - glyph_h if y1 >= glyph_h else y1
+            visible_h = min(glyph_h, height - top)
+            visible_w = min(glyph_w, width - x1)
+            frame[top:top + visible_h, x1:x1 + visible_w] = glyph[:visible_h, :visible_w]
+        return frame
@@ -1,40 +1,51 @@
 import os
-import shutil
 from pathlib import Path
 
-def organize_labels_to_match_images(images_root_dir, labels_source_dir):
+from transfer import transfer_files
+
+def organize_labels_to_match_images(images_root_dir, labels_source_dir, workers=16, dry_run=False, journal=None):
     """
     将labels文件移动到与images同级的labels文件夹中
     
     参数:
         images_root_dir: 包含train/val/test子文件夹的images根目录
         labels_source_dir: 当前存放labels文件的源目录
+        workers: 并发移动的线程数
+        dry_run: 只打印移动计划, 不移动文件
+        journal: 可选的传输日志路径, 中断后重新运行时跳过已完成的文件
     """
     images_root = Path(images_root_dir)
     labels_source = Path(labels_source_dir)
     
+    # 一次性列出源目录中的所有label文件, 代替逐个exists检查
+    with os.scandir(labels_source) as entries:
+        source_labels = {entry.name for entry in entries if entry.is_file()}
+    
+    pairs = []
     # 遍历images目录结构
     for split_dir in ['train', 'valid', 'test']:
         images_split_dir = images_root / split_dir
         labels_split_dir = images_root.parent / 'labels' / split_dir
-        
-        # 确保目标labels目录存在
-        labels_split_dir.mkdir(parents=True, exist_ok=True)
+        if not images_split_dir.is_dir():
+            continue
         
         # 遍历该split下的所有图片文件
-        for image_path in images_split_dir.glob('*'):
-            if image_path.is_file():
+        with os.scandir(images_split_dir) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
                 # 构建对应的label文件名（假设labels与images同名，只是扩展名不同）
-                label_filename = image_path.stem + '.txt'  # 修改扩展名如果你的labels不是.txt
-                source_label_path = labels_source / label_filename
+                label_filename = os.path.splitext(entry.name)[0] + '.txt'  # 修改扩展名如果你的labels不是.txt
                 
                 # 如果label文件存在，则移动到目标位置
-                if source_label_path.exists():
-                    shutil.move(str(source_label_path), str(labels_split_dir / label_filename))
+                if label_filename in source_labels:
+                    pairs.append((labels_source / label_filename, labels_split_dir / label_filename))
                 else:
-                    print(f"警告: 未找到匹配的label文件 {source_label_path}")
-
-    print("Labels整理完成！")
+                    print(f"警告: 未找到匹配的label文件 {labels_source / label_filename}")
+    
+    transfer_files(pairs, mode='move', workers=workers, dry_run=dry_run, journal=journal)
+    if not dry_run:
+        print("Labels整理完成！")
 
 # 使用示例
 if __name__ == "__main__":
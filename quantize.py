@@ -0,0 +1,115 @@
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from evaluate import evaluate_folder
+from infer import UltralyticsYOLODetector, export_model
+
+def _split_images_dir(data_yaml, split):
+    """
+    从 data.yaml 中解析某个划分的图片目录或 .txt 图片列表
+
+    data.yaml 中没有该划分时回退到 val 划分
+    """
+    with open(data_yaml, 'r') as f:
+        data = yaml.safe_load(f)
+    if not data.get(split):
+        if not data.get('val'):
+            raise ValueError(f"{data_yaml} has neither a '{split}' nor a 'val' split")
+        print(f"{data_yaml} 中没有 {split} 划分, 使用 val 划分")
+        split = 'val'
+    root = Path(data.get('path') or Path(data_yaml).parent)
+    if not root.is_absolute():
+        root = (Path(data_yaml).parent / root).resolve()
+    split_path = data[split]
+    if isinstance(split_path, list):
+        if len(split_path) > 1:
+            print(f"{split} 划分有 {len(split_path)} 个来源, 只使用第一个评估")
+        split_path = split_path[0]
+    split_path = Path(split_path)
+    return split_path if split_path.is_absolute() else root / split_path, data.get('names')
+
+def quantize_model(model_path, data_yaml='./test_datasets/data.yaml', backend='openvino', imgsz=640,
+                   precision='int8', fraction=0.1, eval_split='test', limit=None):
+    """
+    导出INT8(或FP16)的CPU模型, 并与FP32模型比较每个类别的AP
+
+    INT8校准使用 data.yaml 中 val 划分的一部分图片(由fraction控制), 精度比较使用 eval_split 划分。
+    openvino 后端由 NNCF 做训练后量化; onnx 后端由 ultralytics 导出后用 onnxruntime 动态量化。
+    FP16 只支持 openvino 后端
+
+    参数:
+        model_path: FP32 的 .pt 模型路径(如 train.py 训练得到的 best.pt)
+        data_yaml: 数据集配置文件
+        backend: 'openvino' 或 'onnx'
+        imgsz: 输入尺寸
+        precision: 'int8' 或 'fp16'
+        fraction: 用于校准的 val 图片比例
+        eval_split: 用于比较精度的划分
+        limit: 可选, 比较精度时最多使用的图片数量
+
+    返回:
+        int8_path: 量化模型路径, 可直接传给 UltralyticsYOLODetector
+        report: 字典, 包含FP32/量化模型的mAP以及每个类别的AP50差值
+    """
+    if precision not in ('int8', 'fp16'):
+        raise ValueError(f"Unsupported precision: {precision}")
+    if precision == 'fp16':
+        if backend != 'openvino':
+            raise ValueError("FP16 export is only supported for the openvino backend")
+        int8_path = export_model(model_path, 'openvino', imgsz, half=True)
+    elif backend == 'openvino':
+        int8_path = export_model(model_path, 'openvino', imgsz, int8=True, data=str(data_yaml), fraction=fraction)
+    elif backend == 'onnx':
+        int8_path = export_model(model_path, 'onnx', imgsz, quant='dynamic_int8')
+    else:
+        raise ValueError(f"Unsupported quantization backend: {backend}")
+
+    images_dir, names = _split_images_dir(data_yaml, eval_split)
+    fp32 = UltralyticsYOLODetector(model_path, imgsz=imgsz)
+    int8 = UltralyticsYOLODetector(int8_path, backend=backend, imgsz=imgsz)
+    num_classes = len(fp32.class_names)
+
+    # 使用较低的置信度阈值, 使AP覆盖完整的PR曲线
+    def predictor(detector):
+        return lambda frame: detector.predict(frame, raw=True, conf=0.001)
+
+    fp32_metrics = evaluate_folder(predictor(fp32), images_dir, num_classes=num_classes, limit=limit)
+    int8_metrics = evaluate_folder(predictor(int8), images_dir, num_classes=num_classes, limit=limit)
+
+    report = {
+        'int8_path': str(int8_path),
+        'fp32_map50': fp32_metrics['map50'],
+        'int8_map50': int8_metrics['map50'],
+        'fp32_map': fp32_metrics['map'],
+        'int8_map': int8_metrics['map'],
+        'ap50_delta': {},
+    }
+
+    label = precision.upper()
+    print(f"\n| 类别 | 类别名称 | FP32 AP50 | {label} AP50 | 差值 |")
+    print("|------|----------|-----------|-----------|------|")
+    for class_id in range(num_classes):
+        before = fp32_metrics['ap50'][class_id]
+        after = int8_metrics['ap50'][class_id]
+        if np.isnan(before):
+            continue
+        name = fp32.class_names[class_id]
+        report['ap50_delta'][name] = float(after - before)
+        print(f"| {class_id:4} | {name:<8} | {before:9.4f} | {after:9.4f} | {after - before:+.4f} |")
+    print(f"| 总计 | mAP50    | {report['fp32_map50']:9.4f} | {report['int8_map50']:9.4f} "
+          f"| {report['int8_map50'] - report['fp32_map50']:+.4f} |")
+    print(f"\n{label}模型: {int8_path}")
+    return int8_path, report
+
+if __name__ == "__main__":
+    # 配置参数
+    MODEL_PATH = "runs/detect/train/weights/best.pt"  # train.py 训练得到的模型
+    DATA_YAML = "./test_datasets/data.yaml"
+
+    # openvino: 使用val划分校准的静态INT8量化; onnx: onnxruntime动态量化
+    BACKEND = "openvino"
+    PRECISION = "int8"  # 或 "fp16"(仅openvino)
+
+    quantize_model(MODEL_PATH, DATA_YAML, backend=BACKEND, precision=PRECISION)
@@ -0,0 +1,102 @@
+import os
+from pathlib import Path
+
+from transfer import delete_files, transfer_files
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def scan_dataset_dirs(images_dir, labels_dir, image_extensions=IMAGE_EXTENSIONS):
+    """
+    用 os.scandir 各扫描一次图片目录和标签目录, 扩展名不区分大小写
+
+    返回:
+        images: {stem: [图片文件名]}, 同名不同扩展名的图片都会保留
+        labels: {stem: 标签文件名}
+    """
+    image_extensions = tuple(ext.lower() for ext in image_extensions)
+
+    images = {}
+    with os.scandir(images_dir) as entries:
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() in image_extensions and entry.is_file():
+                images.setdefault(stem, []).append(entry.name)
+
+    labels = {}
+    with os.scandir(labels_dir) as entries:
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() == '.txt' and entry.is_file():
+                labels[stem] = entry.name
+
+    return images, labels
+
+def reconcile_dataset(images_dir, labels_dir, remove_images=True, remove_labels=True, quarantine_dir=None,
+                      dry_run=False, workers=16, image_extensions=IMAGE_EXTENSIONS):
+    """
+    一次扫描同时找出没有标签的图片和没有图片的标签, 并分批删除或隔离
+
+    参数:
+        images_dir: 图片文件夹路径
+        labels_dir: 标签文件夹路径
+        remove_images: 是否处理没有对应标签的图片
+        remove_labels: 是否处理没有对应图片的标签
+        quarantine_dir: 可选的隔离目录, 提供时把孤立文件移动到 <quarantine_dir>/images 和 labels 而不是删除
+        dry_run: 只打印报告, 不修改任何文件
+        workers: 并发删除/移动的线程数
+        image_extensions: 支持的图片扩展名元组(不区分大小写)
+
+    返回:
+        orphan_images: 没有标签的图片路径列表
+        orphan_labels: 没有图片的标签路径列表
+    """
+    images_dir = Path(images_dir)
+    labels_dir = Path(labels_dir)
+    images, labels = scan_dataset_dirs(images_dir, labels_dir, image_extensions)
+
+    # 用集合运算计算两类孤立文件
+    image_stems = images.keys()
+    label_stems = labels.keys()
+    orphan_images = sorted(
+        images_dir / name for stem in image_stems - label_stems for name in images[stem]
+    ) if remove_images else []
+    orphan_labels = sorted(labels_dir / labels[stem] for stem in label_stems - image_stems) if remove_labels else []
+
+    total_images = sum(len(names) for names in images.values())
+    action = "隔离" if quarantine_dir is not None else "删除"
+    print(f"共 {total_images} 张图片, {len(labels)} 个标签文件")
+    print(f"无标签的图片: {len(orphan_images)}, 无图片的标签: {len(orphan_labels)}")
+
+    if dry_run:
+        for path in orphan_images[:20] + orphan_labels[:20]:
+            print(f"  [dry-run] 将{action}: {path}")
+        if len(orphan_images) > 20 or len(orphan_labels) > 20:
+            print("  ...")
+        return orphan_images, orphan_labels
+
+    if quarantine_dir is not None:
+        quarantine_dir = Path(quarantine_dir)
+        pairs = [(path, quarantine_dir / 'images' / path.name) for path in orphan_images]
+        pairs += [(path, quarantine_dir / 'labels' / path.name) for path in orphan_labels]
+        stats = transfer_files(pairs, mode='move', workers=workers, skip_existing=False)
+        processed = stats['done']
+    else:
+        processed, _ = delete_files(orphan_images + orphan_labels, workers=workers)
+
+    print(f"\n完成! 共{action} {processed} 个文件")
+    print(f"剩余图片: {total_images - len(orphan_images)}")
+    print(f"剩余标签文件: {len(labels) - len(orphan_labels)}")
+    return orphan_images, orphan_labels
+
+if __name__ == "__main__":
+    # 配置路径 - 修改为你的实际路径
+    IMAGES_DIR = "./ok"
+    LABELS_DIR = "./train/labels"
+
+    # 可选: 把孤立文件移动到隔离目录而不是删除
+    QUARANTINE_DIR = None
+
+    # 先打印将要处理的文件而不实际删除, 确认后改为False
+    DRY_RUN = True
+
+    reconcile_dataset(IMAGES_DIR, LABELS_DIR, quarantine_dir=QUARANTINE_DIR, dry_run=DRY_RUN)
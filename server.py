@@ -0,0 +1,249 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+# 每个工作进程中加载一次的检测器
+_detector = None
+
+def _init_worker(model_path, detector_args, warmup_imgsz):
+    """工作进程初始化: 加载模型并预热, 第一个请求不承担加载和首次推理的开销"""
+    global _detector
+    from infer import UltralyticsYOLODetector
+
+    _detector = UltralyticsYOLODetector(model_path, render=False, **detector_args)
+    _detector.predict(np.zeros((warmup_imgsz, warmup_imgsz, 3), dtype=np.uint8), raw=True)
+
+def decode_frame(body, content_type, width=None, height=None):
+    """
+    解码请求体中的图像
+
+    参数:
+        body: 请求体字节
+        content_type: 'image/jpeg' / 'image/png' 等编码图像, 或 'application/octet-stream' 的原始BGR帧
+        width, height: 原始帧的宽高
+
+    返回:
+        frame: BGR图像, 无法解码时为 None
+    """
+    if content_type == 'application/octet-stream':
+        if not width or not height or len(body) != width * height * 3:
+            return None
+        return np.frombuffer(body, dtype=np.uint8).reshape(height, width, 3)
+    return cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def _infer_batch(requests):
+    """
+    在工作进程中解码并批量推理
+
+    参数:
+        requests: [(请求体, content_type, 宽, 高)]
+
+    返回:
+        results: 每个请求一个 (N,6) 检测列表, 无法解码的请求为 None
+    """
+    frames = [decode_frame(*request) for request in requests]
+    valid = [i for i, frame in enumerate(frames) if frame is not None]
+    results = [None] * len(frames)
+    if valid:
+        for i, detections in zip(valid, _detector.predict([frames[i] for i in valid], raw=True)):
+            results[i] = detections.tolist()
+    return results
+
+class BatchingServer:
+    """
+    本地HTTP推理服务
+
+    POST /detect 接收JPEG/PNG编码图像, 或带 X-Width / X-Height 请求头的原始BGR帧,
+    返回 {"detections": [[x1, y1, x2, y2, conf, cls], ...]}。
+    并发请求在队列中动态组批, 每个工作进程持有一个预热好的模型; 队列满时返回 429
+    """
+
+    def __init__(self, model_path, host='127.0.0.1', port=8000, workers=2, max_batch=8, max_wait_ms=5,
+                 max_queue=64, warmup_imgsz=640, **detector_args):
+        """
+        参数:
+            model_path: 模型路径
+            host, port: 监听地址
+            workers: 工作进程数, 每个进程一个模型
+            max_batch: 每批最多的请求数
+            max_wait_ms: 收集一批时等待的最长时间(毫秒)
+            max_queue: 等待队列容量, 超出时返回 429
+            warmup_imgsz: 预热使用的图像尺寸
+            detector_args: 传给 UltralyticsYOLODetector 的其它参数(如 backend, conf_thresh)
+        """
+        self.model_path = model_path
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self.warmup_imgsz = warmup_imgsz
+        self.detector_args = detector_args
+        self.stats = {'requests': 0, 'rejected': 0, 'batches': 0, 'batched_requests': 0}
+        self._queue = None
+        self._pool = None
+
+    async def _batcher(self):
+        """从队列收集一批请求交给工作进程; 每个工作进程对应一个批处理协程"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            self.stats['batches'] += 1
+            self.stats['batched_requests'] += len(batch)
+            try:
+                results = await loop.run_in_executor(self._pool, _infer_batch, [request for request, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def _read_request(self, reader):
+        """
+        读取一个HTTP请求
+
+        返回:
+            (method, path, headers, body), 连接关闭时为 None; 请求行或 Content-Length 无效时抛出 ValueError
+        """
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        parts = request_line.decode('latin-1').split(' ', 2)
+        if len(parts) != 3:
+            raise ValueError('malformed request line')
+        method, path, _ = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise ValueError('invalid content-length') from None
+        if length < 0:
+            raise ValueError('invalid content-length')
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    @staticmethod
+    def _response(writer, status, payload):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 429: 'Too Many Requests',
+                   500: 'Internal Server Error'}
+        body = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {reasons[status]}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+
+    async def _handle(self, method, path, headers, body):
+        """
+        返回:
+            (状态码, 响应内容)
+        """
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok', 'queue': self._queue.qsize(), **self.stats}
+        if method != 'POST' or path != '/detect':
+            return 404, {'error': 'not found'}
+
+        self.stats['requests'] += 1
+        content_type = headers.get('content-type', 'image/jpeg').split(';')[0]
+        width = int(headers['x-width']) if 'x-width' in headers else None
+        height = int(headers['x-height']) if 'x-height' in headers else None
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait(((body, content_type, width, height), future))
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            return 429, {'error': 'queue full'}
+
+        start = perf_counter()
+        try:
+            detections = await future
+        except Exception as e:
+            return 500, {'error': str(e)}
+        if detections is None:
+            return 400, {'error': 'could not decode image'}
+        return 200, {'detections': detections, 'latency_ms': (perf_counter() - start) * 1000}
+
+    async def _serve_connection(self, reader, writer):
+        """处理一个连接上的请求(支持keep-alive)"""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except ValueError as e:
+                    # 无法确定请求的边界, 返回400后关闭连接
+                    self._response(writer, 400, {'error': str(e)})
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                try:
+                    status, payload = await self._handle(*request)
+                except ValueError as e:
+                    status, payload = 400, {'error': str(e)}
+                self._response(writer, status, payload)
+                await writer.drain()
+                if request[2].get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        """启动工作进程和HTTP服务, 直到被取消"""
+        self._queue = asyncio.Queue(self.max_queue)
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker,
+            initargs=(self.model_path, self.detector_args, self.warmup_imgsz)
+        )
+        loop = asyncio.get_running_loop()
+        # 提前启动所有工作进程, 模型加载和预热在接受请求之前完成
+        await asyncio.gather(*[loop.run_in_executor(self._pool, os.getpid) for _ in range(self.workers)])
+
+        batchers = [asyncio.create_task(self._batcher()) for _ in range(self.workers)]
+        server = await asyncio.start_server(self._serve_connection, self.host, self.port)
+        print(f"Serving {self.model_path} on http://{self.host}:{self.port} with {self.workers} workers")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in batchers:
+                task.cancel()
+            self._pool.shutdown(cancel_futures=True)
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print(f"Server stopped: {self.stats}")
+
+if __name__ == "__main__":
+    # 替换为你的模型路径
+    MODEL_PATH = "best.pt"
+    BACKEND = "pytorch"  # CPU部署推荐 openvino 或 onnx
+
+    BatchingServer(MODEL_PATH, port=8000, workers=2, max_batch=8, max_wait_ms=5, backend=BACKEND).run()
@@ -1,9 +1,11 @@
 import os
 import random
-import shutil
 from pathlib import Path
 
-def split_images(source_dir, train_ratio=0.7, test_ratio=0.2, valid_ratio=0.1, seed=None):
+from transfer import transfer_files
+
+def split_images(source_dir, train_ratio=0.7, test_ratio=0.2, valid_ratio=0.1, seed=None,
+                 workers=16, dry_run=False, journal=None):
     if seed is not None:
         random.seed(seed)
     
@@ -17,13 +19,17 @@ def split_images(source_dir, train_ratio=0.7, test_ratio=0.2, valid_ratio=0.1, s
     test_dir = source_path / 'test'
     valid_dir = source_path / 'valid'
     
-    for dir_path in [train_dir, test_dir, valid_dir]:
-        dir_path.mkdir(exist_ok=True)
+    if not dry_run:
+        for dir_path in [train_dir, test_dir, valid_dir]:
+            dir_path.mkdir(exist_ok=True)
     
-    # 获取所有图片文件
+    # 获取所有图片文件(排序以保证相同seed的划分可复现)
     image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif']
-    image_files = [f for f in source_path.iterdir() 
-                  if f.is_file() and f.suffix.lower() in image_extensions]
+    with os.scandir(source_path) as entries:
+        image_files = sorted(
+            source_path / entry.name for entry in entries
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in image_extensions
+        )
     
     # 打乱文件顺序
     random.shuffle(image_files)
@@ -33,7 +39,8 @@ def split_images(source_dir, train_ratio=0.7, test_ratio=0.2, valid_ratio=0.1, s
     train_end = int(total_files * train_ratio)
     test_end = train_end + int(total_files * test_ratio)
     
-    # 分割文件
+    # 分割文件, 由传输引擎并发移动(同一文件系统内为rename)
+    pairs = []
     for i, file_path in enumerate(image_files):
         if i < train_end:
             dest_dir = train_dir
@@ -42,7 +49,11 @@ def split_images(source_dir, train_ratio=0.7, test_ratio=0.2, valid_ratio=0.1, s
         else:
             dest_dir = valid_dir
         
-        shutil.move(str(file_path), str(dest_dir / file_path.name))
+        pairs.append((file_path, dest_dir / file_path.name))
+    
+    transfer_files(pairs, mode='move', workers=workers, dry_run=dry_run, journal=journal)
+    if dry_run:
+        return
     
     print(f"分割完成: {train_end}张训练集, {test_end-train_end}张测试集, {total_files-test_end}张验证集")
 
@@ -0,0 +1,30 @@
+import numpy as np
+
+from label_parser import parse_labels
+
+MIXED = '0 .1 .2 .3\n1 .1 .2 .3 .4 .5\n'
+
+def _write(tmp_path, name, text):
+    path = tmp_path / f"{name}.txt"
+    path.write_text(text)
+    return path
+
+def _expected_mixed():
+    return np.array([[0, .1, .2, .3, np.nan], [1, .1, .2, .3, .4]])
+
+def test_mixed_columns_alone(tmp_path):
+    boxes, file_idx = parse_labels([_write(tmp_path, 'mixed', MIXED)])
+    np.testing.assert_array_equal(boxes, _expected_mixed())
+    np.testing.assert_array_equal(file_idx, [0, 0])
+
+def test_mixed_columns_in_chunk(tmp_path):
+    paths = [
+        _write(tmp_path, 'regular', '2 .5 .5 .2 .2\n'),
+        _write(tmp_path, 'mixed', MIXED),
+        _write(tmp_path, 'short', '3 .5 .5\n'),
+    ]
+    boxes, file_idx = parse_labels(paths)
+    np.testing.assert_array_equal(boxes[0], [2, .5, .5, .2, .2])
+    np.testing.assert_array_equal(boxes[1:3], _expected_mixed())
+    np.testing.assert_array_equal(boxes[3], [3, .5, .5, np.nan, np.nan])
+    np.testing.assert_array_equal(file_idx, [0, 1, 1, 2])
@@ -0,0 +1,319 @@
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+from evaluate import box_iou
+from infer import UltralyticsYOLODetector, open_source
+
+def xyxy_to_cxcywh(box):
+    x1, y1, x2, y2 = box
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+
+def cxcywh_to_xyxy(state):
+    cx, cy, w, h = state[:4]
+    return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+class KalmanBoxTrack:
+    """
+    单个目标的匀速卡尔曼滤波轨迹, 状态为 [cx, cy, w, h, vx, vy, vw, vh]
+
+    噪声与框高度成比例, 远近不同的手使用相同的相对不确定度。
+    类别通过带衰减的置信度投票决定, 单帧误检不会改变轨迹的手势
+    """
+
+    STD_POSITION = 1 / 20
+    STD_VELOCITY = 1 / 160
+
+    def __init__(self, track_id, detection, num_classes, timestamp, vote_decay=0.9):
+        self.track_id = track_id
+        self.vote_decay = vote_decay
+        self.state = np.zeros(8)
+        self.state[:4] = xyxy_to_cxcywh(detection[:4])
+        h = max(self.state[3], 1.0)
+        std = np.array([2 * self.STD_POSITION * h] * 4 + [10 * self.STD_VELOCITY * h] * 4)
+        self.covariance = np.diag(std ** 2)
+
+        self.votes = np.zeros(num_classes)
+        self.conf = float(detection[4])
+        self.hits = 0
+        self.time_since_update = 0
+        self.label = None
+        self.label_since = timestamp
+        self.held = False
+        self._vote(detection, timestamp)
+        self.hits = 1
+
+    @staticmethod
+    def _transition():
+        transition = np.eye(8)
+        transition[:4, 4:] = np.eye(4)
+        return transition
+
+    def predict(self):
+        """按匀速模型把状态推进一帧"""
+        h = max(self.state[3], 1.0)
+        std = np.array([self.STD_POSITION * h] * 4 + [self.STD_VELOCITY * h] * 4)
+        transition = self._transition()
+        self.state = transition @ self.state
+        self.state[2:4] = np.maximum(self.state[2:4], 1.0)
+        self.covariance = transition @ self.covariance @ transition.T + np.diag(std ** 2)
+
+    def update(self, detection, timestamp):
+        """用匹配到的检测框校正状态, 并为类别投票"""
+        h = max(self.state[3], 1.0)
+        measurement_std = np.full(4, self.STD_POSITION * h)
+        projected_cov = self.covariance[:4, :4] + np.diag(measurement_std ** 2)
+        gain = np.linalg.solve(projected_cov, self.covariance[:4, :]).T
+        self.state = self.state + gain @ (xyxy_to_cxcywh(detection[:4]) - self.state[:4])
+        self.covariance = self.covariance - gain @ self.covariance[:4, :]
+        self.conf = float(detection[4])
+        self.hits += 1
+        self.time_since_update = 0
+        return self._vote(detection, timestamp)
+
+    def _vote(self, detection, timestamp):
+        """
+        返回:
+            changed: 投票后的类别是否发生变化
+        """
+        self.votes *= self.vote_decay
+        self.votes[int(detection[5])] += float(detection[4])
+        label = int(np.argmax(self.votes))
+        if label == self.label:
+            return False
+        self.label = label
+        self.label_since = timestamp
+        return True
+
+    def box(self):
+        return cxcywh_to_xyxy(self.state)
+
+class GestureTracker:
+    """
+    基于IoU匹配和卡尔曼滤波的多目标手势跟踪器
+
+    update() 接收一帧检测结果, predict() 在跳过检测的帧上只做状态外推。
+    轨迹的投票类别持续 hold_seconds 后输出 'hold' 事件, 类别改变或轨迹消失时
+    对已输出的手势输出 'end' 事件
+    """
+
+    def __init__(self, class_names, iou_thresh=0.3, max_age=10, min_hits=2, hold_seconds=0.5, vote_decay=0.9):
+        """
+        参数:
+            class_names: 类别名称, 字典 {类别ID: 名称} 或列表
+            iou_thresh: 检测框与预测框匹配的最小IoU
+            max_age: 连续多少次检测未匹配后删除轨迹
+            min_hits: 轨迹至少匹配多少次后才输出
+            hold_seconds: 同一手势保持多久后输出 'hold' 事件
+            vote_decay: 类别投票的衰减系数, 越小切换越快
+        """
+        if not isinstance(class_names, dict):
+            class_names = dict(enumerate(class_names))
+        self.class_names = class_names
+        self.num_classes = max(class_names, default=-1) + 1
+        self.iou_thresh = iou_thresh
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.hold_seconds = hold_seconds
+        self.vote_decay = vote_decay
+        self.tracks = []
+        self._next_id = 1
+
+    def _match(self, detections):
+        """
+        按IoU从大到小贪心匹配轨迹和检测框
+
+        返回:
+            matches: [(轨迹序号, 检测序号)]
+            unmatched: 未匹配的检测序号
+        """
+        if not self.tracks or len(detections) == 0:
+            return [], list(range(len(detections)))
+        predicted = np.array([track.box() for track in self.tracks])
+        iou = box_iou(predicted, detections[:, :4])
+        matches = []
+        for flat in np.argsort(-iou, axis=None):
+            t, d = np.unravel_index(flat, iou.shape)
+            if iou[t, d] < self.iou_thresh:
+                break
+            matches.append((int(t), int(d)))
+            iou[t, :] = -1
+            iou[:, d] = -1
+        matched = {d for _, d in matches}
+        return matches, [d for d in range(len(detections)) if d not in matched]
+
+    def _event(self, track, event_type, timestamp, label=None, since=None):
+        label = track.label if label is None else label
+        since = track.label_since if since is None else since
+        return {
+            'type': event_type,
+            'track_id': track.track_id,
+            'gesture': self.class_names.get(label, label),
+            'duration': timestamp - since,
+            'time': timestamp,
+        }
+
+    def _hold_events(self, timestamp):
+        events = []
+        for track in self.tracks:
+            if (not track.held and track.hits >= self.min_hits
+                    and timestamp - track.label_since >= self.hold_seconds):
+                track.held = True
+                events.append(self._event(track, 'hold', timestamp))
+        return events
+
+    def update(self, detections, timestamp=None):
+        """
+        用一帧检测结果更新轨迹
+
+        参数:
+            detections: (N,6) 检测数组 [x1, y1, x2, y2, conf, cls]
+            timestamp: 帧时间(秒), 默认使用当前时间
+
+        返回:
+            tracks: (M,7) 数组 [x1, y1, x2, y2, conf, cls, track_id], cls 为投票后的类别
+            events: 本帧产生的事件列表
+        """
+        timestamp = perf_counter() if timestamp is None else timestamp
+        detections = np.asarray(detections, dtype=np.float64).reshape(-1, 6)
+        for track in self.tracks:
+            track.predict()
+
+        events = []
+        matches, unmatched = self._match(detections)
+        matched_tracks = set()
+        for t, d in matches:
+            track = self.tracks[t]
+            previous, since = track.label, track.label_since
+            if track.update(detections[d], timestamp) and track.held:
+                # 手势切换: 结束旧手势, 新手势重新计时
+                track.held = False
+                events.append(self._event(track, 'end', timestamp, previous, since))
+            matched_tracks.add(t)
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.time_since_update += 1
+            if track.time_since_update > self.max_age:
+                if track.held:
+                    events.append(self._event(track, 'end', timestamp))
+                continue
+            survivors.append(track)
+        self.tracks = survivors
+
+        for d in unmatched:
+            self.tracks.append(KalmanBoxTrack(self._next_id, detections[d], self.num_classes, timestamp,
+                                              self.vote_decay))
+            self._next_id += 1
+
+        events.extend(self._hold_events(timestamp))
+        return self.active_tracks(), events
+
+    def predict(self, timestamp=None):
+        """
+        跳过检测的帧: 只外推轨迹位置, 不计入未匹配次数
+
+        返回:
+            tracks, events: 同 update()
+        """
+        timestamp = perf_counter() if timestamp is None else timestamp
+        for track in self.tracks:
+            track.predict()
+        return self.active_tracks(), self._hold_events(timestamp)
+
+    def active_tracks(self):
+        """已确认且最近一次检测时被匹配的轨迹"""
+        rows = [
+            [*track.box(), track.conf, track.label, track.track_id]
+            for track in self.tracks
+            if track.hits >= self.min_hits and track.time_since_update == 0
+        ]
+        return np.array(rows, dtype=np.float32).reshape(-1, 7)
+
+class TrackedDetector:
+    """
+    检测器加跟踪器: 每 detect_every 帧做一次完整检测, 中间的帧由卡尔曼滤波外推框的位置
+    """
+
+    def __init__(self, detector, tracker=None, detect_every=1):
+        """
+        参数:
+            detector: UltralyticsYOLODetector 实例
+            tracker: GestureTracker 实例, 默认使用检测器的类别名称创建
+            detect_every: 每隔多少帧检测一次, 1表示每帧检测
+        """
+        self.detector = detector
+        self.tracker = tracker or GestureTracker(detector.class_names)
+        self.detect_every = max(1, detect_every)
+        self.frame_count = 0
+
+    def process(self, frame, timestamp=None):
+        """
+        处理一帧
+
+        返回:
+            tracks: (M,7) 数组 [x1, y1, x2, y2, conf, cls, track_id]
+            events: 本帧产生的手势事件
+        """
+        detect = self.frame_count % self.detect_every == 0
+        self.frame_count += 1
+        if detect:
+            return self.tracker.update(self.detector.detect(frame), timestamp)
+        return self.tracker.predict(timestamp)
+
+    def run(self, source=0, window_name="YOLO Tracking", show=True, max_frames=None, on_event=None):
+        """
+        在摄像头或视频文件上运行跟踪, 绘制稳定后的手势框并打印事件
+
+        参数:
+            source: 摄像头ID或视频文件路径
+            window_name: 显示窗口名称
+            show: 是否显示窗口
+            max_frames: 可选, 处理该数量的帧后停止
+            on_event: 可选回调 on_event(event), 默认打印事件
+
+        返回:
+            processed: 处理的帧数
+        """
+        cap, _ = open_source(source)
+        if not cap.isOpened():
+            print(f"Error: Could not open source {source}.")
+            return 0
+        on_event = on_event or (lambda event: print(
+            f"Track {event['track_id']}: {event['gesture']} "
+            f"{'held for' if event['type'] == 'hold' else 'ended after'} {event['duration']:.1f}s"))
+
+        processed = 0
+        try:
+            while max_frames is None or processed < max_frames:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                tracks, events = self.process(frame)
+                for event in events:
+                    on_event(event)
+                processed += 1
+                if show:
+                    frame = self.detector.draw_detections(frame, tracks[:, :6])
+                    cv2.imshow(window_name, frame)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+        finally:
+            cap.release()
+            if show:
+                cv2.destroyAllWindows()
+        return processed
+
+if __name__ == "__main__":
+    # 替换为你的模型路径
+    MODEL_PATH = "best.pt"
+
+    # 每3帧检测一次, 中间帧由跟踪器外推; 静止场景下推理开销约降为1/3
+    DETECT_EVERY = 3
+
+    detector = UltralyticsYOLODetector(MODEL_PATH)
+    tracked = TrackedDetector(detector, GestureTracker(detector.class_names, hold_seconds=0.5), DETECT_EVERY)
+    print("Starting gesture tracking...")
+    tracked.run(0)
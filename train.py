@@ -1,19 +1,270 @@
+import argparse
+import json
+import math
+import os
+from time import perf_counter
+
+import yaml
 from ultralytics import YOLO
 from ultralytics import RTDETR
 
+from metrics import Metrics
+from training_cache import CachedDetectionTrainer, TrainingCache, attach_cache, split_image_paths
+
+# 默认训练配置, 可被配置文件和命令行参数覆盖; 'auto' 表示根据硬件自动选择
+DEFAULT_CONFIG = {
+    'model': 'yolo11m.pt',  # 或 'ultralytics/cfg/models/11/yolo11.yaml' 不使用预训练权重
+    'data': './test_datasets/data.yaml',
+    'epochs': 300,
+    'imgsz': 640,
+    'device': 'auto',
+    'batch': 'auto',  # 总批次大小, 多卡训练时平均分到每张GPU
+    'workers': 'auto',  # 每个进程的数据加载线程数
+    'amp': 'auto',
+    'cache': True,  # 使用 training_cache 的预解码缓存
+    'probe': False,  # 训练前测试数据加载吞吐量, 选择最佳 workers
+    'probe_batches': 20,
+    'profile': 0,  # >0 时先用该比例的训练数据跑1个epoch, 输出各阶段耗时
+}
+
+def load_config(config_path=None, overrides=None):
+    """
+    合并默认配置、配置文件(YAML或JSON)和命令行参数
+
+    返回:
+        config: 合并后的配置字典
+    """
+    config = dict(DEFAULT_CONFIG)
+    if config_path:
+        with open(config_path, 'r') as f:
+            config.update(yaml.safe_load(f) or {})
+    config.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    return config
+
+def detect_hardware():
+    """
+    返回:
+        hardware: 字典, 包含CPU核数、GPU数量和最小GPU显存(GB)
+    """
+    import torch
+
+    gpus = torch.cuda.device_count()
+    memory = min((torch.cuda.get_device_properties(i).total_memory for i in range(gpus)), default=0)
+    return {'cpus': os.cpu_count() or 1, 'gpus': gpus, 'gpu_memory_gb': memory / 1024 ** 3}
+
+def parse_device(device):
+    """把 '0,1' / '0' 形式的设备字符串(命令行或配置文件)转换为GPU编号列表或单个编号"""
+    if not isinstance(device, str) or device in ('auto', 'cpu', 'mps'):
+        return device
+    devices = [int(item) for item in device.split(',') if item.strip()]
+    return devices if len(devices) > 1 else devices[0]
+
+def resolve_config(config, hardware):
+    """
+    把 'auto' 配置项替换为根据硬件选择的值
+
+    device: 所有GPU, 没有GPU时为cpu
+    batch: 单卡使用 ultralytics 的 AutoBatch(-1); 多卡按显存估算每卡批次(8~64, 2的幂); CPU为8
+    workers: CPU核数平分到每张GPU, 最多16
+    amp: 有GPU时开启
+    """
+    config = dict(config)
+    gpus = hardware['gpus']
+    config['device'] = parse_device(config['device'])
+    if config['device'] == 'auto':
+        config['device'] = list(range(gpus)) if gpus > 1 else (0 if gpus else 'cpu')
+    num_devices = len(config['device']) if isinstance(config['device'], list) else 1
+    on_gpu = config['device'] != 'cpu'
+
+    if config['batch'] == 'auto':
+        if not on_gpu:
+            config['batch'] = 8
+        elif num_devices == 1:
+            config['batch'] = -1
+        else:
+            per_gpu = 2 ** int(math.log2(max(hardware['gpu_memory_gb'] * 2, 8)))
+            config['batch'] = min(max(per_gpu, 8), 64) * num_devices
+    if config['workers'] == 'auto':
+        config['workers'] = max(1, min(hardware['cpus'] // num_devices, 16))
+    if config['amp'] == 'auto':
+        config['amp'] = on_gpu
+    return config
+
+def _build_loader(config, workers, batch):
+    """构建与训练相同的 ultralytics 训练数据集和数据加载器(带数据增强), 有缓存时接入缓存"""
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data import build_dataloader, build_yolo_dataset
+    from ultralytics.data.utils import check_det_dataset
+
+    data = check_det_dataset(config['data'])
+    cfg = get_cfg(overrides={'imgsz': config['imgsz'], 'data': config['data'], 'task': 'detect'})
+    dataset = build_yolo_dataset(cfg, data['train'], batch, data, mode='train')
+    if config['cache']:
+        attach_cache(dataset, TrainingCache.open(data['path'], config['imgsz']))
+    return build_dataloader(dataset, batch, workers, shuffle=True)
+
+def probe_workers(config, worker_counts=None, batch=16, batches=20):
+    """
+    只在CPU上运行数据加载(不训练), 测试不同 workers 下的吞吐量
+
+    参数:
+        config: 训练配置
+        worker_counts: 要测试的 workers 列表, 默认为 0(主进程加载), 1, 2, 4, 8, ... 直到CPU核数
+        batch: 测试使用的批次大小
+        batches: 每个配置计时的批次数(不含第一批的启动开销)
+
+    返回:
+        best: 吞吐量达到最大值95%的最小 workers
+        results: {workers: 每秒图片数}
+    """
+    cpus = os.cpu_count() or 1
+    if worker_counts is None:
+        worker_counts = [0, 1] + [2 ** i for i in range(1, int(math.log2(cpus)) + 1)]
+    results = {}
+    for workers in worker_counts:
+        loader = _build_loader(config, workers, batch)
+        iterator = iter(loader)
+        next(iterator)
+        start = perf_counter()
+        images = 0
+        for _ in range(batches):
+            try:
+                images += len(next(iterator)['im_file'])
+            except StopIteration:
+                break
+        results[workers] = images / (perf_counter() - start)
+        print(f"workers={workers:3}: {results[workers]:8.1f} images/s")
+        del iterator, loader
+
+    peak = max(results.values())
+    best = min(workers for workers, rate in results.items() if rate >= 0.95 * peak)
+    print(f"Best workers: {best} ({results[best]:.1f} images/s)")
+    return best, results
+
+def profile_training(model, config, fraction, output='train_profile.json'):
+    """
+    用部分训练数据在单个设备上跑1个epoch, 统计数据等待、训练步和验证的耗时
+
+    返回:
+        summary: 各阶段的耗时分布, 同时保存为JSON和Chrome trace
+    """
+    import torch
+
+    metrics = Metrics()
+    state = {}
+    synchronize = torch.cuda.synchronize if torch.cuda.is_available() else (lambda: None)
+
+    def on_train_batch_start(trainer):
+        now = perf_counter()
+        if 'batch_end' in state:
+            metrics.record('data', int((now - state['batch_end']) * 1e9))
+        state['batch_start'] = now
+
+    def on_train_batch_end(trainer):
+        synchronize()
+        now = perf_counter()
+        metrics.record('step', int((now - state['batch_start']) * 1e9))
+        state['batch_end'] = now
+
+    def on_train_epoch_end(trainer):
+        state['epoch_end'] = perf_counter()
+        state.pop('batch_end', None)
+
+    def on_fit_epoch_end(trainer):
+        if 'epoch_end' in state:
+            metrics.record('val', int((perf_counter() - state['epoch_end']) * 1e9))
+
+    for event, callback in (('on_train_batch_start', on_train_batch_start), ('on_train_batch_end', on_train_batch_end),
+                            ('on_train_epoch_end', on_train_epoch_end), ('on_fit_epoch_end', on_fit_epoch_end)):
+        model.add_callback(event, callback)
+
+    device = config['device'][0] if isinstance(config['device'], list) else config['device']
+    batch = config['batch'] // len(config['device']) if isinstance(config['device'], list) else config['batch']
+    model.train(data=config['data'], epochs=1, imgsz=config['imgsz'], device=device, batch=batch,
+                workers=config['workers'], amp=config['amp'], fraction=fraction, plots=False,
+                name='profile', trainer=CachedDetectionTrainer if config['cache'] else None)
+
+    summary = metrics.summary()
+    with open(output, 'w') as f:
+        json.dump({'config': config, 'fraction': fraction, 'stages': summary}, f, indent=2, default=str)
+    metrics.dump_trace(os.path.splitext(output)[0] + '_trace.json')
+    step = summary.get('step', {}).get('mean_ms', 0)
+    data = summary.get('data', {}).get('mean_ms', 0)
+    for stage, stats in summary.items():
+        print(f"{stage}: {stats}")
+    if step:
+        print(f"Data loading wait is {data / step:.0%} of step time")
+    return summary
+
+def prepare(config):
+    """
+    根据硬件解析配置, 需要时构建训练缓存; 训练和单独的吞吐量测试使用相同的准备流程
+
+    返回:
+        config: 解析后的配置
+    """
+    hardware = detect_hardware()
+    config = resolve_config(config, hardware)
+    print(f"Hardware: {hardware}")
+
+    if config['cache']:
+        from ultralytics.data.utils import check_det_dataset
+        # 只缓存 data.yaml 中各划分实际使用的图片
+        data = check_det_dataset(config['data'])
+        TrainingCache.open(data['path'], config['imgsz']).build(split_image_paths(data))
+    return config
+
+def train(config):
+    """按配置训练; 先根据需要构建缓存、测试数据加载吞吐量和做性能分析"""
+    config = prepare(config)
+    if config['probe']:
+        config['workers'], _ = probe_workers(config, batches=config['probe_batches'])
+    print(f"Training config: {config}")
+
+    model_cls = RTDETR if 'rtdetr' in os.path.basename(str(config['model'])).lower() else YOLO
+    if config['profile']:
+        profile_training(model_cls(config['model']), config, config['profile'])
+
+    model = model_cls(config['model'])
+    return model.train(
+        data=config['data'],
+        epochs=config['epochs'],  # (int) 训练的周期数
+        imgsz=config['imgsz'],  # (int) 输入图像的大小
+        device=config['device'],
+        batch=config['batch'],  # (int) 总批次大小
+        workers=config['workers'],  # (int) 数据加载的工作线程数
+        amp=config['amp'],
+        trainer=CachedDetectionTrainer if config['cache'] else None,
+    )
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train a gesture detector")
+    parser.add_argument('--config', help="YAML/JSON config file, see DEFAULT_CONFIG")
+    parser.add_argument('--model')
+    parser.add_argument('--data')
+    parser.add_argument('--epochs', type=int)
+    parser.add_argument('--imgsz', type=int)
+    parser.add_argument('--device', help="'auto', 'cpu', a GPU id or a comma separated list")
+    parser.add_argument('--batch', type=int)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--amp', action=argparse.BooleanOptionalAction, default=None)
+    parser.add_argument('--cache', action=argparse.BooleanOptionalAction, default=None)
+    parser.add_argument('--probe', action='store_true', default=None,
+                        help="measure data loading throughput and pick the best worker count")
+    parser.add_argument('--probe-only', action='store_true', help="run the throughput probe and exit")
+    parser.add_argument('--profile', type=float, help="profile one epoch on this fraction of the data first")
+    args = parser.parse_args()
 
+    overrides = {key: value for key, value in vars(args).items() if key not in ('config', 'probe_only')}
+    return load_config(args.config, overrides), args.probe_only
 
 if __name__ == '__main__':
-    # 加载模型
-    # model = YOLO(r'ultralytics/cfg/models/11/yolo11.yaml')  # 不使用预训练权重训练
-    model = YOLO(r'yolo11m.pt')  # 使用预训练权重训练
-    # 训练参数 ----------------------------------------------------------------------------------------------
-    model.train(
-        data=r'./test_datasets/data.yaml',
-        epochs=300,  # (int) 训练的周期数
-        imgsz=640,  # (int) 输入图像的大小
-        device=[0, 1, 2, 3, 4, 5, 6, 7],
-        batch=64,  # (int) 每个GPU的批次大小
-        workers=60,  # (int) 数据加载的工作线程数
-        amp = False
-    )
\ No newline at end of file
+    # 示例:
+    #   python train.py                                  # 自动选择设备、批次和workers
+    #   python train.py --probe-only --device cpu        # 只测试数据加载吞吐量
+    #   python train.py --config train.yaml --probe --profile 0.05
+    config, probe_only = parse_args()
+    if probe_only:
+        probe_workers(prepare(config), batches=config['probe_batches'])
+    else:
+        train(config)
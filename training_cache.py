@@ -0,0 +1,373 @@
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics.models.yolo.detect import DetectionTrainer
+
+from dataset_index import IMAGE_EXTENSIONS, DatasetIndex
+
+CACHE_DIRNAME = '.train_cache'
+CACHE_VERSION = 1
+ALIGNMENT = 64
+
+# 每列保存为一个 .npy 文件, 与 dataset_index 的列式存储相同
+COLUMNS = ('key', 'offset', 'shape', 'mtime', 'size')
+
+# balance.py 的 'manifest' 模式在数据集根目录写入的图片列表
+MANIFEST_FILES = ('train.txt', 'val.txt', 'test.txt')
+
+def resize_long_side(image, imgsz):
+    """
+    按长边缩放到 imgsz, 与 ultralytics 数据集 load_image 的几何一致
+
+    不做letterbox填充: 填充和mosaic等增强由训练时的数据管线完成, 归一化的YOLO标签保持有效
+    """
+    h0, w0 = image.shape[:2]
+    ratio = imgsz / max(h0, w0)
+    if ratio == 1:
+        return image
+    w, h = min(math.ceil(w0 * ratio), imgsz), min(math.ceil(h0 * ratio), imgsz)
+    interpolation = cv2.INTER_AREA if ratio < 1 else cv2.INTER_LINEAR
+    return cv2.resize(image, (w, h), interpolation=interpolation)
+
+def split_image_paths(data, splits=('train', 'val', 'test')):
+    """
+    data.yaml 中指定划分的所有图片路径
+
+    参数:
+        data: ultralytics check_det_dataset 返回的数据集配置, 各划分为绝对路径
+        splits: 要收集的划分, data.yaml 中没有的划分跳过
+
+    返回:
+        paths: 去重后的图片路径; 划分为目录时递归查找图片, 为 .txt 时读取图片列表
+    """
+    paths = []
+    for split in splits:
+        sources = data.get(split) or []
+        for source in sources if isinstance(sources, list) else [sources]:
+            source = Path(source)
+            if source.is_dir():
+                paths.extend(sorted(str(path) for path in source.rglob('*')
+                                    if path.suffix.lower() in IMAGE_EXTENSIONS))
+            elif source.suffix == '.txt' and source.is_file():
+                # 与 ultralytics 一致, 以 ./ 开头的路径相对于列表文件所在目录
+                with open(source, 'r') as f:
+                    lines = [line.strip() for line in f if line.strip()]
+                paths.extend(str(source.parent / line[2:]) if line.startswith('./') else line for line in lines)
+    return list(dict.fromkeys(paths))
+
+def _decode_resized(args):
+    """工作进程: 解码并缩放一张图片, 失败时返回 None"""
+    path, imgsz = args
+    image = cv2.imread(path)
+    if image is None:
+        return None, (0, 0)
+    return np.ascontiguousarray(resize_long_side(image, imgsz)), image.shape[:2]
+
+class TrainingCache:
+    """
+    预解码、预缩放的训练图片缓存
+
+    所有图片按长边缩放到 imgsz 后以 uint8 原始像素依次写入 <root>/.train_cache/<imgsz>/images.bin
+    (每张按64字节对齐), 偏移和尺寸等索引以列式 .npy 保存。训练时以写时复制方式mmap,
+    读取一张图片只是一次切片, 没有解码和缩放开销, 数据增强的原地修改也不会写回文件。
+
+    重新构建时按源图片的mtime和大小增量更新: 新增或变化的图片追加到文件末尾,
+    删除的图片只从索引中移除, 失效字节超过 compact_ratio 时整体压缩
+    """
+
+    def __init__(self, root, imgsz=640):
+        """
+        参数:
+            root: 数据集根目录(如 balance.py 输出的平衡数据集)
+            imgsz: 训练输入尺寸
+        """
+        self.root = Path(root)
+        self.imgsz = imgsz
+        self.cache_dir = self.root / CACHE_DIRNAME / str(imgsz)
+        self.data_path = self.cache_dir / 'images.bin'
+        self.columns = self._empty_columns()
+        self.data_size = 0
+        self._lookup = None
+        self._data = None
+
+    @staticmethod
+    def _empty_columns():
+        return {
+            'key': np.zeros(0, dtype='<U1'),
+            'offset': np.zeros(0, dtype=np.int64),
+            'shape': np.zeros((0, 4), dtype=np.int32),  # h, w, 原始h, 原始w
+            'mtime': np.zeros(0, dtype=np.int64),
+            'size': np.zeros(0, dtype=np.int64),
+        }
+
+    @classmethod
+    def open(cls, root, imgsz=640):
+        """加载已有缓存, 不存在时返回空缓存"""
+        cache = cls(root, imgsz)
+        cache.load()
+        return cache
+
+    def __len__(self):
+        return len(self.columns['key'])
+
+    def __getstate__(self):
+        # DataLoader 工作进程中重新打开mmap, 不序列化图片数据
+        state = self.__dict__.copy()
+        state['_data'] = None
+        return state
+
+    def load(self):
+        meta_path = self.cache_dir / 'meta.json'
+        if not meta_path.exists():
+            return False
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get('version') != CACHE_VERSION or meta.get('imgsz') != self.imgsz:
+            return False
+        self.columns = {name: np.load(self.cache_dir / f"{name}.npy", mmap_mode='r') for name in COLUMNS}
+        self.data_size = meta['data_size']
+        self._lookup = None
+        self._data = None
+        return True
+
+    def save(self):
+        """保存索引, 每列先写临时文件再替换, meta.json最后写入"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for name in COLUMNS:
+            tmp_path = self.cache_dir / f"{name}.tmp.npy"
+            np.save(tmp_path, np.ascontiguousarray(self.columns[name]))
+            os.replace(tmp_path, self.cache_dir / f"{name}.npy")
+        live = int((self.columns['shape'][:, 0].astype(np.int64) * self.columns['shape'][:, 1] * 3).sum())
+        meta = {'version': CACHE_VERSION, 'imgsz': self.imgsz, 'count': len(self),
+                'data_size': self.data_size, 'live_bytes': live}
+        with open(self.cache_dir / 'meta.json.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(self.cache_dir / 'meta.json.tmp', self.cache_dir / 'meta.json')
+
+    @staticmethod
+    def _key(path):
+        # 与 ultralytics 数据集的 im_files 一致, 解析符号链接后的绝对路径
+        return str(Path(path).resolve())
+
+    def _dataset_images(self):
+        """
+        数据集中所有的图片: balance.py 以 'manifest' 模式输出时读取图片列表,
+        否则为数据集索引中所有有图片的文件
+        """
+        manifests = [self.root / name for name in MANIFEST_FILES if (self.root / name).is_file()]
+        if manifests:
+            paths = []
+            for manifest in manifests:
+                with open(manifest, 'r') as f:
+                    paths.extend(line.strip() for line in f if line.strip())
+            return list(dict.fromkeys(paths))
+        index = DatasetIndex.open(self.root)
+        paths = [index.image_path(row) for row in index.select(require_label=False)]
+        if not paths:
+            raise ValueError(f"{self.root} 中没有找到图片(images目录或 {'/'.join(MANIFEST_FILES)} 图片列表)")
+        return paths
+
+    def build(self, image_paths=None, workers=None, compact_ratio=0.3, chunk_size=64):
+        """
+        增量构建缓存
+
+        参数:
+            image_paths: 要缓存的图片路径, 默认为数据集中的所有图片(支持 manifest 模式的图片列表)
+            workers: 解码图片的进程数, 默认为CPU核数
+            compact_ratio: 失效字节占比超过该值时压缩数据文件
+            chunk_size: 每个进程任务包含的图片数
+
+        返回:
+            stats: 字典, 包含复用、新写入、因源图片变化而重写、失败、源图片不存在和删除的图片数量
+        """
+        if image_paths is None:
+            image_paths = self._dataset_images()
+        stats = {}
+        missing = []
+        for key in dict.fromkeys(self._key(path) for path in image_paths):
+            try:
+                stats[key] = os.stat(key)
+            except FileNotFoundError:
+                missing.append(key)
+        if missing:
+            print(f"警告: 跳过 {len(missing)} 张不存在的图片, 如 {missing[0]}")
+        keys = list(stats)
+
+        old = self.columns
+        old_rows = {str(key): i for i, key in enumerate(old['key'])}
+        reused = []
+        pending = []
+        for key in keys:
+            stat = stats[key]
+            i = old_rows.get(key)
+            if i is not None and old['mtime'][i] == stat.st_mtime_ns and old['size'][i] == stat.st_size:
+                reused.append(i)
+            else:
+                pending.append(key)
+
+        self._data = None
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if not self.data_path.exists():
+            self.data_size = 0
+        offset = self.data_size
+        rows = [(str(old['key'][i]), int(old['offset'][i]), tuple(old['shape'][i]),
+                 int(old['mtime'][i]), int(old['size'][i])) for i in reused]
+        failed = 0
+
+        with open(self.data_path, 'r+b' if self.data_path.exists() else 'wb') as f:
+            f.seek(offset)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                decoded = pool.map(_decode_resized, [(key, self.imgsz) for key in pending], chunksize=chunk_size)
+                for done, (key, (image, original_shape)) in enumerate(zip(pending, decoded), 1):
+                    if image is None:
+                        failed += 1
+                        continue
+                    padding = -offset % ALIGNMENT
+                    f.write(b'\0' * padding + image.tobytes())
+                    offset += padding
+                    stat = stats[key]
+                    rows.append((key, offset, (*image.shape[:2], *original_shape), stat.st_mtime_ns, stat.st_size))
+                    offset += image.nbytes
+                    if done % 10000 == 0:
+                        print(f"已缓存 {done}/{len(pending)} 张图片")
+            f.truncate(offset)
+        self.data_size = offset
+
+        rows.sort(key=lambda row: row[0])
+        self._set_rows(rows)
+        rewritten = sum(1 for key in pending if key in old_rows)
+        result = {'reused': len(reused), 'written': len(pending) - failed, 'rewritten': rewritten,
+                  'failed': failed, 'missing': len(missing), 'removed': len(old_rows.keys() - set(keys))}
+
+        live = int((self.columns['shape'][:, 0].astype(np.int64) * self.columns['shape'][:, 1] * 3).sum())
+        if self.data_size and (self.data_size - live) / self.data_size > compact_ratio:
+            self.compact()
+        self.save()
+        print(f"训练缓存 {self.cache_dir}: {len(self)} 张图片, {self.data_size / 1e9:.2f} GB, {result}")
+        return result
+
+    def _set_rows(self, rows):
+        columns = self._empty_columns()
+        if rows:
+            keys, offsets, shapes, mtimes, sizes = zip(*rows)
+            columns = {
+                'key': np.array(keys, dtype=str),
+                'offset': np.array(offsets, dtype=np.int64),
+                'shape': np.array(shapes, dtype=np.int32).reshape(-1, 4),
+                'mtime': np.array(mtimes, dtype=np.int64),
+                'size': np.array(sizes, dtype=np.int64),
+            }
+        self.columns = columns
+        self._lookup = None
+        self._data = None
+
+    def compact(self):
+        """按索引顺序重写数据文件, 去掉已删除或已替换图片占用的字节"""
+        source = np.memmap(self.data_path, dtype=np.uint8, mode='r') if self.data_size else None
+        tmp_path = self.data_path.with_suffix('.tmp')
+        offsets = np.empty(len(self), dtype=np.int64)
+        offset = 0
+        with open(tmp_path, 'wb') as f:
+            for i, (old_offset, shape) in enumerate(zip(self.columns['offset'], self.columns['shape'])):
+                nbytes = int(shape[0]) * int(shape[1]) * 3
+                padding = -offset % ALIGNMENT
+                f.write(b'\0' * padding)
+                offset += padding
+                f.write(source[old_offset:old_offset + nbytes].tobytes())
+                offsets[i] = offset
+                offset += nbytes
+        del source
+        os.replace(tmp_path, self.data_path)
+        self.columns = {**self.columns, 'offset': offsets}
+        self.data_size = offset
+        self._data = None
+
+    def __contains__(self, path):
+        return self.get_row(path) is not None
+
+    def get_row(self, path):
+        if self._lookup is None:
+            self._lookup = {str(key): i for i, key in enumerate(self.columns['key'])}
+        # 按调用方传入的路径字符串记住查找结果(包括未命中), 每个路径只解析一次
+        path = str(path)
+        if path not in self._lookup:
+            self._lookup[path] = self._lookup.get(self._key(path))
+        return self._lookup[path]
+
+    def get(self, path):
+        """
+        读取缓存中的图片
+
+        返回:
+            (image, (原始h, 原始w), (h, w)), image 为写时复制的mmap视图; 不在缓存中时返回 None
+        """
+        row = self.get_row(path)
+        if row is None:
+            return None
+        if self._data is None:
+            self._data = np.memmap(self.data_path, dtype=np.uint8, mode='c')
+        h, w, h0, w0 = (int(v) for v in self.columns['shape'][row])
+        offset = int(self.columns['offset'][row])
+        image = self._data[offset:offset + h * w * 3].reshape(h, w, 3)
+        return image, (h0, w0), (h, w)
+
+class _CachedImageLoader:
+    """替换数据集的 load_image: 缓存命中时直接返回mmap视图, 否则回退到原始的解码流程"""
+
+    def __init__(self, dataset, cache, original):
+        self.dataset = dataset
+        self.cache = cache
+        self.original = original
+
+    def __call__(self, i, rect_mode=True):
+        entry = self.cache.get(self.dataset.im_files[i]) if rect_mode else None
+        if entry is None:
+            return self.original(i, rect_mode)
+        # 维护mosaic使用的缓冲区, 与原始 load_image 的行为一致
+        if getattr(self.dataset, 'augment', False):
+            self.dataset.buffer.append(i)
+            if len(self.dataset.buffer) >= self.dataset.max_buffer_length:
+                self.dataset.buffer.pop(0)
+        return entry
+
+def attach_cache(dataset, cache):
+    """
+    让 ultralytics 的 YOLODataset 从训练缓存读取图片
+
+    返回:
+        hits: 数据集中命中缓存的图片数量; 缓存尺寸与数据集不一致时为0且不做替换
+    """
+    if cache.imgsz != dataset.imgsz:
+        print(f"训练缓存尺寸 {cache.imgsz} 与训练尺寸 {dataset.imgsz} 不一致, 不使用缓存")
+        return 0
+    hits = sum(1 for path in dataset.im_files if path in cache)
+    if hits:
+        dataset.load_image = _CachedImageLoader(dataset, cache, dataset.load_image)
+    print(f"训练缓存命中 {hits}/{len(dataset.im_files)} 张图片")
+    return hits
+
+class CachedDetectionTrainer(DetectionTrainer):
+    """
+    从训练缓存读取图片的检测训练器, 用法: model.train(data=..., trainer=CachedDetectionTrainer)
+
+    缓存位于 data.yaml 中 path 指向的数据集根目录, 尺寸与训练的 imgsz 一致。
+    定义在模块顶层, 多GPU训练时 ultralytics 生成的DDP脚本可以直接导入
+    """
+
+    def build_dataset(self, img_path, mode='train', batch=None):
+        dataset = super().build_dataset(img_path, mode, batch)
+        attach_cache(dataset, TrainingCache.open(self.data['path'], self.args.imgsz))
+        return dataset
+
+if __name__ == "__main__":
+    # 配置参数
+    DATASET_DIR = "./test_datasets"  # balance.py 输出的平衡数据集
+    IMGSZ = 640
+
+    # 数据集变化后重新运行即可增量更新
+    TrainingCache.open(DATASET_DIR, IMGSZ).build()
@@ -0,0 +1,280 @@
+import errno
+import os
+import shutil
+import stat
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+# 支持的传输方式
+TRANSFER_MODES = ('move', 'copy', 'hardlink', 'symlink', 'reflink')
+
+# Linux FICLONE ioctl, 在btrfs/xfs等文件系统上共享数据块
+FICLONE = 0x40049409
+
+def _reflink(src, dst):
+    """写时复制克隆文件, 文件系统不支持时抛出OSError"""
+    import fcntl
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+def materialize_file(src, dst, mode='copy'):
+    """
+    按指定方式把src传输到dst
+
+    参数:
+        src: 源文件路径
+        dst: 目标文件路径
+        mode: 'move' 移动(同一文件系统内直接rename), 'copy' 复制, 'hardlink' 硬链接,
+              'symlink' 符号链接(指向源文件绝对路径), 'reflink' 写时复制克隆;
+              跨文件系统的移动/硬链接或不支持reflink时退回复制
+
+    返回:
+        used_mode: 实际使用的方式
+    """
+    if mode == 'move':
+        try:
+            os.rename(src, dst)
+            return mode
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        shutil.move(str(src), str(dst))
+        return 'copy'
+    elif mode == 'hardlink':
+        try:
+            os.link(src, dst)
+            return mode
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+    elif mode == 'symlink':
+        os.symlink(os.path.abspath(src), dst)
+        return mode
+    elif mode == 'reflink':
+        try:
+            _reflink(src, dst)
+            return mode
+        except (OSError, ImportError):
+            pass
+    elif mode != 'copy':
+        raise ValueError(f"未知的传输方式: {mode}")
+
+    shutil.copy2(src, dst)
+    return 'copy'
+
+def _is_identical(src, dst):
+    """
+    dst 是否已经是 src 的传输结果: 指向src的符号链接、同一inode(硬链接),
+    或大小和mtime都相同的副本(copy2 和 reflink 会保留mtime)
+    """
+    dst_stat = os.lstat(dst)
+    if stat.S_ISLNK(dst_stat.st_mode):
+        return os.path.realpath(dst) == os.path.realpath(src)
+    src_stat = os.stat(src)
+    if (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev, dst_stat.st_ino):
+        return True
+    return src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+
+def _transfer_batch(batch, mode, skip_existing):
+    """
+    在工作线程中处理一批传输
+
+    目标与源是同一个文件(同一路径、硬链接或指向源的链接)时跳过, 不做任何删除;
+    其余已存在的目标在 skip_existing 为True且内容相同时跳过, 否则先删除目标再传输
+
+    返回:
+        done: [(src, dst, 实际方式)], 已存在而跳过的方式记为 'skip'
+        failed: [(src, dst, 错误信息)]
+    """
+    done = []
+    failed = []
+    for src, dst in batch:
+        try:
+            if os.path.lexists(dst) and os.path.lexists(src):
+                # 先排除同一文件, 否则删除目标就是删除源文件
+                if os.path.exists(dst) and os.path.samefile(src, dst):
+                    done.append((src, dst, 'skip'))
+                    continue
+                if skip_existing and _is_identical(src, dst):
+                    done.append((src, dst, 'skip'))
+                    continue
+                os.remove(dst)
+            done.append((src, dst, materialize_file(src, dst, mode)))
+        except shutil.SameFileError:
+            # 目标已经是指向源文件的链接
+            done.append((src, dst, 'skip'))
+        except OSError as e:
+            if mode == 'move' and not os.path.lexists(src) and os.path.lexists(dst):
+                # 上次中断前已经移动完成
+                done.append((src, dst, 'skip'))
+            else:
+                failed.append((src, dst, str(e)))
+    return done, failed
+
+def _load_journal(journal):
+    """读取日志中已完成的 (src, dst)"""
+    completed = set()
+    if journal is None or not os.path.exists(journal):
+        return completed
+    with open(journal, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) == 2:
+                completed.add((parts[0], parts[1]))
+    return completed
+
+def transfer_files(pairs, mode='copy', workers=16, batch_size=256, dry_run=False, journal=None,
+                   skip_existing=None, report_every=50000, raise_on_error=True):
+    """
+    用线程池并发地移动/复制/链接文件
+
+    参数:
+        pairs: 可迭代的 (源路径, 目标路径)
+        mode: 传输方式, 见 TRANSFER_MODES
+        workers: 并发线程数, 网络存储上可以设置得较大以掩盖往返延迟
+        batch_size: 每个任务处理的文件数
+        dry_run: 只打印并返回传输计划, 不修改任何文件
+        journal: 可选的日志文件路径, 每批完成后追加记录; 中断后用相同日志重新运行会跳过已完成的文件
+        skip_existing: 目标已存在且与源相同(同一文件、指向源的链接或大小和mtime相同的副本)时跳过,
+            不同的目标总是被覆盖; 默认 move 时为False(与 shutil.move 一样覆盖并移走源文件), 其余为True
+        report_every: 每处理多少个文件打印一次进度
+        raise_on_error: 有文件传输失败时抛出 RuntimeError(日志已写入, 修复后可重新运行)
+
+    返回:
+        stats: 字典, 包含 planned(计划数量)、done(完成数量)、modes(实际方式计数)、
+               failed([(src, dst, 错误信息)])、plan(仅dry_run时为完整计划)
+    """
+    if mode not in TRANSFER_MODES:
+        raise ValueError(f"未知的传输方式: {mode}, 可选 {TRANSFER_MODES}")
+    if skip_existing is None:
+        skip_existing = mode != 'move'
+
+    completed = _load_journal(journal)
+    plan = []
+    seen = set()
+    duplicates = 0
+    for src, dst in pairs:
+        src, dst = str(src), str(dst)
+        # 重复的传输只保留第一个; 移动时同一个源只能移动一次
+        key = src if mode == 'move' else (src, dst)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        if (src, dst) not in completed:
+            plan.append((src, dst))
+    if duplicates:
+        print(f"警告: 忽略 {duplicates} 个重复的传输" + (" (同一源文件只移动一次)" if mode == 'move' else ""))
+    stats = {'planned': len(plan), 'done': 0, 'modes': Counter(), 'failed': [], 'plan': None}
+
+    if dry_run:
+        print(f"[dry-run] 计划{mode} {len(plan)} 个文件 (日志中已完成 {len(completed)} 个)")
+        for src, dst in plan[:20]:
+            print(f"  {src} -> {dst}")
+        if len(plan) > 20:
+            print(f"  ... 以及另外 {len(plan) - 20} 个文件")
+        stats['plan'] = plan
+        return stats
+
+    # 目标目录在主线程中统一创建一次
+    for parent in {os.path.dirname(dst) for _, dst in plan}:
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+    journal_file = open(journal, 'a', encoding='utf-8') if journal is not None else None
+    next_report = report_every
+    pending = deque()
+
+    def drain(limit):
+        nonlocal next_report
+        while len(pending) > limit:
+            done, failed = pending.popleft().result()
+            stats['done'] += len(done)
+            stats['modes'].update(used for _, _, used in done)
+            stats['failed'].extend(failed)
+            if journal_file is not None:
+                journal_file.writelines(f"{src}\t{dst}\n" for src, dst, _ in done)
+                journal_file.flush()
+            if stats['done'] >= next_report:
+                print(f"已处理 {stats['done']}/{len(plan)} 个文件")
+                next_report += report_every
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i in range(0, len(plan), batch_size):
+                pending.append(pool.submit(_transfer_batch, plan[i:i + batch_size], mode, skip_existing))
+                drain(workers * 4)
+            drain(0)
+    finally:
+        if journal_file is not None:
+            journal_file.close()
+
+    for src, dst, error in stats['failed'][:20]:
+        print(f"传输 {src} -> {dst} 失败: {error}")
+    if mode not in ('copy', 'move') and stats['modes']['copy']:
+        print(f"注意: {stats['modes']['copy']} 个文件无法使用 {mode}, 已退回复制")
+    if stats['failed'] and raise_on_error:
+        raise RuntimeError(f"{len(stats['failed'])}/{len(plan)} 个文件{mode}失败, 第一个错误: {stats['failed'][0][2]}")
+    return stats
+
+def _write_text(item):
+    """先写临时文件再替换, 中断时不会留下写了一半的文件"""
+    path, text = item
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def write_text_files(items, workers=16):
+    """
+    用线程池写入一批文本文件(如生成的标签), 目标目录在主线程中统一创建
+
+    参数:
+        items: [(路径, 文本)]
+    """
+    items = [(str(path), text) for path, text in items]
+    for parent in {os.path.dirname(path) for path, _ in items}:
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(_write_text, items))
+
+def _delete_batch(batch):
+    deleted = []
+    failed = []
+    for path in batch:
+        try:
+            os.remove(path)
+            deleted.append(path)
+        except FileNotFoundError:
+            deleted.append(path)
+        except OSError as e:
+            failed.append((path, str(e)))
+    return deleted, failed
+
+def delete_files(paths, workers=16, batch_size=256):
+    """
+    用线程池分批删除文件, 已不存在的文件视为删除成功
+
+    返回:
+        deleted: 删除的数量
+        failed: [(路径, 错误信息)]
+    """
+    paths = [str(path) for path in paths]
+    deleted = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+        for done, errors in pool.map(_delete_batch, batches):
+            deleted += len(done)
+            failed.extend(errors)
+    for path, error in failed[:20]:
+        print(f"删除 {path} 失败: {error}")
+    return deleted, failed
@@ -0,0 +1,275 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from convert_yolo import format_yolo_lines
+from dataset_index import DatasetIndex
+from label_parser import parse_labels
+from transfer import transfer_files, write_text_files
+
+# 每个检查项的说明, 顺序即报告中的顺序
+CHECKS = {
+    'malformed': '列数不是5或无法解析',
+    'bad_class': '类别ID不是非负整数或不在类别列表中',
+    'out_of_range': '框超出图片范围(可修复)',
+    'small_area': '面积过小或宽高不为正',
+    'bad_aspect': '宽高比超出范围',
+    'duplicate': '与同一文件中同类别的框重复',
+}
+
+def clip_boxes(boxes):
+    """
+    按角点把YOLO框裁剪到 [0,1], 再重新计算中心和宽高
+
+    与直接裁剪中心坐标不同, 超出图片的框只会缩小, 不会平移
+    """
+    x1 = np.clip(boxes[:, 0] - boxes[:, 2] / 2, 0.0, 1.0)
+    y1 = np.clip(boxes[:, 1] - boxes[:, 3] / 2, 0.0, 1.0)
+    x2 = np.clip(boxes[:, 0] + boxes[:, 2] / 2, 0.0, 1.0)
+    y2 = np.clip(boxes[:, 1] + boxes[:, 3] / 2, 0.0, 1.0)
+    return np.stack([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], axis=1)
+
+def duplicate_mask(boxes, file_idx, iou_thresh=0.9):
+    """
+    标记同一文件中与前面的同类别框 IoU >= iou_thresh 的框
+
+    按文件排序后, 第d轮比较每个框和它后面第d个框, 轮数为单个文件中最多的框数,
+    每轮都是整个数组上的向量运算
+
+    返回:
+        mask: (N,) 重复的框(每组重复中保留第一个)
+    """
+    mask = np.zeros(len(boxes), dtype=bool)
+    if len(boxes) < 2:
+        return mask
+    order = np.argsort(file_idx, kind='stable')
+    sorted_boxes = boxes[order]
+    sorted_files = file_idx[order]
+    corners = np.column_stack([
+        sorted_boxes[:, 1] - sorted_boxes[:, 3] / 2, sorted_boxes[:, 2] - sorted_boxes[:, 4] / 2,
+        sorted_boxes[:, 1] + sorted_boxes[:, 3] / 2, sorted_boxes[:, 2] + sorted_boxes[:, 4] / 2,
+    ])
+    area = sorted_boxes[:, 3] * sorted_boxes[:, 4]
+    max_per_file = int(np.bincount(sorted_files).max())
+
+    for d in range(1, max_per_file):
+        first, second = np.arange(len(boxes) - d), np.arange(d, len(boxes))
+        same = (sorted_files[first] == sorted_files[second]) & (sorted_boxes[first, 0] == sorted_boxes[second, 0])
+        if not same.any():
+            continue
+        first, second = first[same], second[same]
+        top_left = np.maximum(corners[first, :2], corners[second, :2])
+        bottom_right = np.minimum(corners[first, 2:], corners[second, 2:])
+        inter = np.clip(bottom_right - top_left, 0, None).prod(axis=1)
+        iou = inter / np.maximum(area[first] + area[second] - inter, 1e-12)
+        mask[order[second[iou >= iou_thresh]]] = True
+    return mask
+
+def check_boxes(boxes, file_idx, num_classes=None, min_area=1e-5, max_aspect=20.0, dup_iou=0.9, tol=1e-6,
+                malformed=None):
+    """
+    对所有框做向量化检查
+
+    参数:
+        boxes: (N,5) parse_labels 返回的框
+        file_idx: (N,) 每个框所属的文件
+        num_classes: 类别数, None表示不检查类别上限
+        min_area: 最小归一化面积 w*h
+        max_aspect: 最大宽高比 max(w/h, h/w)
+        dup_iou: 判定为重复框的IoU阈值
+        tol: 范围检查的容差
+        malformed: 可选, (N,) 额外标记为格式错误的框(如列数不为5的行)
+
+    返回:
+        flags: {检查项: (N,) bool数组}, 项目见 CHECKS
+    """
+    malformed = np.isnan(boxes).any(axis=1) | (malformed if malformed is not None else False)
+    values = np.nan_to_num(boxes)
+    class_ids = values[:, 0]
+    bad_class = (class_ids < 0) | (class_ids != np.round(class_ids))
+    if num_classes is not None:
+        bad_class |= class_ids >= num_classes
+
+    x, y, w, h = values[:, 1], values[:, 2], values[:, 3], values[:, 4]
+    out_of_range = (
+        (x - w / 2 < -tol) | (y - h / 2 < -tol) | (x + w / 2 > 1 + tol) | (y + h / 2 > 1 + tol)
+    )
+    # 面积和宽高比按裁剪到图片内之后的框判断
+    clipped = clip_boxes(values[:, 1:])
+    cw, ch = clipped[:, 2], clipped[:, 3]
+    small_area = (cw <= 0) | (ch <= 0) | (cw * ch < min_area)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bad_aspect = ~small_area & (np.maximum(cw / ch, ch / cw) > max_aspect)
+
+    invalid = malformed | bad_class | small_area | bad_aspect
+    duplicate = np.zeros(len(boxes), dtype=bool)
+    valid = np.flatnonzero(~invalid)
+    duplicate[valid] = duplicate_mask(np.column_stack([class_ids[valid], clipped[valid]]), file_idx[valid], dup_iou)
+
+    return {
+        'malformed': malformed,
+        'bad_class': bad_class & ~malformed,
+        'out_of_range': out_of_range & ~malformed,
+        'small_area': small_area & ~malformed,
+        'bad_aspect': bad_aspect & ~malformed,
+        'duplicate': duplicate,
+    }
+
+def _column_counts(label_path):
+    """每个非空行的列数, 行的顺序与 parse_labels 返回的框一致"""
+    with open(label_path, 'r') as f:
+        return [len(parts) for parts in (line.split() for line in f.read().splitlines()) if parts]
+
+def column_counts(label_paths, workers=16):
+    """
+    逐行统计所有标签文件的列数
+
+    格式检查不依赖解析结果: 解析器会把不足5列的行补nan、截断多余的列, 只看解析后的框
+    无法发现多列的行
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        counts = [count for file_counts in pool.map(_column_counts, label_paths) for count in file_counts]
+    return np.asarray(counts, dtype=np.int64)
+
+def validate_labels(dataset_dir, class_names=None, min_area=1e-5, max_aspect=20.0, dup_iou=0.9,
+                    repair_dir=None, in_place=False, drop_empty=False, workers=None):
+    """
+    检查数据集中的所有标签, 可选地写出修复后的标签
+
+    修复规则: 超出范围的框按角点裁剪到图片内; 格式错误、类别错误、面积过小、宽高比异常
+    和重复的框被删除。in_place 时只重写内容发生变化的文件; 写入 repair_dir 时输出完整的数据集,
+    未变化的标签原样复制, 图片以硬链接(不支持时复制)放入 repair_dir/<split>/images。
+    不是5列的行和无法解析的数值计为格式错误, 不会中断检查
+
+    参数:
+        dataset_dir: 数据集目录(train/val/test划分或直接包含images和labels)
+        class_names: 类别名称列表, 用于检查未知类别
+        min_area: 最小归一化面积
+        max_aspect: 最大宽高比
+        dup_iou: 判定为重复框的IoU阈值
+        repair_dir: 可选, 修复后的完整数据集写入 repair_dir/<split>/images 和 labels
+        in_place: 为True时直接覆盖原标签文件
+        drop_empty: 修复时删除空标签文件(包括修复后为空的文件)
+        workers: 解析标签的进程数
+
+    返回:
+        report: 字典, 包含文件数、框数、各检查项的数量、按类别的问题数量和空文件列表
+    """
+    # 索引刷新时无效的类别ID只单独计数, 格式错误的标签不会中断
+    index = DatasetIndex.open(dataset_dir, workers=workers)
+    rows = index.select(require_image=False)
+    label_paths = [index.label_path(row) for row in rows]
+    boxes, file_idx = parse_labels(label_paths, workers, strict=False)
+    columns = column_counts(label_paths)
+    if len(columns) != len(boxes):
+        raise RuntimeError(f"逐行列数({len(columns)})与解析的框数({len(boxes)})不一致, 标签文件在检查期间被修改?")
+    # 列数不为5的行即使解析出了数值也按格式错误处理
+    flags = check_boxes(boxes, file_idx, len(class_names) if class_names else None, min_area, max_aspect, dup_iou,
+                        malformed=columns != 5)
+
+    counts = np.bincount(file_idx, minlength=len(label_paths))
+    empty = [label_paths[i] for i in np.flatnonzero(counts == 0)]
+    remove = flags['malformed'] | flags['bad_class'] | flags['small_area'] | flags['bad_aspect'] | flags['duplicate']
+    changed = remove | flags['out_of_range']
+    changed_files = np.unique(file_idx[changed])
+
+    class_ids = np.nan_to_num(boxes[:, 0], nan=-1).astype(np.int64)
+    report = {
+        'files': len(label_paths),
+        'boxes': len(boxes),
+        'empty_files': empty,
+        'files_with_issues': len(changed_files),
+        'checks': {name: int(mask.sum()) for name, mask in flags.items()},
+        'issues_by_class': {
+            int(class_id): int(count)
+            for class_id, count in zip(*np.unique(class_ids[changed], return_counts=True))
+        },
+    }
+
+    if repair_dir is not None or in_place:
+        report['repaired'] = _repair(index, rows, label_paths, boxes, file_idx, remove, changed_files,
+                                     empty, repair_dir, in_place, drop_empty)
+    print_report(report, class_names)
+    return report
+
+def _repair(index, rows, label_paths, boxes, file_idx, remove, changed_files, empty, repair_dir, in_place,
+            drop_empty):
+    """
+    写出修复后的标签, 写入 repair_dir 时同时复制未变化的标签并链接图片
+
+    返回:
+        counts: 重写、复制/链接和删除的文件数
+    """
+    keep = ~remove
+    fixed = clip_boxes(boxes[keep, 1:])
+    kept_files = file_idx[keep]
+    lines = format_yolo_lines(boxes[keep, 0], fixed)
+    starts = np.searchsorted(kept_files, np.arange(len(label_paths) + 1))
+
+    def split_dir(i):
+        return Path(repair_dir) / index.splits[index.columns['split'][rows[i]]]
+
+    writes = []
+    dropped = set()
+    for i in changed_files.tolist():
+        text = '\n'.join(lines[starts[i]:starts[i + 1]])
+        if not text and drop_empty:
+            dropped.add(i)
+            continue
+        writes.append((label_paths[i] if in_place else split_dir(i) / 'labels' / label_paths[i].name, text))
+    if drop_empty:
+        empty = set(empty)
+        dropped.update(i for i, path in enumerate(label_paths) if path in empty)
+
+    label_copies = []
+    image_links = []
+    deletes = []
+    if in_place:
+        deletes = [label_paths[i] for i in sorted(dropped)]
+    else:
+        changed = set(changed_files.tolist())
+        for i, row in enumerate(rows):
+            if i in dropped:
+                continue
+            if i not in changed:
+                label_copies.append((label_paths[i], split_dir(i) / 'labels' / label_paths[i].name))
+            image_path = index.image_path(row)
+            if image_path is not None:
+                image_links.append((image_path, split_dir(i) / 'images' / image_path.name))
+
+    write_text_files(writes)
+    # 标签复制, 以免之后修改输出时影响原数据集; 图片用硬链接(不支持时复制)
+    transfer_files(label_copies, mode='copy')
+    transfer_files(image_links, mode='hardlink')
+    for path in deletes:
+        os.remove(path)
+    return {'rewritten': len(writes), 'copied': len(label_copies) + len(image_links), 'deleted': len(deletes)}
+
+def print_report(report, class_names=None):
+    print(f"\n检查了 {report['files']} 个标签文件, {report['boxes']} 个框, "
+          f"{report['files_with_issues']} 个文件有问题, {len(report['empty_files'])} 个空文件")
+    print("\n| 检查项 | 数量 | 说明 |")
+    print("|--------|------|------|")
+    for name, description in CHECKS.items():
+        print(f"| {name:<12} | {report['checks'][name]:6} | {description} |")
+    if report['issues_by_class']:
+        print("\n| 类别 | 类别名称 | 问题框数 |")
+        print("|------|----------|----------|")
+        for class_id, count in report['issues_by_class'].items():
+            known = class_names is not None and 0 <= class_id < len(class_names)
+            print(f"| {class_id:4} | {class_names[class_id] if known else '未知':<8} | {count:8} |")
+    if 'repaired' in report:
+        repaired = report['repaired']
+        print(f"\n修复: 重写 {repaired['rewritten']} 个文件, 复制/链接 {repaired['copied']} 个文件, "
+              f"删除 {repaired['deleted']} 个文件")
+
+if __name__ == "__main__":
+    # 配置参数
+    DATASET_DIR = "./test_datasets"
+    CLASS_NAMES = ['heart', 'thumb_up', 'ok', 'gun', 'rock', 'scissors', 'paper']
+
+    # 先只检查; 设置 REPAIR_DIR 写出修复后的标签, 确认无误后再用 in_place=True 覆盖原文件
+    REPAIR_DIR = None  # 例如 "./test_datasets_repaired"
+    validate_labels(DATASET_DIR, CLASS_NAMES, repair_dir=REPAIR_DIR)